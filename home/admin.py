@@ -3,8 +3,8 @@ from .models import WordBook, WordCard, Tag, UserProfile
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'avatar_image', 'background_color', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['user', 'avatar_image', 'background_color', 'is_ai', 'is_site_admin', 'created_at']
+    list_filter = ['is_ai', 'is_site_admin', 'created_at']
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(WordBook)
@@ -0,0 +1,176 @@
+"""クイズ回答イベントの取り込みと集計
+
+回答は QuizAnswerEvent に追記するだけにして、クライアントがまとめて送った分を
+1トランザクションの bulk_create で入れる。回答ごとの idempotency_key で
+再送分は無視するので、通信エラーで同じバッチを送り直しても二重に数えない。
+正答率・難易度は rollup_quiz_stats コマンドが前回処理した id 以降だけを足し込む。
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import reviews
+from .models import CardAnswerStats, JobCheckpoint, QuizAnswerEvent, WordBookAnswerStats, WordCard
+
+CHECKPOINT_NAME = 'quiz_stats'
+
+MAX_BATCH_ANSWERS = 200
+MAX_KEY_LENGTH = 64
+# 端末の時計のずれを許容する範囲（これを超える回答時刻はサーバー時刻に置き換える）
+MAX_CLOCK_SKEW = timedelta(days=1)
+
+# 難易度の平滑化：回答が少ない単語帳は PRIOR_ACCURACY に寄せる
+PRIOR_ATTEMPTS = 10
+PRIOR_ACCURACY = 0.7
+
+BATCH_SIZE = 500
+
+
+def parse_answer(raw, now):
+    """送信された1件分の回答を検証して dict にする。不正なら ValueError"""
+    key = str(raw['key'])
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError('invalid key')
+    answered_at = parse_datetime(raw['answered_at']) if raw.get('answered_at') else None
+    if answered_at is None or timezone.is_naive(answered_at) or abs(answered_at - now) > MAX_CLOCK_SKEW:
+        answered_at = now
+    response_ms = raw.get('response_ms')
+    return {
+        'key': key,
+        'card_id': int(raw['card_id']),
+        'correct': bool(raw.get('correct')),
+        'timed_out': bool(raw.get('timed_out')),
+        'response_ms': max(0, int(response_ms)) if response_ms is not None else None,
+        'answered_at': answered_at,
+    }
+
+
+def ingest(user, answers, now=None):
+    """検証済みの回答をまとめて保存し、(新しく保存した件数, 再送で無視した件数) を返す
+
+    新しく保存した回答だけを復習スケジュールにも反映する。
+    """
+    now = now or timezone.now()
+    cards = dict(
+        WordCard.objects.filter(reviews.visible_q(user), pk__in={a['card_id'] for a in answers})
+        .values_list('pk', 'wordbook_id')
+    )
+
+    with transaction.atomic():
+        seen = set(
+            QuizAnswerEvent.objects.filter(user=user, idempotency_key__in=[a['key'] for a in answers])
+            .values_list('idempotency_key', flat=True)
+        )
+        duplicates = 0
+        events = []
+        for answer in answers:
+            if answer['key'] in seen:
+                duplicates += 1
+                continue
+            if answer['card_id'] not in cards:
+                continue
+            seen.add(answer['key'])
+            events.append(QuizAnswerEvent(
+                user=user,
+                card_id=answer['card_id'],
+                wordbook_id=cards[answer['card_id']],
+                correct=answer['correct'],
+                timed_out=answer['timed_out'],
+                response_ms=answer['response_ms'],
+                idempotency_key=answer['key'],
+                answered_at=answer['answered_at'],
+            ))
+        inserted = _insert_new(events)
+        duplicates += len(events) - len(inserted)
+
+        reviews.record_results(user, [
+            (event.card_id, reviews.quality_from_result({'correct': event.correct, 'timed_out': event.timed_out}))
+            for event in inserted
+        ], now)
+    return len(inserted), duplicates
+
+
+def _insert_new(events):
+    """events を保存し、この呼び出しで実際に保存できたものだけを返す
+
+    同じキーの同時送信は一意制約に当たる。まずまとめて入れ、当たったときだけ1件ずつ
+    セーブポイントの中で入れ直して、先に保存された分を除く（復習スケジュールを二重に進めない）。
+    """
+    try:
+        with transaction.atomic():
+            QuizAnswerEvent.objects.bulk_create(events)
+        return events
+    except IntegrityError:
+        pass
+    inserted = []
+    for event in events:
+        event.pk = None
+        try:
+            with transaction.atomic():
+                event.save(force_insert=True)
+        except IntegrityError:
+            continue
+        inserted.append(event)
+    return inserted
+
+
+def _merge(model, key_field, totals, now, with_difficulty=False):
+    """(キー, 回答数, 正解数) を既存の集計行に足し込む"""
+    totals = list(totals)
+    for start in range(0, len(totals), BATCH_SIZE):
+        batch = totals[start:start + BATCH_SIZE]
+        existing = model.objects.in_bulk([key for key, _, _ in batch], field_name=key_field)
+        to_update = []
+        to_create = []
+        for key, attempts, correct in batch:
+            row = existing.get(key)
+            if row is None:
+                row = model(**{key_field: key})
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            row.attempts += attempts
+            row.correct += correct
+            row.accuracy = row.correct / row.attempts
+            row.updated_at = now
+            if with_difficulty:
+                smoothed = (row.correct + PRIOR_ACCURACY * PRIOR_ATTEMPTS) / (row.attempts + PRIOR_ATTEMPTS)
+                row.difficulty = 1 - smoothed
+        fields = ['attempts', 'correct', 'accuracy'] + (['difficulty'] if with_difficulty else [])
+        model.objects.bulk_update(to_update, fields + ['updated_at'])
+        model.objects.bulk_create(to_create)
+
+
+def rollup(full=False):
+    """前回以降の回答イベントを正答率・難易度に足し込み、処理したイベント数を返す"""
+    now = timezone.now()
+    with transaction.atomic():
+        checkpoint, _ = JobCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT_NAME)
+        if full:
+            CardAnswerStats.objects.all().delete()
+            WordBookAnswerStats.objects.all().delete()
+            checkpoint.last_event_id = 0
+
+        # 集計中に追記された分は次回に回す
+        last_id = QuizAnswerEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        events = QuizAnswerEvent.objects.filter(id__gt=checkpoint.last_event_id, id__lte=last_id)
+        processed = events.count()
+
+        for model, key_field, with_difficulty in (
+            (CardAnswerStats, 'card_id', False),
+            (WordBookAnswerStats, 'wordbook_id', True),
+        ):
+            totals = (
+                events.order_by().values(key_field)
+                .annotate(attempts=Count('id'), correct=Count('id', filter=Q(correct=True)))
+                .values_list(key_field, 'attempts', 'correct')
+            )
+            _merge(model, key_field, totals, now, with_difficulty)
+
+        checkpoint.last_event_id = last_id
+        checkpoint.last_run_at = now
+        checkpoint.save(update_fields=['last_event_id', 'last_run_at', 'updated_at'])
+    return processed
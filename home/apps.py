@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class HomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'home'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import static_manifest
+
+        # 静的ファイルの manifest は起動時に1回だけ読み込む
+        static_manifest.load()
@@ -0,0 +1,79 @@
+"""アバター画像の縮小版の生成と後片付け
+
+home.card_images と同じく、アップロード・差し替えのときはコミット後に専用スレッドで作り、
+リクエストのスレッドではエンコードを待たせない。縮小版ができるまでは元画像を表示する。
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import images
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatar-renditions')
+
+
+def _run_in_background(func, *args):
+    """コミット後に func を実行する。AVATAR_RENDITIONS_ASYNC なら縮小版用のスレッドで"""
+    def job():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('avatar rendition job failed: %s%r', func.__name__, args)
+        finally:
+            connection.close()
+
+    def submit():
+        if settings.AVATAR_RENDITIONS_ASYNC:
+            _executor.submit(job)
+        else:
+            func(*args)
+
+    transaction.on_commit(submit)
+
+
+def schedule(profile_id, image_name):
+    """プロフィールのアバター image_name の縮小版をコミット後に作る"""
+    _run_in_background(build_for_profile, profile_id, image_name)
+
+
+def discard_later(renditions):
+    """使われなくなった縮小版のファイルをコミット後に消す"""
+    if renditions:
+        _run_in_background(discard, renditions)
+
+
+def build_for_profile(profile_id, image_name):
+    """1人分の縮小版を作って保存する。読めない画像は元画像のまま表示する"""
+    try:
+        renditions = images.avatar_renditions(image_name)
+    except (ValueError, OSError):
+        logger.warning('could not build renditions for %s', image_name)
+        return
+    # 作っている間にアバターが差し替えられていたら書き込まずに片付ける
+    if not UserProfile.objects.filter(pk=profile_id, custom_avatar=image_name).update(avatar_renditions=renditions):
+        discard(renditions)
+
+
+def discard(renditions):
+    """renditions のファイルのうち、どのプロフィールからも参照されていないものを消す
+
+    ファイル名は内容のハッシュなので、同じ画像をアップロードしたユーザーと共有していることがある。
+    """
+    names = {name for formats in renditions.values() for name in formats.values()}
+    if not names:
+        return
+    condition = Q()
+    for name in names:
+        condition |= Q(avatar_renditions__icontains=name)
+    still_used = set()
+    for other in UserProfile.objects.filter(condition).values_list('avatar_renditions', flat=True):
+        still_used.update(name for formats in other.values() for name in formats.values())
+    for name in names - still_used:
+        default_storage.delete(name)
@@ -0,0 +1,164 @@
+"""主要ビューのベンチマーク（benchmark_views コマンド）
+
+test Client でビューを直接呼び、レイテンシ（p50/p95/p99）・1リクエストあたりのクエリ数・
+1リクエスト処理中のピークメモリを測る。結果は JSON で保存して次回の基準にできる。
+"""
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from . import query_stats
+from .models import Tag, UserProfile, WordBook
+from .synthetic import USERNAME_PREFIX
+
+# ALLOWED_HOSTS が空でも DEBUG 時に通るホスト名を使う
+SERVER_NAME = 'localhost'
+
+
+class Scenario:
+    """1種類のリクエスト。toggle 系は2回ごとに元の状態へ戻るので何回叩いても良い"""
+
+    def __init__(self, name, url, method='get'):
+        self.name = name
+        self.url = url
+        self.method = method
+
+
+def default_scenarios():
+    """シード済みのデータから、負荷の高い側（人気の単語帳・作者）を対象にシナリオを作る"""
+    viewer = User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').first()
+    if viewer is None:
+        raise ValueError('no benchmark users; seed data first (create_sample_data --scale)')
+    wordbook = WordBook.objects.filter(is_public=True).order_by('-likes_count', '-pk').first()
+    author = (
+        UserProfile.objects.select_related('user').exclude(user=viewer)
+        .order_by('-followers_count', '-pk').first().user
+    )
+    tag = Tag.objects.order_by('pk').first()
+
+    scenarios = [
+        Scenario('wordbook_list', reverse('wordbook_list')),
+        Scenario('wordbook_list_search', reverse('wordbook_list') + '?q=analysis'),
+        Scenario('wordbook_detail', reverse('wordbook_detail', args=[wordbook.pk])),
+        Scenario('mypage', reverse('mypage')),
+        Scenario('user_profile', reverse('user_profile', args=[author.username])),
+        Scenario('tags_list', reverse('tags_list') + '?limit=50'),
+        Scenario('wordbook_like', reverse('wordbook_like', args=[wordbook.pk]), method='post'),
+        Scenario('wordbook_bookmark', reverse('wordbook_bookmark', args=[wordbook.pk]), method='post'),
+        Scenario('user_follow_toggle', reverse('user_follow_toggle', args=[author.username]), method='post'),
+    ]
+    if tag is not None:
+        scenarios.insert(2, Scenario('wordbook_list_tag', reverse('wordbook_list') + f'?tag={tag.name}'))
+    return viewer, scenarios
+
+
+def _percentile(sorted_values, percent):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[percent - 1]
+
+
+class _Worker:
+    """スレッドごとの Client（ログイン済み）。500 は例外にせずエラーとして数える"""
+
+    def __init__(self, viewer):
+        self.viewer = viewer
+        self.local = threading.local()
+
+    def client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(raise_request_exception=False, SERVER_NAME=SERVER_NAME)
+            client.force_login(self.viewer)
+        return client
+
+    def request(self, scenario):
+        client = self.client()
+        recorder = query_stats.QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = getattr(client, scenario.method)(scenario.url)
+        elapsed = time.perf_counter() - start
+        return elapsed, recorder.count, response.status_code >= 400
+
+
+def _peak_memory(worker, scenario):
+    """1リクエスト処理中に確保されたメモリのピーク（KB）。tracemalloc は遅いので別に1回だけ測る"""
+    tracemalloc.start()
+    try:
+        worker.request(scenario)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def _close_connections(pool, size):
+    """プールの全スレッドで DB 接続を閉じる（Barrier で1スレッド1回ずつ実行させる）"""
+    barrier = threading.Barrier(size)
+
+    def close(_):
+        barrier.wait()
+        connections.close_all()
+
+    list(pool.map(close, range(size)))
+
+
+def run(viewer, scenarios, requests=50, concurrency=4, warmup=3, log=None):
+    """各シナリオを requests 回（concurrency 並列で）実行し、シナリオ名ごとの結果を返す"""
+    log = log or (lambda name, result: None)
+    worker = _Worker(viewer)
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        try:
+            for scenario in scenarios:
+                list(pool.map(lambda _: worker.request(scenario), range(warmup * concurrency)))
+
+                started = time.perf_counter()
+                samples = list(pool.map(lambda _: worker.request(scenario), range(requests)))
+                wall = time.perf_counter() - started
+
+                latencies = sorted(elapsed * 1000 for elapsed, _, _ in samples)
+                queries = [count for _, count, _ in samples]
+                results[scenario.name] = {
+                    'requests': requests,
+                    'errors': sum(failed for _, _, failed in samples),
+                    'p50_ms': round(_percentile(latencies, 50), 2),
+                    'p95_ms': round(_percentile(latencies, 95), 2),
+                    'p99_ms': round(_percentile(latencies, 99), 2),
+                    'throughput_rps': round(requests / wall, 1),
+                    'queries': round(statistics.mean(queries), 2),
+                    'max_queries': max(queries),
+                    'peak_kb': round(_peak_memory(worker, scenario), 1),
+                }
+                log(scenario.name, results[scenario.name])
+        finally:
+            _close_connections(pool, concurrency)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """基準と比べて悪化した項目を (シナリオ名, 指標, 基準値, 今回値) のリストで返す
+
+    レイテンシとメモリは tolerance（割合）を超えた悪化、クエリ数とエラー数は1件でも増えたら悪化とみなす。
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'peak_kb'):
+            if metric in previous and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((name, metric, previous[metric], current[metric]))
+        for metric in ('max_queries', 'errors'):
+            if metric in previous and current[metric] > previous[metric]:
+                regressions.append((name, metric, previous[metric], current[metric]))
+    return regressions
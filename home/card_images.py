@@ -0,0 +1,133 @@
+"""単語カード画像の縮小版の生成と後片付け
+
+保存・差し替えのときは、コミット後に専用スレッドで1枚分を作る（リクエストのスレッドで
+エンコードを待たせない）。既存の画像は build_card_renditions コマンドでまとめて作る。
+
+画像のデコードと再エンコードは CPU 処理で GIL を手放さないので、ProcessPoolExecutor で
+並列に回す。ワーカーはストレージ上のファイル名を受け取って縮小版の名前を返すだけで
+DB には触らず、結果の保存は親プロセスが bulk_update でまとめて行う。
+スターからインポートしたカードは元のカードと同じファイルを指すので、ファイル名ごとに1回だけ処理する。
+"""
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from . import images
+from .models import WordCard
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='card-renditions')
+
+
+def _run_in_background(func, *args):
+    """コミット後に func を実行する。CARD_RENDITIONS_ASYNC なら縮小版用のスレッドで"""
+    def job():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('card rendition job failed: %s%r', func.__name__, args)
+        finally:
+            connection.close()
+
+    def submit():
+        if settings.CARD_RENDITIONS_ASYNC:
+            _executor.submit(job)
+        else:
+            func(*args)
+
+    transaction.on_commit(submit)
+
+
+def schedule(card_id, image_name):
+    """カードの画像 image_name の縮小版をコミット後に作る"""
+    _run_in_background(build_for_card, card_id, image_name)
+
+
+def discard_later(renditions):
+    """使われなくなった縮小版のファイルをコミット後に消す"""
+    if renditions:
+        _run_in_background(discard, renditions)
+
+
+def build_for_card(card_id, image_name):
+    """1枚分の縮小版を作って保存する。読めない画像はそのまま（コマンドで作り直せる）"""
+    try:
+        renditions = images.card_renditions(image_name)
+    except (ValueError, OSError):
+        logger.warning('could not build renditions for %s', image_name)
+        return
+    # 作っている間に画像が差し替えられていたら書き込まずに片付ける
+    if not WordCard.objects.filter(pk=card_id, image=image_name).update(image_renditions=renditions):
+        discard(renditions)
+
+
+def discard(renditions):
+    """renditions のファイルのうち、どのカードからも参照されていないものを消す
+
+    ファイル名は内容のハッシュなので、インポートしたカードや同じ画像のカードと共有していることがある。
+    """
+    names = {name for formats in renditions.values() for name in formats.values()}
+    if not names:
+        return
+    condition = Q()
+    for name in names:
+        condition |= Q(image_renditions__icontains=name)
+    still_used = set()
+    for other in WordCard.objects.filter(condition).values_list('image_renditions', flat=True):
+        still_used.update(name for formats in other.values() for name in formats.values())
+    for name in names - still_used:
+        default_storage.delete(name)
+
+
+def _render(name):
+    """ワーカープロセスで1ファイル分の縮小版を作る。読めない画像は None"""
+    try:
+        return name, images.card_renditions(name)
+    except (ValueError, OSError):
+        return name, None
+
+
+def pending_cards(force=False):
+    cards = WordCard.objects.exclude(image='').exclude(image__isnull=True)
+    if not force:
+        cards = cards.filter(image_renditions={})
+    return cards.only('pk', 'image', 'image_renditions').order_by('pk')
+
+
+def backfill(force=False, workers=None, batch_size=BATCH_SIZE, log=None):
+    """縮小版の無いカード画像（force=True なら全部）を処理し、(更新したカード数, 失敗したファイル数) を返す"""
+    log = log or (lambda done, failed: None)
+    by_name = defaultdict(list)
+    for pk, name in pending_cards(force).values_list('pk', 'image'):
+        by_name[name].append(pk)
+    if not by_name:
+        return 0, 0
+
+    updated = 0
+    failed = 0
+    # 子プロセスに DB 接続を引き継がせない
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=django.setup) as pool:
+        names = list(by_name)
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            cards = []
+            for name, renditions in pool.map(_render, batch):
+                if renditions is None:
+                    failed += 1
+                    continue
+                cards.extend(WordCard(pk=pk, image_renditions=renditions) for pk in by_name[name])
+            WordCard.objects.bulk_update(cards, ['image_renditions'], batch_size=BATCH_SIZE)
+            updated += len(cards)
+            log(updated, failed)
+    return updated, failed
@@ -1,13 +1,13 @@
-from django.db.models import Count
-from .models import Tag
+from django.utils.functional import SimpleLazyObject
+
+from .roles import user_roles
+from .tags import get_leaderboard
 
 
 def tags_processor(request):
     """全ページで人気タグと選択中のタグを利用可能にする"""
-    # 人気タグTOP10を取得
-    popular_tags = Tag.objects.annotate(
-        usage_count=Count('wordbooks')
-    ).filter(usage_count__gt=0).order_by('-usage_count', 'name')[:10]
+    # 人気タグTOP10（テンプレートで参照されたときだけキャッシュから取得）
+    popular_tags = SimpleLazyObject(lambda: get_leaderboard(10))
     
     # 選択中のタグ
     tag_name = request.GET.get('tag')
@@ -19,3 +19,8 @@ def tags_processor(request):
         'popular_tags': popular_tags,
         'selected_tag_names': selected_tag_names,
     }
+
+
+def roles_processor(request):
+    """テンプレートで user_roles.is_site_admin などを使えるようにする（参照されたときだけ読む）"""
+    return {'user_roles': SimpleLazyObject(lambda: user_roles(request.user))}
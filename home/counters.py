@@ -0,0 +1,55 @@
+"""非正規化カウンタ列の更新と再集計"""
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+# (集計先モデル, カウンタ列, 集計元モデル, 集計元から集計先への参照, 集計先側の参照列)
+COUNTERS = [
+    ('home.WordBook', 'cards_count', 'home.WordCard', 'wordbook', 'pk'),
+    ('home.WordBook', 'likes_count', 'home.wordBookLike', 'wordbook', 'pk'),
+    ('home.WordBook', 'bookmarks_count', 'home.WordBookBookmark', 'wordbook', 'pk'),
+    ('home.UserProfile', 'followers_count', 'home.UserFollow', 'following', 'user_id'),
+    ('home.UserProfile', 'following_count', 'home.UserFollow', 'follower', 'user_id'),
+    ('home.UserProfile', 'likes_received_count', 'home.wordBookLike', 'wordbook__user', 'user_id'),
+]
+
+
+def bump(queryset, **deltas):
+    """カウンタ列を F 式で加減算する（0未満にはしない）"""
+    return queryset.update(**{
+        field: Greatest(F(field) + delta, Value(0))
+        for field, delta in deltas.items()
+    })
+
+
+def subquery_count(queryset):
+    """OuterRef を含む queryset の件数を、相関サブクエリ1つで数える式にする"""
+    counts = queryset.order_by().annotate(n=Func(F('pk'), function='COUNT')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def _actual_count(source, lookup, outer_field):
+    return subquery_count(source.objects.filter(**{lookup: OuterRef(outer_field)}))
+
+
+def reconcile(apps=global_apps, specs=COUNTERS):
+    """カウンタを実テーブルから数え直す。{'WordBook.cards_count': 修正した行数, ...} を返す"""
+    UserProfile = apps.get_model('home', 'UserProfile')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    # プロファイルが無いユーザーはカウンタを持てないので先に作る
+    missing = User.objects.filter(profile__isnull=True).values_list('pk', flat=True)
+    UserProfile.objects.bulk_create([UserProfile(user_id=pk) for pk in missing])
+
+    fixed = {}
+    for target_label, field, source_label, lookup, outer_field in specs:
+        target = apps.get_model(target_label)
+        source = apps.get_model(source_label)
+        actual = _actual_count(source, lookup, outer_field)
+        fixed[f'{target.__name__}.{field}'] = (
+            target.objects.annotate(actual=actual)
+            .exclude(**{field: F('actual')})
+            .update(**{field: actual})
+        )
+    return fixed
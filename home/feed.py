@@ -0,0 +1,159 @@
+"""フォロー中のユーザーが公開した単語帳の新着（タイムライン）
+
+公開時にフォロワー全員の受信箱（FeedEntry）へ1行ずつ配布しておき、読み出しは
+自分の受信箱をインデックス順に読むだけにする（書き込み時の配布）。
+配布はコミット後にバックグラウンドのスレッドで、フォロワーをまとめて bulk_create する。
+フォロワーの多い作者は配布の行数が大きすぎるので配布せず、読み出し時にその作者の
+公開単語帳を集めて受信箱の分とマージする（読み出し時の配布）。
+"""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import FeedEntry, UserFollow, UserProfile, WordBook
+from .pagination import PAGE_SIZE, decode_cursor, encode_position
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = 500
+
+# 配布は1本のスレッドで順に処理する（SQLite の書き込みを並列にしない）
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feed-fanout')
+
+
+def fanout_limit():
+    return settings.FEED_FANOUT_FOLLOWER_LIMIT
+
+
+def _run_in_background(func, *args):
+    """コミット後に func を実行する。FEED_FANOUT_ASYNC なら配布用のスレッドで"""
+    def job():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('feed fan-out failed: %s%r', func.__name__, args)
+        finally:
+            connection.close()
+
+    def submit():
+        if settings.FEED_FANOUT_ASYNC:
+            _executor.submit(job)
+        else:
+            func(*args)
+
+    transaction.on_commit(submit)
+
+
+def is_high_follower(user_id):
+    return UserProfile.objects.filter(user_id=user_id, followers_count__gt=fanout_limit()).exists()
+
+
+def publish(wordbook):
+    """単語帳が公開されたときに呼ぶ。初めての公開なら公開日時を記録し、フォロワーに配布する
+
+    非公開に戻してから再公開しても公開日時は最初のままにする（付け外しで新着の先頭に戻さない）。
+    """
+    if wordbook.published_at is None:
+        wordbook.published_at = timezone.now()
+        WordBook.objects.filter(pk=wordbook.pk).update(published_at=wordbook.published_at)
+    _run_in_background(fanout, wordbook.pk)
+
+
+def unpublish(wordbook):
+    """非公開に戻したときに呼ぶ。配布済みの受信箱の行を消す"""
+    _run_in_background(retract, wordbook.pk)
+
+
+def fanout(wordbook_id):
+    """フォロワーの受信箱に FANOUT_BATCH_SIZE 件ずつ書き込み、書き込んだ件数を返す"""
+    wordbook = WordBook.objects.filter(pk=wordbook_id, is_public=True).only('user_id', 'published_at').first()
+    if wordbook is None or is_high_follower(wordbook.user_id):
+        return 0
+    follower_ids = (
+        UserFollow.objects.filter(following_id=wordbook.user_id)
+        .order_by('pk').values_list('follower_id', flat=True)
+    )
+    written = 0
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(FeedEntry(
+            user_id=follower_id, wordbook_id=wordbook_id,
+            author_id=wordbook.user_id, published_at=wordbook.published_at,
+        ))
+        if len(batch) == FANOUT_BATCH_SIZE:
+            written += _write(batch)
+            batch = []
+    if batch:
+        written += _write(batch)
+    return written
+
+
+def _write(entries):
+    # 再公開で同じ単語帳を配り直しても重複しない
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def retract(wordbook_id):
+    FeedEntry.objects.filter(wordbook_id=wordbook_id).delete()
+
+
+def remove_author(user_id, author_id):
+    """フォロー解除したとき、その作者の分を受信箱から消す"""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _after(position, date_field, pk_field):
+    if position is None:
+        return Q()
+    published_at, pk = position
+    return Q(**{f'{date_field}__lt': published_at}) | Q(**{date_field: published_at, f'{pk_field}__lt': pk})
+
+
+def page(user, cursor=None, page_size=PAGE_SIZE):
+    """新しい順に1ページ分の単語帳と次ページのカーソル（無ければ None）を返す
+
+    カーソルは (公開日時, 単語帳 id)。受信箱とフォロワーの多い作者の単語帳は
+    どちらもこの順に page_size + 1 件ずつ読み、マージして切り出す。
+    """
+    position = decode_cursor(cursor)
+
+    inbox = (
+        FeedEntry.objects.filter(user=user, wordbook__is_public=True)
+        .filter(_after(position, 'published_at', 'wordbook_id'))
+        .select_related('wordbook__user__profile')
+        .order_by('-published_at', '-wordbook_id')[:page_size + 1]
+    )
+    candidates = [(entry.published_at, entry.wordbook_id, entry.wordbook) for entry in inbox]
+
+    high_follower_ids = list(
+        UserFollow.objects.filter(follower=user, following__profile__followers_count__gt=fanout_limit())
+        .values_list('following_id', flat=True)
+    )
+    if high_follower_ids:
+        pulled = (
+            WordBook.objects.with_creator_profile()
+            .filter(user_id__in=high_follower_ids, is_public=True, published_at__isnull=False)
+            .filter(_after(position, 'published_at', 'pk'))
+            .order_by('-published_at', '-pk')[:page_size + 1]
+        )
+        pulled = [(wordbook.published_at, wordbook.pk, wordbook) for wordbook in pulled]
+        # 作者のフォロワー数が境界をまたいだ直後は両方に出ることがあるので単語帳 id で除く
+        seen = {pk for _, pk, _ in candidates}
+        candidates = list(heapq.merge(
+            candidates, [item for item in pulled if item[1] not in seen],
+            key=lambda item: (item[0], item[1]), reverse=True,
+        ))
+
+    items = candidates[:page_size + 1]
+    next_cursor = None
+    if len(items) > page_size:
+        published_at, pk, _ = items[page_size - 1]
+        next_cursor = encode_position(published_at, pk)
+    return [wordbook for _, _, wordbook in items[:page_size]], next_cursor
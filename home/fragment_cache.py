@@ -0,0 +1,85 @@
+"""世代番号で一括無効化できる、スタンピード対策付きのキャッシュ
+
+値は (論理的な有効期限, 値) の組で保存し、実際のキャッシュ期限は猶予分だけ長くする。
+期限切れのエントリは1リクエストだけがロックを取って再計算し、
+その間ほかのリクエストは古い値を返す（古い値が無ければ再計算の完了を少し待つ）。
+世代番号とロックは settings.CACHES の共有キャッシュに置くので、ワーカープロセスをまたいで効く。
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# 名前空間（無効化の単位）
+HOME_SECTIONS = 'home:sections'
+
+# 期限切れ後も古い値を返してよい猶予（秒）
+STALE_GRACE = 60
+
+# 再計算ロックの期限（秒）。再計算が落ちてもこの時間でロックは外れる
+LOCK_TIMEOUT = 10
+
+# 古い値が無いときに再計算の完了を待つ間隔と回数
+WAIT_INTERVAL = 0.05
+WAIT_ATTEMPTS = 40
+
+
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # キャッシュから消えた後に古い世代と衝突しないよう時刻を初期値にする
+        version = int(time.time() * 1000)
+        cache.add(_version_key(namespace), version, None)
+        version = cache.get(_version_key(namespace), version)
+    return version
+
+
+def invalidate(namespace):
+    """名前空間の世代を進めて、既存のエントリをまとめて無効にする。新しい世代番号を返す"""
+    try:
+        # DatabaseCache の incr は読んでから書くので、書き込みロックを取るトランザクションの中で行う
+        with transaction.atomic():
+            return cache.incr(_version_key(namespace))
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(_version_key(namespace), version, None)
+        return version
+
+
+def make_key(namespace, *parts):
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'{namespace}:{get_version(namespace)}:{digest}'
+
+
+def get_or_compute(namespace, parts, compute, timeout):
+    """namespace と parts で決まるキャッシュを返す。無ければ compute() の結果を保存して返す"""
+    key = make_key(namespace, *parts)
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # 他のリクエストが再計算中
+        if entry is not None:
+            return entry[1]
+        for _ in range(WAIT_ATTEMPTS):
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+        # 待っても出来上がらなければ自分で計算する（保存はロック保持者に任せる）
+        return compute()
+
+    try:
+        value = compute()
+        cache.set(key, (time.time() + timeout, value), timeout + STALE_GRACE)
+    finally:
+        cache.delete(lock_key)
+    return value
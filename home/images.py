@@ -0,0 +1,139 @@
+"""アップロード画像の縮小版（レンディション）の生成
+
+元画像は表示サイズ（40〜120px 程度）よりずっと大きいので、アップロード時に
+サイズ別の WebP と PNG（WebP 非対応ブラウザ用）を作っておき、テンプレートは
+表示サイズに合ったものを読む。縮小版は EXIF などのメタデータを含めずに保存し、
+ファイル名は内容の SHA-256 にする（同じ画像は1つのファイルを共有し、URL が変わらないので
+長期キャッシュできる）。
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+AVATAR_SIZES = (48, 96, 192)
+# 単語カード画像の縮小版の幅（カード一覧の1列は 200〜400px 程度。高解像度画面用に大きめも作る）
+CARD_WIDTHS = (320, 640, 960)
+RENDITION_DIR = 'renditions'
+
+# 展開後の画素数の上限（小さなファイルで巨大な画像を送る攻撃を防ぐ）
+MAX_PIXELS = 40_000_000
+
+WEBP_QUALITY = 80
+FORMATS = (
+    ('webp', 'WEBP', {'quality': WEBP_QUALITY, 'method': 6}),
+    ('png', 'PNG', {'optimize': True}),
+)
+# 写真が多いカード画像は、透過が無ければ PNG の代わりに JPEG を WebP 非対応ブラウザ用にする
+JPEG_FORMAT = ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True})
+
+
+def open_image(file, draft_size=None):
+    """アップロードされたファイルを開いて向きを補正する。画像でなければ ValueError"""
+    try:
+        image = Image.open(file)
+        if image.width * image.height > MAX_PIXELS:
+            raise ValueError('image too large')
+        if draft_size is not None:
+            # JPEG は縮小しながらデコードできるので、必要な大きさの2倍程度までで済ませる
+            image.draft('RGB', (draft_size * 2, draft_size * 2))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError('invalid image') from e
+    return image
+
+
+def _normalize_mode(image):
+    # 透過はそのまま残し、パレットなどは扱いやすいモードに直す
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def _encode(image, pil_format, options):
+    buffer = io.BytesIO()
+    # 元画像から引き継いだ EXIF・コメントなどのメタデータは書き出さない
+    image.info = {}
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def store(content, extension):
+    """内容のハッシュをファイル名にして保存し、ストレージ上の名前を返す（既にあれば保存しない）"""
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'{RENDITION_DIR}/{digest[:2]}/{digest}.{extension}'
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(content))
+    return name
+
+
+def square_renditions(file, sizes=AVATAR_SIZES):
+    """中央を正方形に切り抜いた各サイズの縮小版を保存し、{サイズ: {拡張子: 名前}} を返す
+
+    元画像より大きいサイズには拡大しない（元画像の大きさのまま保存する）。
+    """
+    image = _normalize_mode(open_image(file, max(sizes)))
+    side = min(image.size)
+    renditions = {}
+    for size in sizes:
+        target = min(size, side)
+        resized = ImageOps.fit(image, (target, target), Image.Resampling.LANCZOS)
+        renditions[str(size)] = {
+            extension: store(_encode(resized, pil_format, options), extension)
+            for extension, pil_format, options in FORMATS
+        }
+    return renditions
+
+
+def width_renditions(file, widths=CARD_WIDTHS):
+    """縦横比を保ったまま各幅に縮小した版を保存し、{幅: {拡張子: 名前}} を返す
+
+    元画像より広い幅には拡大せず、元画像の幅の版を1つ作ってそこで止める。
+    キーは実際の幅なので、そのまま srcset の w 記述子に使える。
+    """
+    image = _normalize_mode(open_image(file, max(widths)))
+    formats = FORMATS if image.mode == 'RGBA' else (FORMATS[0], JPEG_FORMAT)
+    renditions = {}
+    for width in sorted(widths):
+        target = min(width, image.width)
+        resized = image.resize(
+            (target, max(1, round(image.height * target / image.width))), Image.Resampling.LANCZOS,
+        ) if target < image.width else image.copy()
+        renditions[str(target)] = {
+            extension: store(_encode(resized, pil_format, options), extension)
+            for extension, pil_format, options in formats
+        }
+        if target == image.width:
+            break
+    return renditions
+
+
+def avatar_renditions(name, sizes=AVATAR_SIZES):
+    """ストレージ上のアバター画像 name からサイズ別の縮小版を作る"""
+    with default_storage.open(name) as file:
+        return square_renditions(file, sizes)
+
+
+def card_renditions(name, widths=CARD_WIDTHS):
+    """ストレージ上の画像 name から幅別の縮小版を作る（backfill のワーカープロセスからも呼ぶ）"""
+    with default_storage.open(name) as file:
+        return width_renditions(file, widths)
+
+
+def fallback_extension(formats):
+    """縮小版1つ分の {拡張子: 名前} から WebP 以外（PNG/JPEG）の拡張子を返す"""
+    return next(extension for extension in formats if extension != 'webp')
+
+
+def pick(renditions, size=None):
+    """size（表示サイズ px）以上で最小の縮小版。size なし・すべて小さい場合は最大のもの"""
+    if not renditions:
+        return None
+    available = sorted(int(key) for key in renditions)
+    chosen = available[-1]
+    if size is not None:
+        chosen = next((candidate for candidate in available if candidate >= int(size)), chosen)
+    return renditions[str(chosen)]
@@ -0,0 +1,99 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from home import benchmark, synthetic
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main views (p50/p95/p99 latency, queries and peak memory per request)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per view')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent client threads')
+        parser.add_argument('--warmup', type=int, default=3, help='Warm-up requests per thread before measuring')
+        parser.add_argument('--only', nargs='+', metavar='VIEW', help='Benchmark only these scenarios')
+        parser.add_argument('--baseline', help='Compare with this baseline JSON and fail on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown ratio against the baseline')
+        parser.add_argument('--save', metavar='PATH', help='Write the results as a new baseline JSON')
+        parser.add_argument(
+            '--existing-db', action='store_true',
+            help='Use the configured database as is instead of seeding a throwaway test database',
+        )
+        # シードするデータ量（create_sample_data --scale と同じ意味）
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--wordbooks', type=int, default=5000)
+        parser.add_argument('--cards', type=int, default=100000)
+        parser.add_argument('--likes', type=int, default=20000)
+        parser.add_argument('--bookmarks', type=int, default=10000)
+        parser.add_argument('--stars', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['existing_db']:
+            results = self.run_benchmark(options)
+        else:
+            # 本番データを汚さないよう、テスト用DBを作ってシードし、終わったら消す
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.stdout.write('Seeding benchmark data...')
+                synthetic.generate(
+                    users=options['users'], wordbooks=options['wordbooks'], cards=options['cards'],
+                    likes=options['likes'], bookmarks=options['bookmarks'], stars=options['stars'],
+                    follows=options['follows'], seed=options['seed'],
+                )
+                results = self.run_benchmark(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Saved results to {options["save"]}'))
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = benchmark.compare(results, baseline, tolerance=options['tolerance'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'{name}: {metric} {before} -> {after}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
+
+    def run_benchmark(self, options):
+        try:
+            viewer, scenarios = benchmark.default_scenarios()
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['only']:
+            unknown = set(options['only']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f'unknown scenarios: {", ".join(sorted(unknown))}')
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['only']]
+
+        self.stdout.write(
+            f'{"view":<22} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>8} {"peak KB":>9} {"errors":>7}'
+        )
+
+        def log(name, result):
+            self.stdout.write(
+                f'{name:<22} {result["p50_ms"]:>8} {result["p95_ms"]:>8} {result["p99_ms"]:>8} '
+                f'{result["throughput_rps"]:>8} {result["queries"]:>8} {result["peak_kb"]:>9} {result["errors"]:>7}'
+            )
+
+        # 失敗したリクエストは errors 列で数えるので、1件ずつのスタックトレースは出さない
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            return benchmark.run(
+                viewer, scenarios, requests=options['requests'],
+                concurrency=options['concurrency'], warmup=options['warmup'], log=log,
+            )
+        finally:
+            request_logger.setLevel(level)
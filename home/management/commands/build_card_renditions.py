@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from home import card_images
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG renditions for existing word card images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate renditions for every card image')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=card_images.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        updated, failed = card_images.backfill(
+            force=options['force'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            log=lambda done, failed: self.stdout.write(f'  {done} cards updated, {failed} files failed'),
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} image files could not be read'))
+        self.stdout.write(self.style.SUCCESS(f'Updated renditions for {updated} cards'))
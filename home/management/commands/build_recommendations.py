@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from home import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Compute "people who liked this also liked" wordbooks from likes and bookmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every wordbook (also drops removed likes/bookmarks)',
+        )
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K)
+        parser.add_argument('--min-common', type=int, default=recommendations.MIN_COMMON_USERS)
+
+    def handle(self, *args, **options):
+        updated = recommendations.build(
+            full=options['full'], top_k=options['top_k'], min_common=options['min_common'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Updated recommendations for {updated} wordbooks'))
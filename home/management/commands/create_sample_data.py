@@ -1,13 +1,64 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from home.models import WordBook, WordCard, Tag
 from django.utils.text import slugify
+from home import synthetic
 import random
+import time
+
+
+# 既定タグ
+DEFAULT_TAGS = [
+    {'name': '英検3級', 'slug': 'eiken-3kyu'},
+    {'name': '英検準2級', 'slug': 'eiken-jun2'},
+    {'name': '英検2級', 'slug': 'eiken-2kyu'},
+    {'name': '英検準1級', 'slug': 'eiken-jun1'},
+    {'name': 'TOEIC600', 'slug': 'toeic-600'},
+    {'name': 'TOEIC800', 'slug': 'toeic-800'},
+    {'name': 'TOEIC900', 'slug': 'toeic-900'},
+    {'name': '大学受験', 'slug': 'university-exam'},
+    {'name': '高校受験', 'slug': 'high-school-exam'},
+    {'name': '中学英語', 'slug': 'junior-high'},
+    {'name': '日常会話', 'slug': 'daily-conversation'},
+    {'name': 'ビジネス英語', 'slug': 'business-english'},
+    {'name': '旅行英語', 'slug': 'travel-english'},
+    {'name': 'IT用語', 'slug': 'it-terms'},
+    {'name': '医療英語', 'slug': 'medical-english'},
+    {'name': '基礎', 'slug': 'basic'},
+    {'name': '初級', 'slug': 'beginner'},
+    {'name': '中級', 'slug': 'intermediate'},
+    {'name': '上級', 'slug': 'advanced'},
+    {'name': '単語', 'slug': 'vocabulary'},
+    {'name': '熟語', 'slug': 'idioms'},
+    {'name': '文法', 'slug': 'grammar'},
+]
+
 
 class Command(BaseCommand):
-    help = 'Create sample wordbooks and wordcards'
+    help = 'Create sample wordbooks and wordcards (--scale for large synthetic load-test data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='store_true', help='Generate synthetic data at scale instead of the fixed samples')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--wordbooks', type=int, default=10000)
+        parser.add_argument('--cards', type=int, default=200000)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument('--bookmarks', type=int, default=20000)
+        parser.add_argument('--stars', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (same seed and sizes give the same data)')
+        parser.add_argument('--batch-size', type=int, default=synthetic.BATCH_SIZE)
 
     def handle(self, *args, **options):
+        for item in DEFAULT_TAGS:
+            Tag.objects.get_or_create(name=item['name'], defaults={
+                'slug': item['slug']
+            })
+
+        if options['scale']:
+            self.create_scale_data(options)
+            return
+
         AVATAR_IMAGES = [
             'account.png', 'account2.png', 'account3.png', 'account4.png',
             'account5.png', 'account6.png', 'account7.png', 'account8.png',
@@ -17,37 +68,6 @@ class Command(BaseCommand):
             '#fffff0', '#e3d7a3', '#d8f3dc', '#f8d7da', '#dbeafe', '#fef3c7', '#e0f2fe',
         ]
 
-        # 既定タグ
-        default_tags = [
-            {'name': '英検3級', 'slug': 'eiken-3kyu'},
-            {'name': '英検準2級', 'slug': 'eiken-jun2'},
-            {'name': '英検2級', 'slug': 'eiken-2kyu'},
-            {'name': '英検準1級', 'slug': 'eiken-jun1'},
-            {'name': 'TOEIC600', 'slug': 'toeic-600'},
-            {'name': 'TOEIC800', 'slug': 'toeic-800'},
-            {'name': 'TOEIC900', 'slug': 'toeic-900'},
-            {'name': '大学受験', 'slug': 'university-exam'},
-            {'name': '高校受験', 'slug': 'high-school-exam'},
-            {'name': '中学英語', 'slug': 'junior-high'},
-            {'name': '日常会話', 'slug': 'daily-conversation'},
-            {'name': 'ビジネス英語', 'slug': 'business-english'},
-            {'name': '旅行英語', 'slug': 'travel-english'},
-            {'name': 'IT用語', 'slug': 'it-terms'},
-            {'name': '医療英語', 'slug': 'medical-english'},
-            {'name': '基礎', 'slug': 'basic'},
-            {'name': '初級', 'slug': 'beginner'},
-            {'name': '中級', 'slug': 'intermediate'},
-            {'name': '上級', 'slug': 'advanced'},
-            {'name': '単語', 'slug': 'vocabulary'},
-            {'name': '熟語', 'slug': 'idioms'},
-            {'name': '文法', 'slug': 'grammar'},
-            
-        ]
-        for item in default_tags:
-            Tag.objects.get_or_create(name=item['name'], defaults={
-                'slug': item['slug']
-            })
-
         # サンプルユーザーを作成（既に存在する場合はスキップ）
         sample_users = []
         for i in range(1, 6):
@@ -451,4 +471,18 @@ class Command(BaseCommand):
             self.stdout.write(f'  - Added {len(wordbook_data["cards"])} cards')
             self.stdout.write(f'  - Added tags: {", ".join(tags)}')
 
-        self.stdout.write(self.style.SUCCESS('Successfully created sample data!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully created sample data!'))
+
+    def create_scale_data(self, options):
+        started = time.perf_counter()
+        try:
+            synthetic.generate(
+                users=options['users'], wordbooks=options['wordbooks'], cards=options['cards'],
+                likes=options['likes'], bookmarks=options['bookmarks'], stars=options['stars'],
+                follows=options['follows'], seed=options['seed'], batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Successfully created synthetic data in {elapsed:.1f}s'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from home import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized counter columns and fix any drift'
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile()
+        for name, rows in fixed.items():
+            if rows:
+                self.stdout.write(self.style.WARNING(f'{name}: fixed {rows} rows'))
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters ({sum(fixed.values())} rows fixed)'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from home import answers
+
+
+class Command(BaseCommand):
+    help = 'Fold new quiz answer events into per-card accuracy and per-wordbook difficulty'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute all statistics from every event')
+
+    def handle(self, *args, **options):
+        processed = answers.rollup(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {processed} answer events'))
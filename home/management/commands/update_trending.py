@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from home import fragment_cache, trending
+
+
+class Command(BaseCommand):
+    help = 'Fold likes, bookmarks, stars and new wordbooks since the last run into the trending scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild all scores from the full history (also drops removed likes/bookmarks)',
+        )
+
+    def handle(self, *args, **options):
+        updated = trending.update_scores(full=options['full'])
+        fragment_cache.invalidate(fragment_cache.HOME_SECTIONS)
+        self.stdout.write(self.style.SUCCESS(f'Updated trending scores for {updated} wordbooks'))
@@ -0,0 +1,133 @@
+import mimetypes
+import os
+import time
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from . import query_stats, static_manifest
+from .storage import ENCODING_SUFFIXES
+
+# static_version の URL（?v= が内容ハッシュと一致）は内容が変わらないので無期限にキャッシュさせる
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# ?v= の付かない URL（{% static %} の画像など）は短めにして、切れたら ETag で再検証させる
+STATIC_CACHE_CONTROL = 'public, max-age=3600'
+
+
+class QueryStatsMiddleware:
+    """URL名ごとにクエリ数・DB時間・重複クエリ・応答生成時間を記録する
+
+    settings.QUERY_STATS_SERVER_TIMING が True なら Server-Timing ヘッダーも付ける。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = query_stats.QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total_time = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            query_stats.record(match.url_name, recorder, total_time)
+
+        if getattr(settings, 'QUERY_STATS_SERVER_TIMING', False):
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+                f'app;dur={(total_time - recorder.duration) * 1000:.1f}, '
+                f'total;dur={total_time * 1000:.1f}'
+            )
+        return response
+
+
+def _accepted_encodings(header):
+    """Accept-Encoding を {エンコーディング: q値} にする"""
+    accepted = {}
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[token] = quality
+    return accepted
+
+
+def negotiate_encoding(header, available):
+    """available（優先順）のうちクライアントが受け付けるもの。無ければ None（無圧縮）"""
+    if not available:
+        return None
+    accepted = _accepted_encodings(header)
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class PrecompressedStaticMiddleware:
+    """STATIC_ROOT の静的ファイルを、圧縮済みの版を選んでキャッシュ用のヘッダー付きで返す
+
+    collectstatic が書き出した manifest（home.static_manifest）に載っているパスだけを扱い、
+    それ以外は後続へ渡す。Accept-Encoding に合わせて .br / .gz の版を選び、FileResponse で
+    返すので、WSGI サーバーが wsgi.file_wrapper を持っていれば sendfile でそのまま送られる。
+    DEBUG 中は開発サーバーが各アプリの static/ から配信するので使わない。
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self.root = str(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            path = request.path[len(self.prefix):]
+            entry = static_manifest.load().get(path)
+            if entry is not None:
+                response = self.serve(request, path, entry)
+                if response is not None:
+                    return response
+        return self.get_response(request)
+
+    def serve(self, request, path, entry):
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), entry['encodings'])
+        etag = f'"{entry["hash"]}-{encoding}"' if encoding else f'"{entry["hash"]}"'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            name = path + ENCODING_SUFFIXES[encoding] if encoding else path
+            try:
+                file = open(os.path.join(self.root, name), 'rb')
+            except FileNotFoundError:
+                # manifest が古い（collectstatic の途中など）。後続に任せる
+                return None
+            content_type, _ = mimetypes.guess_type(path)
+            response = FileResponse(file, content_type=content_type or 'application/octet-stream')
+            # FileResponse はファイル名から Content-Disposition を付けるが、静的ファイルには要らない
+            del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = etag
+        if entry['encodings']:
+            response['Vary'] = 'Accept-Encoding'
+        if request.GET.get('v') == entry['hash']:
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = STATIC_CACHE_CONTROL
+        return response
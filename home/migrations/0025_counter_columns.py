@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+from home import counters
+
+
+# この時点で存在するカウンタのみ（後から COUNTERS が増えても影響しないように固定）
+COUNTERS = [
+    ('home.WordBook', 'cards_count', 'home.WordCard', 'wordbook', 'pk'),
+    ('home.WordBook', 'likes_count', 'home.wordBookLike', 'wordbook', 'pk'),
+    ('home.WordBook', 'bookmarks_count', 'home.WordBookBookmark', 'wordbook', 'pk'),
+    ('home.UserProfile', 'followers_count', 'home.UserFollow', 'following', 'user_id'),
+    ('home.UserProfile', 'following_count', 'home.UserFollow', 'follower', 'user_id'),
+    ('home.UserProfile', 'likes_received_count', 'home.wordBookLike', 'wordbook__user', 'user_id'),
+]
+
+
+def backfill_counters(apps, schema_editor):
+    counters.reconcile(apps, COUNTERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0024_wordbook_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='likes_received_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wordbook',
+            name='bookmarks_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wordbook',
+            name='cards_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wordbook',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
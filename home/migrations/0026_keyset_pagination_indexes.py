@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0025_counter_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userfollow',
+            index=models.Index(fields=['follower', '-created_at', '-id'], name='home_follow_follower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userfollow',
+            index=models.Index(fields=['following', '-created_at', '-id'], name='home_follow_following_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wordbook',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='home_wb_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wordbookbookmark',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='home_bm_user_created_idx'),
+        ),
+    ]
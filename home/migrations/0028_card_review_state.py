@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def schedule_starred_cards(apps, schema_editor):
+    """既存のスター付きカードを、すぐ復習できる状態で登録する"""
+    WordCardStar = apps.get_model('home', 'WordCardStar')
+    CardReviewState = apps.get_model('home', 'CardReviewState')
+    now = django.utils.timezone.now()
+    CardReviewState.objects.bulk_create(
+        [
+            CardReviewState(user_id=user_id, card_id=card_id, due_at=now)
+            for user_id, card_id in WordCardStar.objects.values_list('user_id', 'wordcard_id').iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0027_trending_score'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardReviewState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repetitions', models.PositiveIntegerField(default=0)),
+                ('interval_days', models.FloatField(default=0)),
+                ('ease_factor', models.FloatField(default=2.5)),
+                ('lapses', models.PositiveIntegerField(default=0)),
+                ('due_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to='home.wordcard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_at'], name='home_review_user_due_idx')],
+                'unique_together': {('user', 'card')},
+            },
+        ),
+        migrations.RunPython(schedule_starred_cards, migrations.RunPython.noop),
+    ]
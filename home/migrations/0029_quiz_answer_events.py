@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0028_card_review_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobcheckpoint',
+            name='last_event_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CardAnswerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('accuracy', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='answer_stats', to='home.wordcard')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WordBookAnswerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('accuracy', models.FloatField(default=0)),
+                ('difficulty', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('wordbook', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='answer_stats', to='home.wordbook')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='QuizAnswerEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correct', models.BooleanField()),
+                ('timed_out', models.BooleanField(default=False)),
+                ('response_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('idempotency_key', models.CharField(max_length=64)),
+                ('answered_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_answers', to='home.wordcard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_answers', to=settings.AUTH_USER_MODEL)),
+                ('wordbook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_answers', to='home.wordbook')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'idempotency_key'), name='home_answer_idempotency_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0030_follow_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordBookSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('common_users', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='home.wordbook')),
+                ('wordbook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='home.wordbook')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wordbook', '-score'], name='home_similar_wb_score_idx')],
+                'unique_together': {('wordbook', 'similar')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:17
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def backfill_roles(apps, schema_editor):
+    """これまでの判定（ユーザー名 'AI' か AI 単語帳の持ち主／sakana kousei1207）をフラグに移す"""
+    User = apps.get_model('auth', 'User')
+    UserProfile = apps.get_model('home', 'UserProfile')
+    WordBook = apps.get_model('home', 'WordBook')
+
+    ai_users = User.objects.filter(
+        Q(username='AI') | Q(pk__in=WordBook.objects.filter(is_ai_generated=True).values('user_id'))
+    )
+    admins = User.objects.filter(username='sakana', first_name='kousei1207')
+    for users, flag in ((ai_users, 'is_ai'), (admins, 'is_site_admin')):
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=pk) for pk in users.filter(profile__isnull=True).values_list('pk', flat=True)],
+        )
+        UserProfile.objects.filter(user__in=users).update(**{flag: True})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0031_wordbook_similarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='is_ai',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='is_site_admin',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_roles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0033_avatar_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wordcard',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from django.utils import timezone
 
+from . import images
+
 
 # ユーザープロファイル画像モデル
 class UserProfile(models.Model):
@@ -17,17 +20,38 @@ class UserProfile(models.Model):
         ('account8.png', 'Account 8'),
     ])
     custom_avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name='カスタムアバター画像')
+    # custom_avatar の縮小版 {サイズ: {'webp': 名前, 'png': 名前}}（home/images.py で生成）
+    avatar_renditions = models.JSONField(default=dict, blank=True)
     background_color = models.CharField(max_length=7, default='#fffff0')
+
+    # 役割（home/roles.py の user_roles でリクエストごとに1回だけ読む）
+    # AI が作成した単語帳の持ち主（プロフィール非表示・フォロー不可）
+    is_ai = models.BooleanField(default=False)
+    # サイト管理者（ダッシュボード・ピン留め・非公開単語帳の閲覧）
+    is_site_admin = models.BooleanField(default=False)
+
+    # 集計カウンタ（signals で更新、ずれたら reconcile_counters で修正）
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    likes_received_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
     
-    def get_avatar_url(self):
-        """アバター画像のURLを取得"""
+    def get_avatar_url(self, size=None, fallback=False):
+        """アバター画像のURLを取得
+
+        size は表示サイズ（px）の目安で、カスタムアバターはそれ以上で最小の縮小版を返す。
+        fallback=True なら WebP の代わりに PNG の縮小版を返す。
+        """
         if self.custom_avatar:
-            return self.custom_avatar.url
+            rendition = images.pick(self.avatar_renditions, size)
+            if rendition is None:  # 縮小版を作る前にアップロードされたもの
+                return self.custom_avatar.url
+            return default_storage.url(rendition['png' if fallback else 'webp'])
         return f'/static/home/images/django icon/{self.avatar_image}'
 
 
@@ -44,6 +68,17 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+
+class WordBookQuerySet(models.QuerySet):
+    def with_creator_profile(self):
+        """作成者とそのプロファイルを JOIN で同時に取得する
+
+        一覧表示で get_avatar_url / get_background_color を呼んでも
+        1冊ごとの追加クエリが発生しないようにする。
+        """
+        return self.select_related('user__profile')
+
+
 # 単語帳モデル
 class WordBook(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wordbooks')
@@ -56,29 +91,44 @@ class WordBook(models.Model):
     background_color = models.CharField(max_length=7, blank=True, null=True)
     is_ai_generated = models.BooleanField(default=False)
     is_public = models.BooleanField(default=False, verbose_name='公開する')
+    # 最初に公開した日時（フォロー中の新着はこの順に並べる）
+    published_at = models.DateTimeField(null=True, blank=True)
     
     # 管理者専用機能
     is_pinned = models.BooleanField(default=False, verbose_name='ピン留め（おすすめ）')
     
+    # 集計カウンタ（signals で更新、ずれたら reconcile_counters で修正）
+    cards_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    bookmarks_count = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = WordBookQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # ユーザー別一覧のキーセットページネーション用
+            models.Index(fields=['user', '-created_at', '-id'], name='home_wb_user_created_idx'),
+            # フォロワーの多い作者の新着を読み出し時に集めるとき用
+            models.Index(fields=['user', '-published_at', '-id'], name='home_wb_user_published_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
     def card_count(self):
-        return self.cards.count()
+        return self.cards_count
 
-    def get_avatar_url(self):
+    def get_avatar_url(self, size=None, fallback=False):
         """単語帳固有のアバター画像があればそれを返し、なければ作成者のプロファイル画像を返す"""
         if self.is_ai_generated:
             return '/static/home/images/robot.svg'
         if self.avatar_image:
             return f'/static/home/images/django icon/{self.avatar_image}'
-        return self.user.profile.get_avatar_url()
+        return self.user.profile.get_avatar_url(size, fallback)
 
     def get_background_color(self):
         """単語帳固有の背景色があればそれを返し、なければ作成者のプロファイル背景色を返す"""
@@ -94,6 +144,8 @@ class WordCard(models.Model):
     front_text = models.CharField(max_length=200, verbose_name='表面(英単語)')
     back_text = models.TextField(verbose_name='裏面(意味)')
     image = models.ImageField(upload_to='word_images/', blank=True, null=True, verbose_name='画像')
+    # image の幅別縮小版 {幅: {拡張子: ストレージ上の名前}}（images.width_renditions）
+    image_renditions = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -122,7 +174,10 @@ class WordBookBookmark(models.Model):
 
     class Meta:
         unique_together = ('user', 'wordbook')
-        indexes = [models.Index(fields=['user', 'wordbook'])]
+        indexes = [
+            models.Index(fields=['user', 'wordbook']),
+            models.Index(fields=['user', '-created_at', '-id'], name='home_bm_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.wordbook.title}"
@@ -150,7 +205,149 @@ class UserFollow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following')
-        indexes = [models.Index(fields=['follower', 'following'])]
+        indexes = [
+            models.Index(fields=['follower', 'following']),
+            models.Index(fields=['follower', '-created_at', '-id'], name='home_follow_follower_idx'),
+            models.Index(fields=['following', '-created_at', '-id'], name='home_follow_following_idx'),
+        ]
 
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
+
+
+# フォロー中のユーザーが公開した単語帳の受信箱（書き込み時に配布、home/feed.py 参照）
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    wordbook = models.ForeignKey(WordBook, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # 単語帳の published_at の複製（受信箱をインデックスだけで新しい順に読むため）
+    published_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'wordbook')
+        indexes = [
+            models.Index(fields=['user', '-published_at', '-wordbook'], name='home_feed_user_published_idx'),
+            # フォロー解除時に、その作者の分をまとめて消す用
+            models.Index(fields=['user', 'author'], name='home_feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} <- {self.wordbook.title}"
+
+
+# 単語カードごとの復習スケジュール（SM-2、home/reviews.py で更新）
+class CardReviewState(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='review_states')
+    card = models.ForeignKey(WordCard, on_delete=models.CASCADE, related_name='review_states')
+    repetitions = models.PositiveIntegerField(default=0)
+    interval_days = models.FloatField(default=0)
+    ease_factor = models.FloatField(default=2.5)
+    lapses = models.PositiveIntegerField(default=0)
+    due_at = models.DateTimeField(default=timezone.now)
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'card')
+        indexes = [
+            # 期限の来たカードを期限順に取り出す範囲走査用
+            models.Index(fields=['user', 'due_at'], name='home_review_user_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.card.front_text} (due {self.due_at:%Y-%m-%d})"
+
+
+# クイズの回答ログ（追記専用、home/answers.py 参照）
+class QuizAnswerEvent(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_answers')
+    card = models.ForeignKey(WordCard, on_delete=models.CASCADE, related_name='quiz_answers')
+    wordbook = models.ForeignKey(WordBook, on_delete=models.CASCADE, related_name='quiz_answers')
+    correct = models.BooleanField()
+    timed_out = models.BooleanField(default=False)
+    response_ms = models.PositiveIntegerField(null=True, blank=True)
+    # クライアントが回答ごとに付ける一意なキー（再送で二重に数えないため）
+    idempotency_key = models.CharField(max_length=64)
+    answered_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='home_answer_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.card.front_text} {'○' if self.correct else '×'}"
+
+
+# カードごとの正答率（rollup_quiz_stats コマンドで集計）
+class CardAnswerStats(models.Model):
+    card = models.OneToOneField(WordCard, on_delete=models.CASCADE, related_name='answer_stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    accuracy = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.card.front_text}: {self.correct}/{self.attempts}"
+
+
+# 単語帳ごとの難易度（rollup_quiz_stats コマンドで集計）
+class WordBookAnswerStats(models.Model):
+    wordbook = models.OneToOneField(WordBook, on_delete=models.CASCADE, related_name='answer_stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    accuracy = models.FloatField(default=0)
+    # 回答数が少ない単語帳が極端な値にならないよう事前分布で平滑化した 1 - 正答率
+    difficulty = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.wordbook.title}: difficulty {self.difficulty:.2f}"
+
+
+# 単語帳のトレンドスコア（update_trending コマンドで更新）
+class WordBookTrendingScore(models.Model):
+    wordbook = models.OneToOneField(WordBook, on_delete=models.CASCADE, related_name='trending')
+    # 時間減衰させたイベント重みの合計を、固定の基準時刻に対する対数で保持する（home/trending.py 参照）
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-score'], name='home_trending_score_idx')]
+
+    def __str__(self):
+        return f"{self.wordbook.title}: {self.score:.3f}"
+
+
+# 「この単語帳をいいねした人はこんな単語帳も」（build_recommendations コマンドで計算）
+class WordBookSimilarity(models.Model):
+    wordbook = models.ForeignKey(WordBook, on_delete=models.CASCADE, related_name='similarities')
+    similar = models.ForeignKey(WordBook, on_delete=models.CASCADE, related_name='+')
+    # いいね・保存したユーザー集合のコサイン類似度（home/recommendations.py 参照）
+    score = models.FloatField()
+    # 両方にいいね・保存したユーザー数
+    common_users = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('wordbook', 'similar')
+        indexes = [
+            models.Index(fields=['wordbook', '-score'], name='home_similar_wb_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wordbook.title} ~ {self.similar.title}: {self.score:.3f}"
+
+
+# 定期実行コマンドの処理済み位置
+class JobCheckpoint(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    # 追記専用テーブルをどの id まで処理したか
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_run_at}"
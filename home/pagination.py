@@ -0,0 +1,56 @@
+"""(created_at, id) の降順によるキーセット（カーソル）ページネーション
+
+OFFSET を使わず「前ページ最後の行より古いもの」を条件に取るので、
+何ページ目でもインデックスの範囲走査1回で済む。
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+PAGE_SIZE = 24
+
+
+def encode_position(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def encode_cursor(obj):
+    return encode_position(obj.created_at, obj.pk)
+
+
+def decode_cursor(cursor):
+    """カーソル文字列を (日時, pk) に戻す。不正な値なら None（先頭ページ扱い）"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode('ascii').split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor, page_size=PAGE_SIZE):
+    """新しい順に1ページ分のオブジェクトと次ページのカーソル（無ければ None）を返す"""
+    queryset = queryset.order_by('-created_at', '-pk')
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    items = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
+
+
+def wants_fragment(request):
+    return request.GET.get('format') == 'json'
+
+
+def fragment_response(request, template_name, context, next_cursor):
+    """無限スクロール用に、次ページの HTML 断片とカーソルを JSON で返す"""
+    html = render_to_string(template_name, context, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
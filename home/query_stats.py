@@ -0,0 +1,86 @@
+"""ビュー（URL名）ごとのクエリ数・DB時間の集計"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+# URL名ごとに保持する重複クエリの種類の上限
+MAX_DUPLICATE_SIGNATURES = 20
+
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def signature(sql):
+    """パラメータの違いを無視したクエリの形（N+1 検出用）"""
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """connection.execute_wrapper に渡して1リクエスト分のクエリを記録する"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.signatures[signature(sql)] += 1
+
+    def duplicates(self):
+        return {sig: n for sig, n in self.signatures.items() if n > 1}
+
+
+class _ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.total_time = 0.0
+        self.duplicates = Counter()
+
+    def as_dict(self):
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / requests, 2),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time * 1000 / requests, 2),
+            'avg_total_ms': round(self.total_time * 1000 / requests, 2),
+            'duplicate_queries': [
+                {'sql': sql, 'count': n} for sql, n in self.duplicates.most_common(MAX_DUPLICATE_SIGNATURES)
+            ],
+        }
+
+
+_lock = threading.Lock()
+_stats = defaultdict(_ViewStats)
+
+
+def record(url_name, recorder, total_time):
+    with _lock:
+        stats = _stats[url_name]
+        stats.requests += 1
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.db_time += recorder.duration
+        stats.total_time += total_time
+        stats.duplicates.update(recorder.duplicates())
+
+
+def snapshot():
+    with _lock:
+        return {name: stats.as_dict() for name, stats in sorted(_stats.items())}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
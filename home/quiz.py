@@ -0,0 +1,123 @@
+"""クイズの出題順と問題バッチの生成
+
+デッキ全体をページに埋め込まず、セッションには乱数の seed と出題モードだけを保存する。
+出題順は「カード id の昇順リストを seed でシャッフルしたもの」なので、
+同じ seed なら何度リクエストしても同じ順序になり、途中から再開できる。
+問題はバッチ単位で、選択肢（ダミー3つ）も選んだ状態で返す。
+"""
+import random
+import secrets
+
+from .models import WordCard
+
+SESSION_KEY = 'quiz:{wordbook_id}'
+
+BATCH_SIZE = 20
+MAX_BATCH_SIZE = 50
+OPTION_COUNT = 4
+MIN_CARDS = 4
+# 復習モードでセッションに保存するカード id の上限
+MAX_REVIEW_CARDS = 500
+
+
+def _session_key(wordbook):
+    return SESSION_KEY.format(wordbook_id=wordbook.pk)
+
+
+def start(session, wordbook, mode='all', review_ids=None, resume=False):
+    """クイズを開始してセッションに状態を保存し、その状態を返す
+
+    resume=True で同じモードの状態が残っていればそれを使う。
+    復習モードで対象カードが1枚も無ければ None を返す。
+    """
+    key = _session_key(wordbook)
+    state = session.get(key)
+    if resume and state and state['mode'] == mode:
+        return state
+
+    state = {'quiz_id': secrets.token_hex(8), 'mode': mode, 'seed': secrets.randbits(32)}
+    if mode == 'review':
+        ids = list(
+            WordCard.objects.filter(wordbook=wordbook, pk__in=(review_ids or [])[:MAX_REVIEW_CARDS])
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        if not ids:
+            return None
+        state['card_ids'] = ids
+    session[key] = state
+    return state
+
+
+def get_state(session, wordbook, quiz_id):
+    state = session.get(_session_key(wordbook))
+    if state is None or state['quiz_id'] != quiz_id:
+        return None
+    return state
+
+
+def deck_ids(wordbook):
+    return list(wordbook.cards.order_by('pk').values_list('pk', flat=True))
+
+
+def question_order(state, all_ids):
+    """出題するカード id の順序"""
+    ids = list(state['card_ids']) if state['mode'] == 'review' else list(all_ids)
+    random.Random(state['seed']).shuffle(ids)
+    return ids
+
+
+def _pick_distractors(rng, card_id, all_ids):
+    """正解以外から候補を多めに選ぶ（意味が同じカードを除いたあと3つに絞る）"""
+    count = min(len(all_ids) - 1, (OPTION_COUNT - 1) * 2)
+    candidates = set()
+    while len(candidates) < count:
+        other = all_ids[rng.randrange(len(all_ids))]
+        if other != card_id:
+            candidates.add(other)
+    return sorted(candidates)
+
+
+def question_batch(state, wordbook, offset, limit=BATCH_SIZE):
+    """offset 番目から limit 問分の問題と、出題数の合計を返す
+
+    各問題は {'index', 'id', 'front', 'back', 'options': [{'id', 'back'}, ...]}。
+    カード本文の読み込みは、問題と選択肢のカードを合わせた1クエリで済ませる。
+    """
+    all_ids = deck_ids(wordbook)
+    order = question_order(state, all_ids)
+    batch_ids = order[offset:offset + limit]
+
+    distractors = {}
+    for position, card_id in enumerate(batch_ids, start=offset):
+        rng = random.Random(f"{state['seed']}:{position}")
+        distractors[card_id] = _pick_distractors(rng, card_id, all_ids)
+
+    needed = set(batch_ids)
+    for ids in distractors.values():
+        needed.update(ids)
+    cards = WordCard.objects.only('pk', 'front_text', 'back_text').in_bulk(needed)
+
+    questions = []
+    for position, card_id in enumerate(batch_ids, start=offset):
+        card = cards.get(card_id)
+        if card is None:  # 出題中に削除されたカード
+            continue
+        options = [{'id': card.pk, 'back': card.back_text}]
+        seen = {card.back_text}
+        for other_id in distractors[card_id]:
+            other = cards.get(other_id)
+            if other is None or other.back_text in seen:
+                continue
+            seen.add(other.back_text)
+            options.append({'id': other.pk, 'back': other.back_text})
+            if len(options) == OPTION_COUNT:
+                break
+        random.Random(f"{state['seed']}:{position}:options").shuffle(options)
+        questions.append({
+            'index': position,
+            'id': card.pk,
+            'front': card.front_text,
+            'back': card.back_text,
+            'options': options,
+        })
+    return questions, len(order)
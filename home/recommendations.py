@@ -0,0 +1,123 @@
+"""「この単語帳をいいねした人はこんな単語帳も」の事前計算（アイテム間協調フィルタリング）
+
+いいね・保存をユーザー×単語帳の 0/1 行列とみなし、単語帳 i, j の類似度を
+それぞれをいいね・保存したユーザー集合のコサイン類似度
+|U_i ∩ U_j| / sqrt(|U_i| |U_j|) とする。行列は疎なので、ユーザーごとの単語帳集合から
+共起数だけを数える（計算量はユーザーごとの操作数の2乗の和）。
+単語帳ごとに上位 TOP_K 件を WordBookSimilarity に保存し、詳細ページはそれを1回読むだけにする。
+"""
+import heapq
+import math
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobCheckpoint, WordBook, WordBookBookmark, WordBookSimilarity, wordBookLike
+
+CHECKPOINT_NAME = 'recommendations'
+
+TOP_K = 10
+# 共通のユーザーがこれより少ない組は偶然の一致として扱わない
+MIN_COMMON_USERS = 2
+# 操作数が極端に多いユーザー（まとめていいねするアカウントなど）は共起に入れない
+MAX_USER_INTERACTIONS = 1000
+
+BATCH_SIZE = 500
+
+
+def load_interactions():
+    """(単語帳 id → ユーザー id の集合, ユーザー id → 単語帳 id の集合)"""
+    users_of = {}
+    wordbooks_of = {}
+    for model in (wordBookLike, WordBookBookmark):
+        for user_id, wordbook_id in model.objects.values_list('user_id', 'wordbook_id').iterator():
+            users_of.setdefault(wordbook_id, set()).add(user_id)
+            wordbooks_of.setdefault(user_id, set()).add(wordbook_id)
+    for user_id in [u for u, items in wordbooks_of.items() if len(items) > MAX_USER_INTERACTIONS]:
+        for wordbook_id in wordbooks_of.pop(user_id):
+            users_of[wordbook_id].discard(user_id)
+    return users_of, wordbooks_of
+
+
+def similar_to(wordbook_id, users_of, wordbooks_of, candidates, top_k=TOP_K, min_common=MIN_COMMON_USERS):
+    """wordbook_id に似た単語帳を [(単語帳 id, 類似度, 共通ユーザー数), ...] で類似度の高い順に返す"""
+    users = users_of.get(wordbook_id)
+    if not users:
+        return []
+    common = Counter()
+    for user_id in users:
+        common.update(wordbooks_of.get(user_id, ()))
+    scored = (
+        (other_id, count / math.sqrt(len(users) * len(users_of[other_id])), count)
+        for other_id, count in common.items()
+        if other_id != wordbook_id and count >= min_common and other_id in candidates
+    )
+    return heapq.nlargest(top_k, scored, key=lambda item: (item[1], item[2], -item[0]))
+
+
+def changed_wordbook_ids(since):
+    """since 以降にいいね・保存が付いた単語帳 id"""
+    changed = set()
+    for model in (wordBookLike, WordBookBookmark):
+        changed.update(model.objects.filter(created_at__gt=since).values_list('wordbook_id', flat=True))
+    return changed
+
+
+def build(full=False, top_k=TOP_K, min_common=MIN_COMMON_USERS, now=None):
+    """類似単語帳を計算して保存し、計算し直した単語帳の数を返す
+
+    差分実行では前回以降にいいね・保存が付いた単語帳と、それらと共通のユーザーを持つ単語帳
+    （類似度が変わりうるもの）だけを計算し直す。取り消されたいいね等は検出できないので、
+    定期的に full で作り直すこと。
+    """
+    now = now or timezone.now()
+    users_of, wordbooks_of = load_interactions()
+    # 勧めてよいのは誰でも見られる単語帳だけ
+    candidates = set(
+        WordBook.objects.filter(Q(is_public=True) | Q(is_ai_generated=True)).values_list('pk', flat=True)
+    )
+
+    with transaction.atomic():
+        checkpoint, _ = JobCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT_NAME)
+        if full or checkpoint.last_run_at is None:
+            targets = set(users_of)
+            WordBookSimilarity.objects.all().delete()
+        else:
+            changed = changed_wordbook_ids(checkpoint.last_run_at)
+            targets = set(changed)
+            for wordbook_id in changed:
+                for user_id in users_of.get(wordbook_id, ()):
+                    targets.update(wordbooks_of.get(user_id, ()))
+
+        targets = sorted(targets)
+        for start in range(0, len(targets), BATCH_SIZE):
+            batch = targets[start:start + BATCH_SIZE]
+            rows = [
+                WordBookSimilarity(
+                    wordbook_id=wordbook_id, similar_id=other_id,
+                    score=score, common_users=count, updated_at=now,
+                )
+                for wordbook_id in batch
+                for other_id, score, count in similar_to(
+                    wordbook_id, users_of, wordbooks_of, candidates, top_k, min_common,
+                )
+            ]
+            WordBookSimilarity.objects.filter(wordbook_id__in=batch).delete()
+            WordBookSimilarity.objects.bulk_create(rows)
+
+        checkpoint.last_run_at = now
+        checkpoint.save(update_fields=['last_run_at', 'updated_at'])
+    return len(targets)
+
+
+def similar_wordbooks(wordbook, limit=TOP_K):
+    """詳細ページ用：保存済みの類似単語帳を類似度順に（見られなくなった単語帳は除く）"""
+    return [
+        row.similar for row in
+        WordBookSimilarity.objects.filter(wordbook=wordbook)
+        .filter(Q(similar__is_public=True) | Q(similar__is_ai_generated=True))
+        .select_related('similar__user__profile')
+        .order_by('-score')[:limit]
+    ]
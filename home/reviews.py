@@ -0,0 +1,137 @@
+"""SM-2 による単語カードの復習スケジュール
+
+ユーザー×カードごとに CardReviewState を1行持ち、次の復習日時 due_at を
+(user, due_at) インデックスで引けるようにしておく。期限の来たカードは
+単語帳をまたいで1回の範囲走査で取り出せる。
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CardReviewState, WordCard
+
+MIN_EASE_FACTOR = 1.3
+# 間違えたカードは SM-2 の「同じ日のうちにもう一度」として少し後に出す
+RELEARN_DELAY = timedelta(minutes=10)
+
+# クイズの結果を SM-2 の評価（0〜5）に直す
+QUALITY_CORRECT = 4
+QUALITY_INCORRECT = 1
+QUALITY_TIMEOUT = 0
+
+DUE_LIMIT = 20
+MAX_DUE_LIMIT = 100
+MAX_BATCH_RESULTS = 200
+
+SCHEDULE_FIELDS = ['repetitions', 'interval_days', 'ease_factor', 'lapses', 'due_at', 'last_reviewed_at']
+
+
+def schedule(state, quality, now):
+    """SM-2 で state を更新する（保存はしない）"""
+    if quality >= 3:
+        if state.repetitions == 0:
+            state.interval_days = 1
+        elif state.repetitions == 1:
+            state.interval_days = 6
+        else:
+            state.interval_days = round(state.interval_days * state.ease_factor, 2)
+        state.repetitions += 1
+        state.due_at = now + timedelta(days=state.interval_days)
+    else:
+        state.repetitions = 0
+        state.interval_days = 0
+        state.lapses += 1
+        state.due_at = now + RELEARN_DELAY
+    state.ease_factor = max(
+        MIN_EASE_FACTOR,
+        state.ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02),
+    )
+    state.last_reviewed_at = now
+    return state
+
+
+def visible_q(user, prefix=''):
+    """閲覧できる単語帳（公開・AI生成・自分の単語帳）のカードに絞る条件"""
+    return (
+        Q(**{f'{prefix}wordbook__is_public': True})
+        | Q(**{f'{prefix}wordbook__is_ai_generated': True})
+        | Q(**{f'{prefix}wordbook__user': user})
+    )
+
+
+def due_states(user, limit=DUE_LIMIT, now=None):
+    """期限の来たカードを期限の古い順に limit 件、カードと単語帳ごと返す"""
+    now = now or timezone.now()
+    return list(
+        CardReviewState.objects.filter(user=user, due_at__lte=now)
+        .filter(visible_q(user, 'card__'))
+        .select_related('card__wordbook')
+        .order_by('due_at')[:limit]
+    )
+
+
+def due_count(user, now=None):
+    now = now or timezone.now()
+    return CardReviewState.objects.filter(user=user, due_at__lte=now).filter(visible_q(user, 'card__')).count()
+
+
+def ensure_scheduled(user_id, card_id, now=None):
+    """まだ復習対象でないカードを、すぐ復習できる状態で登録する（スターを付けたときなど）"""
+    CardReviewState.objects.get_or_create(user_id=user_id, card_id=card_id, defaults={'due_at': now or timezone.now()})
+
+
+def record_results(user, results, now=None):
+    """[(card_id, quality), ...] をまとめて反映し、反映した件数を返す
+
+    既存の行は1クエリで読み、更新は bulk_update、新規は bulk_create（同時作成に備えて upsert）で
+    1トランザクションにまとめる。閲覧できないカードの結果は捨てる。
+    """
+    now = now or timezone.now()
+    card_ids = {card_id for card_id, _ in results}
+    visible_ids = set(WordCard.objects.filter(visible_q(user), pk__in=card_ids).values_list('pk', flat=True))
+
+    with transaction.atomic():
+        existing = {
+            state.card_id: state
+            for state in CardReviewState.objects.select_for_update().filter(user=user, card_id__in=visible_ids)
+        }
+        touched = {}
+        created = {}
+        applied = 0
+        for card_id, quality in results:
+            if card_id not in visible_ids:
+                continue
+            state = existing.get(card_id)
+            if state is not None:
+                touched[card_id] = state
+            else:
+                state = created.get(card_id)
+                if state is None:
+                    state = created[card_id] = CardReviewState(user=user, card_id=card_id)
+            schedule(state, quality, now)
+            applied += 1
+
+        CardReviewState.objects.bulk_update(touched.values(), SCHEDULE_FIELDS)
+        CardReviewState.objects.bulk_create(
+            created.values(),
+            update_conflicts=True,
+            unique_fields=['user', 'card'],
+            update_fields=SCHEDULE_FIELDS,
+        )
+    return applied
+
+
+def quality_from_result(result):
+    """送信された1件分の結果から評価を取り出す。不正なら ValueError"""
+    if 'quality' in result:
+        quality = int(result['quality'])
+        if not 0 <= quality <= 5:
+            raise ValueError('quality must be 0-5')
+        return quality
+    if result.get('timed_out'):
+        return QUALITY_TIMEOUT
+    if 'correct' in result:
+        return QUALITY_CORRECT if result['correct'] else QUALITY_INCORRECT
+    raise ValueError('quality or correct required')
@@ -0,0 +1,40 @@
+"""ユーザーの役割（AI アカウント・サイト管理者）
+
+役割は UserProfile の is_ai / is_site_admin に持ち、user_roles で読む。
+読んだ結果はユーザーオブジェクトに保存するので、同じリクエスト内で
+何度呼んでもプロファイルの読み込みは1回で済む（select_related('profile') 済みなら0回）。
+"""
+from collections import namedtuple
+
+from .models import UserProfile
+
+Roles = namedtuple('Roles', ['is_ai', 'is_site_admin'])
+
+NO_ROLES = Roles(is_ai=False, is_site_admin=False)
+
+# このユーザー名のアカウントは作成・改名した時点で AI アカウントとして扱う
+AI_USERNAME = 'AI'
+
+_CACHE_ATTR = '_home_roles'
+
+
+def user_roles(user):
+    """user の役割を返す（未ログインやプロファイル未作成なら役割なし）"""
+    if user is None or not user.is_authenticated:
+        return NO_ROLES
+    roles = getattr(user, _CACHE_ATTR, None)
+    if roles is None:
+        try:
+            profile = user.profile
+        except UserProfile.DoesNotExist:
+            roles = NO_ROLES
+        else:
+            roles = Roles(is_ai=profile.is_ai, is_site_admin=profile.is_site_admin)
+        setattr(user, _CACHE_ATTR, roles)
+    return roles
+
+
+def mark_ai(user_id):
+    """AI アカウント（AI_USERNAME のユーザー・AI が作成した単語帳の持ち主）として記録する"""
+    if not UserProfile.objects.filter(user_id=user_id, is_ai=False).update(is_ai=True):
+        UserProfile.objects.get_or_create(user_id=user_id, defaults={'is_ai': True})
@@ -0,0 +1,136 @@
+"""単語帳のキーワード検索（SQLite FTS5 の転置インデックス）
+
+単語帳ごとにタイトル・説明・全カードの表裏テキストを1行にまとめて
+FTS5 仮想テーブルへ登録し、bm25 で関連度順に並べる。
+trigram トークナイザなので日本語でも部分一致（icontains 相当）で検索できる。
+"""
+import threading
+
+from django.db import connection, transaction
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'home_wordbook_fts'
+
+# trigram は3文字未満のクエリにマッチできないため、その場合は従来の icontains 検索に任せる
+MIN_QUERY_LENGTH = 3
+
+# bm25 の列ごとの重み（タイトル > 説明 > カード本文）
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+# DBごとのテーブル有無のキャッシュ（毎回 sqlite_master を引かないように）
+_available = {}
+
+# スレッド（＝DB 接続）ごとの、コミット後に作り直す予定の単語帳 id
+_pending = threading.local()
+
+_INDEX_SELECT = f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, description, cards)
+    SELECT wb.id, wb.title, wb.description,
+           COALESCE((SELECT group_concat(c.front_text || ' ' || c.back_text, char(10))
+                     FROM home_wordcard c WHERE c.wordbook_id = wb.id), '')
+    FROM home_wordbook wb
+"""
+
+
+def create_index(schema_editor):
+    """FTS5 仮想テーブルを作成して既存データを登録する（マイグレーション用）"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, description, cards, tokenize='trigram')"
+    )
+    schema_editor.execute(_INDEX_SELECT)
+    _available.clear()
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _available.clear()
+
+
+def is_available():
+    """FTS インデックスが使える DB かどうか"""
+    if connection.vendor != 'sqlite':
+        return False
+    key = str(connection.settings_dict['NAME'])
+    if key not in _available:
+        _available[key] = FTS_TABLE in connection.introspection.table_names()
+    return _available[key]
+
+
+def index_wordbook(wordbook_id):
+    """1冊分のインデックス行を作り直す（単語帳が削除済みなら行を消すだけ）"""
+    if not is_available():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [wordbook_id])
+        cursor.execute(_INDEX_SELECT + " WHERE wb.id = %s", [wordbook_id])
+
+
+def index_wordbook_after_commit(wordbook_id):
+    """コミット後に1冊分を作り直す。同じトランザクション内で何度呼ばれても1回にまとめる
+
+    カードを1枚保存するたびに単語帳全体を作り直すと、一括インポートで O(n²) になるため。
+    """
+    if not connection.in_atomic_block:
+        index_wordbook(wordbook_id)
+        return
+    # run_on_commit はコミット・ロールバックのたびに新しいリストに置き換わるので、
+    # 同じリストなら同じトランザクションの中（予定した作り直しも取り消されていない）
+    state = getattr(_pending, 'state', None)
+    if state is None or state[0] is not connection.run_on_commit:
+        state = _pending.state = (connection.run_on_commit, set())
+    if wordbook_id in state[1]:
+        return
+    state[1].add(wordbook_id)
+    transaction.on_commit(lambda: index_wordbook(wordbook_id))
+
+
+def remove_wordbook(wordbook_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [wordbook_id])
+
+
+def rebuild_index():
+    """インデックス全体を作り直す。登録件数を返す"""
+    if not is_available():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(_INDEX_SELECT)
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _to_match_expression(query):
+    # クエリ全体を1つのフレーズとして扱う（trigram では部分文字列一致になる）
+    return '"' + query.replace('"', '""') + '"'
+
+
+def search_filter(query):
+    """キーワード検索の (絞り込み条件, 関連度の並び順) を返す
+
+    絞り込みは FTS の MATCH をサブクエリにした pk__in で、件数では切らない。
+    表示権限の条件と同じ SELECT で組み合わさるので、見られない単語帳が上位を占めても
+    見られる単語帳を取りこぼさない。並び順は bm25 の相関サブクエリ（小さいほど関連度が高い）。
+    インデックスが使えない・クエリが短すぎる場合は None を返すので、
+    呼び出し側で icontains 検索にフォールバックすること。
+    """
+    if len(query) < MIN_QUERY_LENGTH or not is_available():
+        return None
+    expression = _to_match_expression(query)
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression])
+    rank = RawSQL(
+        f"(SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = home_wordbook.id)",
+        [expression],
+        output_field=FloatField(),
+    )
+    return {'pk__in': matches}, rank.asc()
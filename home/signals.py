@@ -0,0 +1,306 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import avatar_images, card_images, counters, feed, fragment_cache, reviews, roles, search, tags
+from .models import Tag, UserFollow, UserProfile, WordBook, WordBookBookmark, WordCard, WordCardStar, wordBookLike
+
+# 検索インデックスに影響する単語帳のフィールド
+SEARCH_FIELDS = {'title', 'description'}
+
+
+def _is_cascade(origin, model):
+    """post_delete が親オブジェクトの削除に伴う連鎖削除かどうか"""
+    if isinstance(origin, QuerySet):
+        return origin.model is not model
+    return not isinstance(origin, model)
+
+
+# ---- 検索インデックス ----
+@receiver(post_save, sender=WordBook)
+def index_wordbook_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    search.index_wordbook(instance.pk)
+
+
+@receiver(post_delete, sender=WordBook)
+def remove_wordbook_from_index(sender, instance, **kwargs):
+    search.remove_wordbook(instance.pk)
+
+
+@receiver(post_save, sender=WordCard)
+def index_wordbook_on_card_save(sender, instance, **kwargs):
+    search.index_wordbook_after_commit(instance.wordbook_id)
+
+
+@receiver(post_delete, sender=WordCard)
+def index_wordbook_on_card_delete(sender, instance, origin=None, **kwargs):
+    # 単語帳ごと消える場合はカード1枚ずつ作り直さない
+    if _is_cascade(origin, WordCard):
+        return
+    search.index_wordbook_after_commit(instance.wordbook_id)
+
+
+# ---- 集計カウンタ ----
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    # カウンタの更新先が必ずあるように、ユーザー作成時にプロファイルも作る
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+    if instance.username == roles.AI_USERNAME and not raw:
+        roles.mark_ai(instance.pk)
+
+
+def _bump_profile(user_id, **deltas):
+    if not counters.bump(UserProfile.objects.filter(user_id=user_id), **deltas):
+        # プロファイル未作成のユーザーは実数から作成する
+        UserProfile.objects.get_or_create(user_id=user_id, defaults={
+            'followers_count': UserFollow.objects.filter(following_id=user_id).count(),
+            'following_count': UserFollow.objects.filter(follower_id=user_id).count(),
+            'likes_received_count': wordBookLike.objects.filter(wordbook__user_id=user_id).count(),
+        })
+
+
+@receiver(post_save, sender=WordCard)
+def increment_cards_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(WordBook.objects.filter(pk=instance.wordbook_id), cards_count=1)
+
+
+@receiver(post_delete, sender=WordCard)
+def decrement_cards_count(sender, instance, origin=None, **kwargs):
+    if _is_cascade(origin, WordCard):
+        return
+    counters.bump(WordBook.objects.filter(pk=instance.wordbook_id), cards_count=-1)
+
+
+@receiver(post_save, sender=wordBookLike)
+def increment_likes_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(WordBook.objects.filter(pk=instance.wordbook_id), likes_count=1)
+        counters.bump(UserProfile.objects.filter(user__wordbooks=instance.wordbook_id), likes_received_count=1)
+
+
+@receiver(post_delete, sender=wordBookLike)
+def decrement_likes_count(sender, instance, **kwargs):
+    counters.bump(WordBook.objects.filter(pk=instance.wordbook_id), likes_count=-1)
+    counters.bump(UserProfile.objects.filter(user__wordbooks=instance.wordbook_id), likes_received_count=-1)
+
+
+@receiver(post_save, sender=WordBookBookmark)
+def increment_bookmarks_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(WordBook.objects.filter(pk=instance.wordbook_id), bookmarks_count=1)
+
+
+@receiver(post_delete, sender=WordBookBookmark)
+def decrement_bookmarks_count(sender, instance, **kwargs):
+    counters.bump(WordBook.objects.filter(pk=instance.wordbook_id), bookmarks_count=-1)
+
+
+@receiver(post_save, sender=UserFollow)
+def increment_follow_counts(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _bump_profile(instance.follower_id, following_count=1)
+        _bump_profile(instance.following_id, followers_count=1)
+
+
+@receiver(post_delete, sender=UserFollow)
+def decrement_follow_counts(sender, instance, **kwargs):
+    counters.bump(UserProfile.objects.filter(user_id=instance.follower_id), following_count=-1)
+    counters.bump(UserProfile.objects.filter(user_id=instance.following_id), followers_count=-1)
+
+
+# ---- タグ使用数ランキング ----
+@receiver(m2m_changed, sender=WordBook.tags.through)
+def invalidate_tag_leaderboard_on_tagging(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _invalidate_leaderboard_after_commit()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=WordBook)
+def invalidate_tag_leaderboard(sender, **kwargs):
+    # 単語帳の削除ではタグとの中間テーブルの行が m2m_changed なしで消える
+    _invalidate_leaderboard_after_commit()
+
+
+def _invalidate_leaderboard_after_commit():
+    # コミット前に消すと、別のリクエストがコミット前の件数で作り直してキャッシュしてしまう
+    transaction.on_commit(tags.invalidate_leaderboard)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_prefix_index(sender, created=True, update_fields=None, **kwargs):
+    # 名前・slug が変わらない更新ではインデックスを作り直さない
+    if not created and update_fields is not None and not {'name', 'slug'} & set(update_fields):
+        return
+    tags.invalidate_prefix_index()
+
+
+# ---- タグのポスティングリスト ----
+@receiver(m2m_changed, sender=WordBook.tags.through)
+def update_tag_postings(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        if reverse:  # tag.wordbooks.add(...) など
+            pairs = [(wordbook_id, (instance.pk,)) for wordbook_id in pk_set]
+        else:
+            pairs = [(instance.pk, tuple(pk_set))]
+        adding = action == 'post_add'
+
+        def change(postings):
+            for wordbook_id, tag_ids in pairs:
+                if adding:
+                    postings.add(wordbook_id, tag_ids)
+                else:
+                    postings.remove(wordbook_id, tag_ids)
+
+        tags.change_postings(change)
+    elif action == 'post_clear':
+        if reverse:
+            tags.change_postings(lambda postings: postings.remove_tag(instance.pk))
+        else:
+            tags.change_postings(lambda postings: postings.remove_wordbook(instance.pk))
+
+
+@receiver(post_delete, sender=WordBook)
+def remove_wordbook_from_tag_postings(sender, instance, **kwargs):
+    # 中間テーブルの行は m2m_changed なしで連鎖削除される
+    # 削除後に instance.pk は None になるので、コミット前に id を取っておく
+    wordbook_id = instance.pk
+    tags.change_postings(lambda postings: postings.remove_wordbook(wordbook_id))
+
+
+@receiver(post_delete, sender=Tag)
+def remove_tag_from_postings(sender, instance, **kwargs):
+    tag_id = instance.pk
+    tags.change_postings(lambda postings: postings.remove_tag(tag_id))
+
+
+# ---- ホームページのセクションキャッシュ ----
+@receiver(post_save, sender=WordBook)
+@receiver(post_delete, sender=WordBook)
+@receiver(post_save, sender=wordBookLike)
+@receiver(post_delete, sender=wordBookLike)
+def invalidate_home_sections(sender, **kwargs):
+    # ピン留め・公開切り替え・AI単語帳の追加・いいねで表示内容が変わる
+    _invalidate_home_sections_after_commit()
+
+
+@receiver(m2m_changed, sender=WordBook.tags.through)
+def invalidate_home_sections_on_tagging(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _invalidate_home_sections_after_commit()
+
+
+def _invalidate_home_sections_after_commit():
+    # コミット前に消すと、別のリクエストがコミット前の状態でセクションを作り直して TTL の間残してしまう
+    transaction.on_commit(lambda: fragment_cache.invalidate(fragment_cache.HOME_SECTIONS))
+
+
+# ---- 復習スケジュール ----
+@receiver(post_save, sender=WordCardStar)
+def schedule_starred_card(sender, instance, created, raw=False, **kwargs):
+    # スターを付けたカードは復習キューに入れる（外しても学習履歴は残す）
+    if created and not raw:
+        reviews.ensure_scheduled(instance.user_id, instance.wordcard_id, instance.created_at)
+
+
+# ---- フォロー中の新着 ----
+@receiver(post_save, sender=WordBook)
+def publish_new_public_wordbook(sender, instance, created, raw=False, **kwargs):
+    # 既存の単語帳の公開は wordbook_toggle_public から feed.publish を呼ぶ
+    if created and not raw and instance.is_public:
+        feed.publish(instance)
+
+
+@receiver(post_delete, sender=UserFollow)
+def remove_unfollowed_from_feed(sender, instance, origin=None, **kwargs):
+    # ユーザーごと消える場合は受信箱も連鎖削除される
+    if _is_cascade(origin, UserFollow):
+        return
+    feed.remove_author(instance.follower_id, instance.following_id)
+
+
+# ---- 役割 ----
+@receiver(post_save, sender=WordBook)
+def mark_ai_wordbook_owner(sender, instance, created, raw=False, **kwargs):
+    # AI が作成した単語帳の持ち主は AI アカウントとして扱う（プロフィール非表示・フォロー不可）
+    if created and instance.is_ai_generated and not raw:
+        roles.mark_ai(instance.user_id)
+
+
+# ---- カード画像の縮小版 ----
+@receiver(pre_save, sender=WordCard)
+def reset_card_image_renditions(sender, instance, raw=False, **kwargs):
+    # 画像が差し替え・削除されたら古い縮小版の記録を外す（ファイルの削除と作り直しは post_save でコミット後に）
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = WordCard.objects.filter(pk=instance.pk).values_list('image', 'image_renditions').first()
+    if previous is None:
+        # インポートしたカードは元のカードの縮小版をそのまま持ってくる
+        instance._image_changed = bool(instance.image) and not instance.image_renditions
+        return
+    previous_image, previous_renditions = previous
+    if previous_image == instance.image.name:
+        instance._image_changed = False
+        return
+    instance._image_changed = bool(instance.image)
+    instance._stale_image_renditions = previous_renditions
+    instance.image_renditions = {}
+
+
+@receiver(post_save, sender=WordCard)
+def build_card_image_renditions(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    card_images.discard_later(instance.__dict__.pop('_stale_image_renditions', None))
+    if instance.__dict__.pop('_image_changed', False):
+        card_images.schedule(instance.pk, instance.image.name)
+
+
+@receiver(post_delete, sender=WordCard)
+def discard_card_image_renditions(sender, instance, **kwargs):
+    card_images.discard_later(instance.image_renditions)
+
+
+# ---- アバター画像の縮小版 ----
+@receiver(pre_save, sender=UserProfile)
+def reset_avatar_renditions(sender, instance, raw=False, **kwargs):
+    # アバターが差し替え・削除されたら古い縮小版の記録を外す（ファイルの削除と作り直しは post_save でコミット後に）
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = UserProfile.objects.filter(pk=instance.pk).values_list('custom_avatar', 'avatar_renditions').first()
+    if previous is None:
+        instance._avatar_changed = bool(instance.custom_avatar) and not instance.avatar_renditions
+        return
+    previous_avatar, previous_renditions = previous
+    if previous_avatar == instance.custom_avatar.name:
+        instance._avatar_changed = False
+        return
+    instance._avatar_changed = bool(instance.custom_avatar)
+    instance._stale_avatar_renditions = previous_renditions
+    instance.avatar_renditions = {}
+
+
+@receiver(post_save, sender=UserProfile)
+def build_avatar_renditions(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    avatar_images.discard_later(instance.__dict__.pop('_stale_avatar_renditions', None))
+    if instance.__dict__.pop('_avatar_changed', False):
+        avatar_images.schedule(instance.pk, instance.custom_avatar.name)
+
+
+@receiver(post_delete, sender=UserProfile)
+def discard_avatar_renditions(sender, instance, **kwargs):
+    avatar_images.discard_later(instance.avatar_renditions)
@@ -135,6 +135,44 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // 無限スクロール（data-next-cursor のカーソルで次ページの HTML 断片を取得して追加）
+    document.querySelectorAll('[data-infinite-scroll]').forEach(list => {
+        let nextCursor = list.dataset.nextCursor;
+        if (!nextCursor || !('IntersectionObserver' in window)) return;
+        
+        let loading = false;
+        const sentinel = document.createElement('div');
+        sentinel.className = 'infinite-scroll-sentinel';
+        list.after(sentinel);
+        
+        const observer = new IntersectionObserver(async (entries) => {
+            if (!entries[0].isIntersecting || loading || !nextCursor) return;
+            loading = true;
+            try {
+                const url = new URL(window.location.href);
+                url.searchParams.set('cursor', nextCursor);
+                url.searchParams.set('format', 'json');
+                const response = await fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+                const data = await response.json();
+                list.insertAdjacentHTML('beforeend', data.html);
+                nextCursor = data.next_cursor;
+            } catch (error) {
+                console.error('Failed to load next page:', error);
+                nextCursor = null;
+            } finally {
+                loading = false;
+            }
+            // 追加後もまだ画面内にある場合に備えて監視し直す
+            observer.unobserve(sentinel);
+            if (nextCursor) {
+                observer.observe(sentinel);
+            } else {
+                sentinel.remove();
+            }
+        }, { rootMargin: '300px' });
+        observer.observe(sentinel);
+    });
+    
     // ビューポートの高さを正しく設定（モバイルブラウザ対応）
     function setViewportHeight() {
         const vh = window.innerHeight * 0.01;
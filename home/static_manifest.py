@@ -0,0 +1,102 @@
+"""静的ファイルの内容ハッシュの manifest
+
+collectstatic（home.storage.VersionedStaticFilesStorage の post_process）が STATIC_ROOT に
+{パス: {'hash': 内容ハッシュ, 'encodings': 圧縮済みの版}} の JSON を書き出し、
+プロセスは最初に使うときに1回だけ読み込む。static_version と静的ファイル配信の
+ミドルウェアはこの dict を引くだけなので、リクエストのたびにファインダーを辿ったり
+ファイルを stat したりしない。URL は内容が変わると変わるので、ブラウザには無期限にキャッシュさせて良い。
+"""
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+
+MANIFEST_NAME = 'staticfiles-versions.json'
+HASH_LENGTH = 12
+CHUNK_SIZE = 64 * 1024
+
+_lock = threading.Lock()
+_entries = None
+# DEBUG 中に計算したハッシュ {パス: (mtime, サイズ, ハッシュ)}
+_debug_hashes = {}
+
+
+def file_hash(file):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def build(storage, paths, encodings=None):
+    """storage 上の paths の内容ハッシュを計算して manifest として保存し、その dict を返す
+
+    encodings は {パス: ['br', 'gzip', ...]}（隣に書き出した圧縮済みファイルの種類）。
+    """
+    encodings = encodings or {}
+    entries = {}
+    for path in sorted(paths):
+        with storage.open(path) as file:
+            entries[path] = {'hash': file_hash(file), 'encodings': encodings.get(path, [])}
+    if storage.exists(MANIFEST_NAME):
+        storage.delete(MANIFEST_NAME)
+    storage.save(MANIFEST_NAME, ContentFile(json.dumps(entries, indent=0, sort_keys=True).encode()))
+    reset()
+    return entries
+
+
+def load():
+    """STATIC_ROOT の manifest を読み込む（無ければ空）。読み込みはプロセスで1回だけ"""
+    global _entries
+    if _entries is None:
+        with _lock:
+            if _entries is None:
+                _entries = _read()
+    return _entries
+
+
+def _read():
+    if not settings.STATIC_ROOT:
+        return {}
+    try:
+        with open(os.path.join(settings.STATIC_ROOT, MANIFEST_NAME), encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def reset():
+    global _entries
+    _entries = None
+
+
+def _debug_hash(path):
+    """ファイルの内容ハッシュ。mtime とサイズが変わらない限り読み直さない（従来どおり stat 1回で済む）"""
+    absolute_path = finders.find(path)
+    if not absolute_path:
+        return None
+    try:
+        stat = os.stat(absolute_path)
+    except FileNotFoundError:
+        return None
+    cached = _debug_hashes.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(absolute_path, 'rb') as file:
+        digest = file_hash(file)
+    _debug_hashes[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def version(path):
+    """path の内容ハッシュ。manifest に無いファイルは None"""
+    if settings.DEBUG:
+        # 開発サーバーは STATIC_ROOT ではなく各アプリの static/ から配信し、collectstatic せずに
+        # 編集するので、manifest ではなくファイルを見て変更をすぐ反映する
+        return _debug_hash(path)
+    entry = load().get(path)
+    return entry['hash'] if entry else None
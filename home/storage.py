@@ -0,0 +1,78 @@
+"""collectstatic で使う静的ファイルのストレージ"""
+import gzip
+import logging
+import os
+
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files.base import ContentFile
+
+from . import static_manifest
+
+try:
+    import brotli
+except ImportError:  # requirements.txt に入っているが、無い環境でも gzip だけは作る
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 圧縮した版を作るテキスト系の拡張子（画像・フォントの多くは既に圧縮済み）
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+# これより小さいファイルは圧縮してもヘッダー分で得にならない
+MIN_COMPRESS_SIZE = 256
+# 元の大きさのこの割合より小さくならなければ圧縮版は置かない
+MAX_COMPRESS_RATIO = 0.95
+
+# Accept-Encoding で選ぶ優先順。拡張子は元のファイル名の後ろに付ける
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def _compressors():
+    compressors = []
+    if brotli is not None:
+        compressors.append(('br', lambda data: brotli.compress(data, quality=11)))
+    # mtime=0 にして、同じ内容なら collectstatic のたびに同じバイト列になるようにする
+    compressors.append(('gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+    return compressors
+
+
+class VersionedStaticFilesStorage(StaticFilesStorage):
+    """ファイル名は変えずに、集めたファイルの内容ハッシュを manifest に書き出す
+
+    テキスト系のファイルは brotli と gzip で圧縮した版を
+    style.css.br / style.css.gz のように隣に書き出し、どの版があるかも manifest に記録する。
+    ManifestStaticFilesStorage と違って CSS 内の url() を書き換えないので、
+    {% static %} で参照している画像などのパスはそのまま使える。
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning('brotli is not installed; only gzip versions of static files will be written')
+        encodings = {}
+        for path in sorted(paths):
+            if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            available = self._compress(path)
+            if available:
+                encodings[path] = available
+                yield path, path, True
+        static_manifest.build(self, paths, encodings)
+
+    def _compress(self, path):
+        """path の圧縮版を書き出し、書き出した種類のリストを返す"""
+        with self.open(path) as file:
+            data = file.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+        available = []
+        for encoding, compress in _compressors():
+            name = path + ENCODING_SUFFIXES[encoding]
+            if self.exists(name):
+                self.delete(name)
+            compressed = compress(data)
+            if len(compressed) > len(data) * MAX_COMPRESS_RATIO:
+                continue
+            self.save(name, ContentFile(compressed))
+            available.append(encoding)
+        return available
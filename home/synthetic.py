@@ -0,0 +1,356 @@
+"""負荷試験用の合成データ生成（create_sample_data --scale）
+
+人気は一部のユーザー・単語帳・タグに偏るので、作者・いいね先・フォロー先などは
+Zipf 分布（順位 r の重みが r ** -exponent）で選ぶ。
+乱数は seed 固定の random.Random だけを使い、日時も固定の基準時刻 NOW から決めるので、
+空の DB に同じ引数で作れば同じ内容になる。
+pk が後で必要なユーザー・単語帳は bulk_create、それ以外の大量行は executemany で
+まとめて入れ、どちらもバッチごとにトランザクションを切る。
+signals は通らないので、スターの復習予定・フォロー中の新着の受信箱はここで直接入れ、
+カウンタ・検索インデックス・トレンド・類似単語帳などは最後にまとめて作り直す。
+"""
+import random
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from . import answers, counters, feed, fragment_cache, recommendations, search, trending
+from .models import (
+    CardReviewState, FeedEntry, Tag, UserFollow, UserProfile, WordBook, WordBookBookmark, WordCard, WordCardStar,
+    wordBookLike,
+)
+from .tags import invalidate_leaderboard, invalidate_postings, invalidate_prefix_index
+
+USERNAME_PREFIX = 'load_user_'
+PASSWORD = 'samplepass123'
+# パスワードハッシュも毎回同じになるように salt を固定する（負荷試験用のアカウントだけ）
+PASSWORD_SALT = 'syntheticload'
+
+BATCH_SIZE = 5000
+ZIPF_EXPONENT = 1.1
+PUBLIC_RATIO = 0.7
+MAX_TAGS_PER_WORDBOOK = 3
+HISTORY_DAYS = 365
+# 生成するデータの「現在」。履歴はこの HISTORY_DAYS 日前から
+NOW = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+AVATAR_IMAGES = [
+    'account.png', 'account2.png', 'account3.png', 'account4.png',
+    'account5.png', 'account6.png', 'account7.png', 'account8.png',
+]
+BACKGROUND_COLORS = ['#fffff0', '#e3d7a3', '#d8f3dc', '#f8d7da', '#dbeafe', '#fef3c7', '#e0f2fe']
+
+VOCABULARY = [
+    ('ability', '能力'), ('accept', '受け入れる'), ('achieve', '達成する'), ('acquire', '習得する'),
+    ('advance', '前進する'), ('allocate', '割り当てる'), ('analysis', '分析'), ('anticipate', '予期する'),
+    ('appear', '現れる'), ('approve', '承認する'), ('assess', '評価する'), ('atmosphere', '雰囲気'),
+    ('belief', '信念'), ('benefit', '利益'), ('candidate', '候補者'), ('climate', '気候'),
+    ('colleague', '同僚'), ('comprehensive', '包括的な'), ('consequence', '結果'), ('crucial', '重要な'),
+    ('database', 'データベース'), ('decline', '減少する'), ('deploy', '展開する'), ('diagnosis', '診断'),
+    ('efficient', '効率的な'), ('eliminate', '取り除く'), ('emphasize', '強調する'), ('estimate', '見積もる'),
+    ('facilitate', '促進する'), ('framework', '枠組み'), ('generate', '生み出す'), ('hypothesis', '仮説'),
+    ('implement', '実行する'), ('inference', '推論'), ('innovative', '革新的な'), ('interface', '接点'),
+    ('journey', '旅'), ('maintain', '維持する'), ('negotiate', '交渉する'), ('obtain', '得る'),
+    ('participate', '参加する'), ('prescription', '処方箋'), ('priority', '優先事項'), ('regression', '回帰'),
+    ('renewable', '再生可能な'), ('require', '必要とする'), ('schedule', '予定'), ('significant', '重要な'),
+    ('strategy', '戦略'), ('substantial', '相当な'), ('sustainable', '持続可能な'), ('symptom', '症状'),
+    ('treatment', '治療'), ('variable', '変数'), ('vehicle', '乗り物'), ('welfare', '福祉'),
+]
+
+
+def zipf_cum_weights(n, rng, exponent=ZIPF_EXPONENT):
+    """0..n-1 に Zipf 分布の重みをランダムな順位で割り当て、累積重みのリストを返す"""
+    ranks = list(range(1, n + 1))
+    rng.shuffle(ranks)
+    cum_weights = []
+    total = 0.0
+    for rank in ranks:
+        total += rank ** -exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def _pick(rng, n, cum_weights, k):
+    if cum_weights is None:
+        return [rng.randrange(n) for _ in range(k)]
+    return rng.choices(range(n), cum_weights=cum_weights, k=k)
+
+
+def unique_pairs(rng, target, left_n, right_n, left_weights=None, right_weights=None, allow_same=True):
+    """重複しない (left, right) の組を最大 target 個選ぶ（偏りが強くて足りなければ少なめで終わる）"""
+    pairs = {}
+    for _ in range(5):
+        need = target - len(pairs)
+        if need <= 0:
+            break
+        lefts = _pick(rng, left_n, left_weights, need)
+        rights = _pick(rng, right_n, right_weights, need)
+        for pair in zip(lefts, rights):
+            if allow_same or pair[0] != pair[1]:
+                pairs.setdefault(pair)
+    return list(pairs)[:target]
+
+
+def _insert_sql(model, field_names):
+    quote = connection.ops.quote_name
+    columns = [quote(model._meta.get_field(name).column) for name in field_names]
+    return 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table), ', '.join(columns), ', '.join(['%s'] * len(columns)),
+    )
+
+
+# フォローより後に公開された公開単語帳を、フォロワーの受信箱の行にする
+_FEED_INSERT = """
+    INSERT INTO home_feedentry (user_id, wordbook_id, author_id, published_at, created_at)
+    SELECT f.follower_id, wb.id, wb.user_id, wb.published_at, wb.published_at
+    FROM home_userfollow f
+    JOIN home_wordbook wb ON wb.user_id = f.following_id
+    JOIN home_userprofile p ON p.user_id = wb.user_id
+    WHERE wb.is_public AND wb.published_at >= f.created_at
+      AND p.followers_count <= %s AND f.follower_id BETWEEN %s AND %s
+"""
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """auto_now / auto_now_add を一時的に止め、生成した日時をそのまま保存させる"""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    def __init__(self, seed=0, batch_size=BATCH_SIZE, log=None, now=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = now or NOW
+        self.start = self.now - timedelta(days=HISTORY_DAYS)
+
+    def _between(self, start):
+        """start から現在までのランダムな日時"""
+        return start + (self.now - start) * self.rng.random()
+
+    def _insert(self, model, objects):
+        """バッチごとにトランザクションを切って bulk_create し、作成したオブジェクトを返す"""
+        created = []
+        for batch in _batches(objects, self.batch_size):
+            with transaction.atomic():
+                created.extend(model.objects.bulk_create(batch))
+        self.log(f'  {model.__name__}: {len(created)} rows')
+        return created
+
+    def _insert_rows(self, model, field_names, rows):
+        """行タプルを executemany でバッチごとに入れ、件数を返す
+
+        pk を返してもらう必要が無い大量行のテーブル用。bulk_create だと
+        時間の大半が ORM の値変換に使われるので、日時は呼び出し側で変換済みの値を渡す。
+        """
+        sql = _insert_sql(model, field_names)
+        rows = iter(rows)
+        total = 0
+        with connection.cursor() as cursor:
+            while batch := list(islice(rows, self.batch_size)):
+                with transaction.atomic():
+                    cursor.executemany(sql, batch)
+                total += len(batch)
+        self.log(f'  {model.__name__}: {total} rows')
+        return total
+
+    def _timestamp(self, value):
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def run(self, users, wordbooks, cards, likes, bookmarks, stars, follows):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise ValueError(f'{USERNAME_PREFIX}* users already exist; use a fresh database')
+
+        with explicit_timestamps(UserProfile, WordBook):
+            user_ids, user_joined = self._users(users)
+            wordbook_ids, wordbook_created = self._wordbooks(wordbooks, user_ids, user_joined)
+        card_ids, card_offsets = self._cards(cards, wordbook_ids, wordbook_created)
+        self._tags(wordbook_ids)
+        self._likes(wordBookLike, likes, user_ids, wordbook_ids, wordbook_created)
+        self._likes(WordBookBookmark, bookmarks, user_ids, wordbook_ids, wordbook_created)
+        self._stars(stars, user_ids, wordbook_created, card_ids, card_offsets)
+        self._follows(follows, user_ids, user_joined)
+
+        self.log('Rebuilding counters, feeds, search index, trending scores and recommendations...')
+        counters.reconcile()
+        self._feed(user_ids)
+        search.rebuild_index()
+        # 生成した行はすべてコミット済みなので、トレンドのコミット待ちの猶予分まで含める
+        trending.update_scores(full=True, now=self.now + trending.COMMIT_GRACE)
+        recommendations.build(full=True, now=self.now)
+        # 回答イベントは作らないので、集計表は空のまま現在のイベントに合わせておくだけ
+        answers.rollup(full=True)
+        invalidate_leaderboard()
+        invalidate_prefix_index()
+        invalidate_postings()
+        fragment_cache.invalidate(fragment_cache.HOME_SECTIONS)
+
+    def _users(self, n):
+        password = make_password(PASSWORD, PASSWORD_SALT)  # ハッシュ計算は重いので全員で共有する
+        joined = [self._between(self.start) for _ in range(n)]
+        created = self._insert(User, [
+            User(
+                username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com',
+                password=password, date_joined=joined[i],
+            )
+            for i in range(n)
+        ])
+        self._insert(UserProfile, [
+            UserProfile(
+                user_id=user.pk,
+                avatar_image=self.rng.choice(AVATAR_IMAGES),
+                background_color=self.rng.choice(BACKGROUND_COLORS),
+                created_at=user.date_joined, updated_at=user.date_joined,
+            )
+            for user in created
+        ])
+        return [user.pk for user in created], joined
+
+    def _wordbooks(self, n, user_ids, user_joined):
+        tag_names = list(Tag.objects.values_list('name', flat=True)) or ['英単語']
+        authors = _pick(self.rng, len(user_ids), zipf_cum_weights(len(user_ids), self.rng), n)
+        objects = []
+        for i, author in enumerate(authors):
+            created_at = self._between(user_joined[author])
+            word = self.rng.choice(VOCABULARY)[0]
+            title = f'{self.rng.choice(tag_names)} {word} 単語帳 {i}'
+            is_public = self.rng.random() < PUBLIC_RATIO
+            objects.append(WordBook(
+                user_id=user_ids[author],
+                title=title,
+                description=f'{word} などを収録した練習用の単語帳です。',
+                is_public=is_public,
+                published_at=created_at if is_public else None,
+                created_at=created_at, updated_at=created_at,
+            ))
+        created = self._insert(WordBook, objects)
+        return [wordbook.pk for wordbook in created], [wordbook.created_at for wordbook in created]
+
+    def _cards(self, n, wordbook_ids, wordbook_created):
+        """カードは単語帳ごとに連続して作り、(開始位置, 枚数) で単語帳ごとのカードを引けるようにする"""
+        per_wordbook = [0] * len(wordbook_ids)
+        weights = zipf_cum_weights(len(wordbook_ids), self.rng)
+        for index in _pick(self.rng, len(wordbook_ids), weights, n):
+            per_wordbook[index] += 1
+
+        offsets = []
+        total = 0
+        for count in per_wordbook:
+            offsets.append((total, count))
+            total += count
+
+        def rows():
+            for index, count in enumerate(per_wordbook):
+                created_at = self._timestamp(wordbook_created[index])
+                for _ in range(count):
+                    front, back = self.rng.choice(VOCABULARY)
+                    # JSONField の default は DB 側には無いので、空の縮小版もここで書く
+                    yield wordbook_ids[index], front, back, '{}', created_at, created_at
+
+        self._insert_rows(
+            WordCard, ['wordbook', 'front_text', 'back_text', 'image_renditions', 'created_at', 'updated_at'], rows(),
+        )
+
+        # 単語帳の作成順 = id 順にカードを入れたので、(wordbook_id, id) 順に読めば offsets と対応する
+        card_ids = array('q')
+        if wordbook_ids:
+            card_ids.extend(
+                WordCard.objects.filter(wordbook_id__gte=wordbook_ids[0], wordbook_id__lte=wordbook_ids[-1])
+                .order_by('wordbook_id', 'id').values_list('id', flat=True).iterator()
+            )
+        return card_ids, offsets
+
+    def _tags(self, wordbook_ids):
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        if not tag_ids:
+            return
+        weights = zipf_cum_weights(len(tag_ids), self.rng)
+        rows = []
+        for wordbook_id in wordbook_ids:
+            count = self.rng.randint(0, MAX_TAGS_PER_WORDBOOK)
+            for tag_index in sorted(set(_pick(self.rng, len(tag_ids), weights, count))):
+                rows.append((wordbook_id, tag_ids[tag_index]))
+        self._insert_rows(WordBook.tags.through, ['wordbook', 'tag'], rows)
+
+    def _likes(self, model, n, user_ids, wordbook_ids, wordbook_created):
+        pairs = unique_pairs(
+            self.rng, n, len(user_ids), len(wordbook_ids),
+            right_weights=zipf_cum_weights(len(wordbook_ids), self.rng),
+        )
+        self._insert_rows(model, ['user', 'wordbook', 'created_at'], (
+            (user_ids[user], wordbook_ids[wordbook], self._timestamp(self._between(wordbook_created[wordbook])))
+            for user, wordbook in pairs
+        ))
+
+    def _stars(self, n, user_ids, wordbook_created, card_ids, card_offsets):
+        if not card_ids:
+            return
+        weights = zipf_cum_weights(len(card_ids), self.rng)
+        pairs = unique_pairs(self.rng, n, len(user_ids), len(card_ids), right_weights=weights)
+        # カードの位置から単語帳を引くため、開始位置の昇順リストを二分探索する
+        starts = [start for start, _ in card_offsets]
+
+        rows = []
+        for user, card in pairs:
+            wordbook = bisect_right(starts, card) - 1
+            created_at = self._timestamp(self._between(wordbook_created[wordbook]))
+            rows.append((user_ids[user], card_ids[card], created_at))
+
+        self._insert_rows(WordCardStar, ['user', 'wordcard', 'created_at'], rows)
+        # スターを付けたカードはその時点から復習できる状態で登録する（reviews.ensure_scheduled と同じ初期値）
+        self._insert_rows(CardReviewState, [
+            'user', 'card', 'repetitions', 'interval_days', 'ease_factor', 'lapses', 'due_at', 'created_at',
+        ], ((user_id, card_id, 0, 0.0, 2.5, 0, created_at, created_at) for user_id, card_id, created_at in rows))
+
+    def _follows(self, n, user_ids, user_joined):
+        pairs = unique_pairs(
+            self.rng, n, len(user_ids), len(user_ids),
+            right_weights=zipf_cum_weights(len(user_ids), self.rng), allow_same=False,
+        )
+        self._insert_rows(UserFollow, ['follower', 'following', 'created_at'], (
+            (
+                user_ids[follower], user_ids[following],
+                self._timestamp(self._between(max(user_joined[follower], user_joined[following]))),
+            )
+            for follower, following in pairs
+        ))
+
+    def _feed(self, user_ids):
+        """フォロー後に公開された単語帳を受信箱に入れる（公開時の配布 home.feed.fanout と同じ範囲）
+
+        フォロワーの多い作者の単語帳は読み出し時に集めるので入れない。
+        """
+        if not user_ids:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(_FEED_INSERT, [feed.fanout_limit(), min(user_ids), max(user_ids)])
+            self.log(f'  FeedEntry: {cursor.rowcount} rows')
+
+
+def generate(users, wordbooks, cards, likes, bookmarks, stars, follows, seed=0, batch_size=BATCH_SIZE, log=None):
+    Generator(seed=seed, batch_size=batch_size, log=log).run(
+        users=users, wordbooks=wordbooks, cards=cards,
+        likes=likes, bookmarks=bookmarks, stars=stars, follows=follows,
+    )
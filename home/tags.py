@@ -0,0 +1,227 @@
+"""タグ関連の共有キャッシュと、タグ名の前方一致インデックス・タグごとの単語帳 id 一覧"""
+import bisect
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import fragment_cache
+from .models import Tag, WordBook
+
+# 使用数ランキング（context_processors / wordbook_list / admin_dashboard で共有）
+LEADERBOARD_CACHE_KEY = 'tags:leaderboard'
+LEADERBOARD_SIZE = 50
+LEADERBOARD_TIMEOUT = 60 * 60
+
+
+def get_leaderboard(limit=LEADERBOARD_SIZE):
+    """使用数の多い順のタグ（usage_count 付き）を返す。初回アクセス時にだけ集計する"""
+    tags = cache.get(LEADERBOARD_CACHE_KEY)
+    if tags is None:
+        tags = list(
+            Tag.objects.annotate(usage_count=Count('wordbooks'))
+            .filter(usage_count__gt=0)
+            .order_by('-usage_count', 'name')[:LEADERBOARD_SIZE]
+        )
+        cache.set(LEADERBOARD_CACHE_KEY, tags, LEADERBOARD_TIMEOUT)
+    return tags[:limit]
+
+
+def invalidate_leaderboard():
+    """共有キャッシュ（settings.CACHES）から消すので、他のワーカーも次のアクセスで集計し直す"""
+    cache.delete(LEADERBOARD_CACHE_KEY)
+
+
+# ---- 前方一致インデックス（タグ選択の入力補完用） ----
+# 正規化したタグ名の昇順配列をプロセス内に持ち、二分探索で前方一致の範囲を求める。
+# タグの作成・削除で共有キャッシュ（settings.CACHES）上の世代番号を進め、
+# 各プロセスは次のアクセスで世代の違いに気づいて作り直す。
+INDEX_NAMESPACE = 'tags:index'
+
+_index_lock = threading.Lock()
+_index = None
+
+
+def normalize(name):
+    """比較用のタグ名（全角半角・大文字小文字の違いを無視する）"""
+    return unicodedata.normalize('NFKC', name).casefold().strip()
+
+
+class PrefixIndex:
+    """(正規化した名前, id, 名前, slug, 作成者 id) を正規化名の昇順に並べたもの"""
+
+    def __init__(self, rows, version=None):
+        self.entries = sorted((normalize(name), pk, name, slug, created_by_id) for pk, name, slug, created_by_id in rows)
+        self.keys = [entry[0] for entry in self.entries]
+        self.version = version
+
+    def search(self, prefix):
+        """prefix で始まるタグの範囲 (lo, hi) を返す"""
+        prefix = normalize(prefix)
+        lo = bisect.bisect_left(self.keys, prefix)
+        # 前方一致の上端：prefix の直後に来る最小の文字列
+        hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def get_prefix_index():
+    """現在の世代のインデックスを返す。タグが作成・削除されていれば作り直す"""
+    global _index
+    version = fragment_cache.get_version(INDEX_NAMESPACE)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            rows = Tag.objects.values_list('pk', 'name', 'slug', 'created_by_id')
+            _index = PrefixIndex(rows, version)
+        return _index
+
+
+def invalidate_prefix_index():
+    fragment_cache.invalidate(INDEX_NAMESPACE)
+
+
+def usage_counts(tag_ids):
+    """タグ id ごとの使用単語帳数を1回の集計クエリで返す"""
+    rows = (
+        WordBook.tags.through.objects.filter(tag_id__in=tag_ids)
+        .values('tag_id').annotate(usage_count=Count('wordbook_id'))
+        .values_list('tag_id', 'usage_count')
+    )
+    return dict(rows)
+
+
+# ---- タグごとの単語帳 id（ポスティングリスト） ----
+# 複数タグの AND/OR をメモリ上の集合演算で済ませ、最後に pk__in で1回だけ取得する。
+# 自プロセスでの付け外しはコミット後にその場で反映し、共有キャッシュ上の世代番号を1つ進める。
+# 他のプロセスは世代番号の変化を見て、次のアクセスで作り直す。
+POSTINGS_NAMESPACE = 'tags:postings'
+
+MODE_OR = 'or'
+MODE_AND = 'and'
+
+# これより多い単語帳が該当する場合は pk__in に渡さず、DB 側の結合で絞り込む
+MAX_FILTER_IDS = 10000
+# 関連タグの共起数を数えるときに見る単語帳の上限（新しいものから）
+RELATED_SAMPLE = 5000
+RELATED_LIMIT = 10
+
+_postings_lock = threading.Lock()
+_postings = None
+
+
+class PostingLists:
+    """タグ id → 単語帳 id の集合と、その逆引き（単語帳 id → タグ id の集合）"""
+
+    def __init__(self, rows, version=None):
+        self.wordbooks_of = {}
+        self.tags_of = {}
+        for tag_id, wordbook_id in rows:
+            self.add(wordbook_id, (tag_id,))
+        self.version = version
+
+    def add(self, wordbook_id, tag_ids):
+        for tag_id in tag_ids:
+            self.wordbooks_of.setdefault(tag_id, set()).add(wordbook_id)
+        self.tags_of.setdefault(wordbook_id, set()).update(tag_ids)
+
+    def remove(self, wordbook_id, tag_ids):
+        for tag_id in tag_ids:
+            wordbook_ids = self.wordbooks_of.get(tag_id)
+            if wordbook_ids is not None:
+                wordbook_ids.discard(wordbook_id)
+                if not wordbook_ids:
+                    del self.wordbooks_of[tag_id]
+        tag_set = self.tags_of.get(wordbook_id)
+        if tag_set is not None:
+            tag_set.difference_update(tag_ids)
+            if not tag_set:
+                del self.tags_of[wordbook_id]
+
+    def remove_wordbook(self, wordbook_id):
+        self.remove(wordbook_id, list(self.tags_of.get(wordbook_id, ())))
+
+    def remove_tag(self, tag_id):
+        for wordbook_id in list(self.wordbooks_of.get(tag_id, ())):
+            self.remove(wordbook_id, (tag_id,))
+
+    def match(self, tag_ids, mode=MODE_OR):
+        """tag_ids のどれか（OR）／すべて（AND）が付いた単語帳 id の集合"""
+        lists = [self.wordbooks_of.get(tag_id, set()) for tag_id in tag_ids]
+        if not lists:
+            return set()
+        if mode == MODE_AND:
+            # 小さい集合から積を取る
+            lists.sort(key=len)
+            return set(lists[0]).intersection(*lists[1:])
+        return set().union(*lists)
+
+    def related(self, wordbook_ids, exclude=(), limit=RELATED_LIMIT):
+        """wordbook_ids に一緒に付いているタグを共起数の多い順に [(タグ id, 共起数), ...] で返す"""
+        counts = Counter()
+        for wordbook_id in wordbook_ids:
+            counts.update(self.tags_of.get(wordbook_id, ()))
+        for tag_id in exclude:
+            counts.pop(tag_id, None)
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def _get_postings():
+    global _postings
+    version = fragment_cache.get_version(POSTINGS_NAMESPACE)
+    postings = _postings
+    if postings is not None and postings.version == version:
+        return postings
+    with _postings_lock:
+        if _postings is None or _postings.version != version:
+            rows = WordBook.tags.through.objects.values_list('tag_id', 'wordbook_id').iterator()
+            _postings = PostingLists(rows, version)
+        return _postings
+
+
+def match_wordbook_ids(tag_ids, mode=MODE_OR):
+    postings = _get_postings()
+    with _postings_lock:
+        return postings.match(tag_ids, mode)
+
+
+def related_tags(wordbook_ids, exclude=(), limit=RELATED_LIMIT):
+    """wordbook_ids のうち誰でも見られる単語帳だけで共起数を数える
+
+    件数が多いときは id の大きい（新しい）RELATED_SAMPLE 件だけを見る。
+    非公開の単語帳は数えないので、共起数からその存在が漏れることはない。
+    """
+    sample = heapq.nlargest(RELATED_SAMPLE, wordbook_ids)
+    visible_ids = list(
+        WordBook.objects.filter(Q(is_public=True) | Q(is_ai_generated=True), pk__in=sample)
+        .order_by().values_list('pk', flat=True)
+    ) if sample else []
+    postings = _get_postings()
+    with _postings_lock:
+        return postings.related(visible_ids, exclude, limit)
+
+
+def invalidate_postings():
+    """一括投入などシグナルを通らない変更の後に、全プロセスで作り直させる"""
+    fragment_cache.invalidate(POSTINGS_NAMESPACE)
+
+
+def change_postings(change):
+    """コミット後に change(PostingLists) を自プロセスの一覧へ反映し、世代番号を進める"""
+    def apply():
+        with _postings_lock:
+            version = fragment_cache.invalidate(POSTINGS_NAMESPACE)
+            # 直前の世代と一致していれば他プロセスの変更は挟まっていないので、作り直さずに済む
+            if _postings is not None and _postings.version == version - 1:
+                change(_postings)
+                _postings.version = version
+
+    transaction.on_commit(apply)
@@ -0,0 +1,61 @@
+"""画像の縮小版を使う img/picture 要素のテンプレートタグ"""
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from home import images
+
+register = template.Library()
+
+# カード一覧は幅 200px 以上の列の auto-fill で、狭い画面では1列になる
+CARD_IMAGE_SIZES = '(max-width: 600px) 100vw, 320px'
+
+
+@register.simple_tag
+def avatar_picture(obj, size, **attrs):
+    """obj（UserProfile / WordBook）のアバターを表示サイズ size px に合わせて出す
+
+    縮小版があれば WebP の 1x/2x を <source> に、PNG を <img> に入れた <picture> にする。
+    Usage:
+        {% avatar_picture wordbook 192 alt=wordbook.user.username class="user-avatar" %}
+    """
+    size = int(size)
+    fallback = obj.get_avatar_url(size * 2, fallback=True)
+    webp_1x = obj.get_avatar_url(size)
+    webp_2x = obj.get_avatar_url(size * 2)
+    attributes = flatatt(attrs)
+    if webp_2x == fallback:  # プリセット画像や縮小版の無いアップロード
+        return format_html('<img src="{}"{}>', fallback, attributes)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{} 1x, {} 2x"><img src="{}"{}></picture>',
+        webp_1x, webp_2x, fallback, attributes,
+    )
+
+
+def _srcset(renditions, extension):
+    return ', '.join(
+        f'{default_storage.url(formats[extension])} {width}w'
+        for width, formats in sorted(renditions.items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.simple_tag
+def card_image(card, sizes=CARD_IMAGE_SIZES, **attrs):
+    """単語カードの画像を幅別縮小版の srcset/sizes 付きで、画面に近づくまで読み込まない形で出す
+
+    Usage:
+        {% card_image card alt=card.front_text class="card-image" %}
+    """
+    attrs = {'loading': 'lazy', 'decoding': 'async', **attrs}
+    renditions = card.image_renditions
+    if not renditions:  # 縮小版をまだ作っていない画像
+        return format_html('<img src="{}"{}>', card.image.url, flatatt(attrs))
+    extension = images.fallback_extension(next(iter(renditions.values())))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(renditions, 'webp'), sizes,
+        default_storage.url(images.pick(renditions, images.CARD_WIDTHS[0])[extension]),
+        _srcset(renditions, extension), sizes, flatatt(attrs),
+    )
@@ -0,0 +1,52 @@
+"""テスト用ヘルパー"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+@contextmanager
+def query_budget(url_name, budget=None):
+    """ブロック内のクエリ数が予算を超えたら AssertionError にする
+
+    budget を省略すると settings.QUERY_BUDGETS[url_name] を使う。
+
+        with query_budget('wordbook_list'):
+            self.client.get(reverse('wordbook_list'))
+    """
+    if budget is None:
+        budget = settings.QUERY_BUDGETS[url_name]
+    with CaptureQueriesContext(connection) as captured:
+        yield captured
+    if len(captured) > budget:
+        queries = '\n'.join(f'  {q["sql"]}' for q in captured.captured_queries)
+        raise AssertionError(
+            f'{url_name} ran {len(captured)} queries (budget {budget}):\n{queries}'
+        )
+
+
+class QueryBudgetMixin:
+    """TestCase に混ぜて self.assertQueryBudget(...) を使えるようにする"""
+
+    def assertQueryBudget(self, url_name, budget=None):
+        return query_budget(url_name, budget)
+
+
+class SynchronousTestRunner(DiscoverRunner):
+    """バックグラウンドスレッドでの処理（フィード配布・縮小版の生成）をコミット直後に同期で行う
+
+    テスト DB への書き込みがテスト本体と別スレッドで競合しないようにする。settings.TEST_RUNNER で使う。
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._synchronous = override_settings(
+            FEED_FANOUT_ASYNC=False, CARD_RENDITIONS_ASYNC=False, AVATAR_RENDITIONS_ASYNC=False,
+        )
+        self._synchronous.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._synchronous.disable()
+        super().teardown_test_environment(**kwargs)
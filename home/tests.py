@@ -1,3 +1,1225 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from . import answers, benchmark, card_images, counters, feed, fragment_cache, recommendations, reviews, roles, search, static_manifest, synthetic, tags, toggles, trending, views
+from .middleware import PrecompressedStaticMiddleware
+from .models import CardReviewState, FeedEntry, JobCheckpoint, QuizAnswerEvent, Tag, UserFollow, UserProfile, WordBook, WordBookBookmark, WordBookSimilarity, WordBookTrendingScore, WordCard, WordCardStar, wordBookLike
+from .pagination import PAGE_SIZE, keyset_page
+from .storage import VersionedStaticFilesStorage
+from .testing import QueryBudgetMixin
+
+
+class SearchTestCase(TestCase):
+    """FTS インデックスはマイグレーションの RunPython でしか作らないので、テスト DB にも作る"""
+
+    @classmethod
+    def setUpClass(cls):
+        with connection.schema_editor() as schema_editor:
+            search.create_index(schema_editor)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.schema_editor() as schema_editor:
+            search.drop_index(schema_editor)
+
+
+class KeywordSearchTests(SearchTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        # 見られない単語帳のほうが関連度が高くなるようにタイトルに語を重ねる
+        WordBook.objects.bulk_create([
+            WordBook(user=cls.other, title='photosynthesis photosynthesis', is_public=False)
+            for _ in range(300)
+        ])
+        cls.visible = WordBook.objects.create(
+            user=cls.owner, title='Biology', description='photosynthesis basics', is_public=True,
+        )
+        search.rebuild_index()
+
+    def setUp(self):
+        # ホームのセクションはフラグメントキャッシュに載るので、テストごとに空にする
+        cache.clear()
+
+    def test_private_matches_do_not_hide_visible_ones(self):
+        response = self.client.get(reverse('wordbook_list'), {'q': 'photosynthesis'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['popular_wordbooks']), [self.visible])
+
+    def test_results_are_not_capped(self):
+        WordBook.objects.filter(user=self.other).update(is_public=True)
+        filter_kwargs, rank = search.search_filter('photosynthesis')
+        matched = WordBook.objects.filter(**filter_kwargs).order_by(rank)
+        self.assertEqual(matched.count(), 301)
+        # 説明にしか語が無い単語帳は最後
+        self.assertEqual(list(matched)[-1], self.visible)
+
+    def test_card_saves_reindex_the_wordbook_once_after_commit(self):
+        with mock.patch.object(search, 'index_wordbook', wraps=search.index_wordbook) as index_wordbook, \
+                self.captureOnCommitCallbacks(execute=True):
+            for i in range(20):
+                WordCard.objects.create(wordbook=self.visible, front_text=f'chlorophyll {i}', back_text='葉緑素')
+            self.assertEqual(index_wordbook.call_count, 0)
+        index_wordbook.assert_called_once_with(self.visible.pk)
+        filter_kwargs, _ = search.search_filter('chlorophyll')
+        self.assertEqual(list(WordBook.objects.filter(**filter_kwargs)), [self.visible])
+
+    def test_rolled_back_card_save_does_not_suppress_the_next_reindex(self):
+        with mock.patch.object(search, 'index_wordbook') as index_wordbook, \
+                self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    WordCard.objects.create(wordbook=self.visible, front_text='leaf', back_text='葉')
+                    raise ValueError
+            except ValueError:
+                pass
+            WordCard.objects.create(wordbook=self.visible, front_text='stem', back_text='茎')
+        index_wordbook.assert_called_once_with(self.visible.pk)
+
+
+class AnswerIngestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='pass')
+        wordbook = WordBook.objects.create(user=cls.user, title='words')
+        cls.cards = WordCard.objects.bulk_create([
+            WordCard(wordbook=wordbook, front_text=f'word{i}', back_text='意味') for i in range(2)
+        ])
+
+    def _answer(self, key, card):
+        return {
+            'key': key, 'card_id': card.pk, 'correct': True, 'timed_out': False,
+            'response_ms': 1000, 'answered_at': timezone.now(),
+        }
+
+    def test_resubmitted_batch_is_not_counted_twice(self):
+        batch = [self._answer('q:0', self.cards[0]), self._answer('q:1', self.cards[1])]
+        self.assertEqual(answers.ingest(self.user, batch), (2, 0))
+        self.assertEqual(answers.ingest(self.user, batch), (0, 2))
+        self.assertEqual(CardReviewState.objects.get(user=self.user, card=self.cards[0]).repetitions, 1)
+
+    def test_concurrent_insert_of_the_same_key_is_applied_once(self):
+        answers.ingest(self.user, [self._answer('q:0', self.cards[0])])
+        batch = [self._answer('q:0', self.cards[0]), self._answer('q:1', self.cards[1])]
+        # 既存キーの確認のあとに別のリクエストが同じキーを保存した状態を再現する
+        with mock.patch.object(QuizAnswerEvent.objects, 'filter', return_value=QuizAnswerEvent.objects.none()):
+            self.assertEqual(answers.ingest(self.user, batch), (1, 1))
+        self.assertEqual(QuizAnswerEvent.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(CardReviewState.objects.get(user=self.user, card=self.cards[0]).repetitions, 1)
+        self.assertEqual(CardReviewState.objects.get(user=self.user, card=self.cards[1]).repetitions, 1)
+
+
+def _jpeg(width, height, color='blue'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue())
+
+
+class CardImageRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        user = User.objects.create_user('illustrator', password='pass')
+        self.wordbook = WordBook.objects.create(user=user, title='pictures')
+
+    def _card_with_image(self, name='a.jpg', color='blue'):
+        card = WordCard(wordbook=self.wordbook, front_text='apple', back_text='りんご')
+        with self.captureOnCommitCallbacks(execute=True):
+            card.image.save(name, _jpeg(1000, 600, color))
+        card.refresh_from_db()
+        return card
+
+    @staticmethod
+    def _files(card):
+        return {name for formats in card.image_renditions.values() for name in formats.values()}
+
+    def test_renditions_are_built_after_commit(self):
+        card = WordCard(wordbook=self.wordbook, front_text='apple', back_text='りんご')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            card.image.save('a.jpg', _jpeg(1000, 600))
+        card.refresh_from_db()
+        self.assertEqual(card.image_renditions, {})
+        for callback in callbacks:
+            callback()
+        card.refresh_from_db()
+        self.assertEqual(sorted(card.image_renditions, key=int), ['320', '640', '960'])
+
+    def test_saving_without_changing_the_image_does_not_rebuild(self):
+        card = self._card_with_image()
+        card.front_text = 'pear'
+        with mock.patch.object(card_images, 'schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            card.save()
+        schedule.assert_not_called()
+
+    def test_replaced_and_deleted_images_remove_unshared_files(self):
+        card = self._card_with_image()
+        copy = WordCard.objects.create(
+            wordbook=self.wordbook, front_text='apple', back_text='りんご',
+            image=card.image.name, image_renditions=card.image_renditions,
+        )
+        old_files = self._files(card)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            card.image.save('b.jpg', _jpeg(1000, 600, 'green'))
+        card.refresh_from_db()
+        # インポートしたカードがまだ使っている
+        self.assertTrue(all(default_storage.exists(name) for name in old_files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            copy.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+
+        new_files = self._files(card)
+        with self.captureOnCommitCallbacks(execute=True):
+            card.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in new_files))
+
+
+
+class AvatarRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user('painter', password='pass')
+        self.client.force_login(self.user)
+
+    def _upload(self, color='blue'):
+        upload = SimpleUploadedFile('me.jpg', _jpeg(400, 300, color).read(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload_custom_avatar'), {'avatar_file': upload})
+        self.assertEqual(response.status_code, 200)
+        return UserProfile.objects.get(user=self.user)
+
+    @staticmethod
+    def _files(profile):
+        return {name for formats in profile.avatar_renditions.values() for name in formats.values()}
+
+    def test_renditions_are_built_after_commit(self):
+        upload = SimpleUploadedFile('me.jpg', _jpeg(400, 300).read(), content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.post(reverse('upload_custom_avatar'), {'avatar_file': upload})
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.avatar_renditions, {})
+        self.assertEqual(profile.get_avatar_url(192), profile.custom_avatar.url)
+        for callback in callbacks:
+            callback()
+        profile.refresh_from_db()
+        self.assertEqual(sorted(profile.avatar_renditions, key=int), ['48', '96', '192'])
+        self.assertTrue(profile.get_avatar_url(96).endswith('.webp'))
+
+    def test_invalid_image_is_rejected(self):
+        upload = SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post(reverse('upload_custom_avatar'), {'avatar_file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserProfile.objects.get_or_create(user=self.user)[0].custom_avatar)
+
+    def test_replaced_avatar_removes_unshared_files(self):
+        first = self._upload('blue')
+        old_files = self._files(first)
+        other, _ = UserProfile.objects.get_or_create(user=User.objects.create_user('copycat', password='pass'))
+        other.avatar_renditions = first.avatar_renditions
+        other.save()
+
+        second = self._upload('green')
+        self.assertTrue(self._files(second))
+        # 同じ縮小版を参照しているプロフィールが残っている
+        self.assertTrue(all(default_storage.exists(name) for name in old_files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+
+    def test_choosing_a_preset_removes_the_renditions(self):
+        files = self._files(self._upload())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('update_avatar'), {'avatar_image': 'account2.png'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserProfile.objects.get(user=self.user).avatar_renditions, {})
+        self.assertFalse(any(default_storage.exists(name) for name in files))
+
+
+class CounterTests(TestCase):
+    """非正規化カウンタ列は signals で増減し、reconcile で実数に戻る"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('counted', password='pass')
+        cls.reader = User.objects.create_user('reader', password='pass')
+        cls.wordbook = WordBook.objects.create(user=cls.author, title='counted', is_public=True)
+
+    def _wordbook(self):
+        return WordBook.objects.get(pk=self.wordbook.pk)
+
+    def _profile(self, user):
+        return UserProfile.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        card = WordCard.objects.create(wordbook=self.wordbook, front_text='a', back_text='あ')
+        like = wordBookLike.objects.create(user=self.reader, wordbook=self.wordbook)
+        bookmark = WordBookBookmark.objects.create(user=self.reader, wordbook=self.wordbook)
+        follow = UserFollow.objects.create(follower=self.reader, following=self.author)
+        wordbook = self._wordbook()
+        self.assertEqual((wordbook.cards_count, wordbook.likes_count, wordbook.bookmarks_count), (1, 1, 1))
+        self.assertEqual(self._profile(self.author).followers_count, 1)
+        self.assertEqual(self._profile(self.author).likes_received_count, 1)
+        self.assertEqual(self._profile(self.reader).following_count, 1)
+
+        for obj in (card, like, bookmark, follow):
+            obj.delete()
+        wordbook = self._wordbook()
+        self.assertEqual((wordbook.cards_count, wordbook.likes_count, wordbook.bookmarks_count), (0, 0, 0))
+        self.assertEqual(self._profile(self.author).followers_count, 0)
+        self.assertEqual(self._profile(self.reader).following_count, 0)
+
+    def test_counters_never_go_negative(self):
+        counters.bump(WordBook.objects.filter(pk=self.wordbook.pk), likes_count=-1)
+        self.assertEqual(self._wordbook().likes_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        wordBookLike.objects.create(user=self.reader, wordbook=self.wordbook)
+        WordBook.objects.filter(pk=self.wordbook.pk).update(likes_count=7, cards_count=3)
+        fixed = counters.reconcile()
+        self.assertEqual(fixed['WordBook.likes_count'], 1)
+        self.assertEqual(fixed['WordBook.cards_count'], 1)
+        wordbook = self._wordbook()
+        self.assertEqual((wordbook.likes_count, wordbook.cards_count), (1, 0))
+
+
+class ToggleTests(TestCase):
+    """トグルの結果の件数は、同じトランザクションで更新したカウンタ列と一致する"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('toggled', password='pass')
+        cls.reader = User.objects.create_user('reader', password='pass')
+        cls.wordbook = WordBook.objects.create(user=cls.author, title='toggled', is_public=True)
+        cls.card = WordCard.objects.create(wordbook=cls.wordbook, front_text='a', back_text='あ')
+        cls.hidden = WordBook.objects.create(user=cls.author, title='hidden', is_public=False)
+
+    def _likes_count(self):
+        return WordBook.objects.get(pk=self.wordbook.pk).likes_count
+
+    def test_double_toggle_restores_counters(self):
+        self.assertEqual(toggles.toggle('like', self.reader, self.wordbook.pk), (True, 1))
+        self.assertEqual(self._likes_count(), 1)
+        self.assertEqual(toggles.toggle('like', self.reader, self.wordbook.pk), (False, 0))
+        self.assertEqual(self._likes_count(), 0)
+        self.assertFalse(wordBookLike.objects.exists())
+
+        self.assertEqual(toggles.toggle('follow', self.reader, self.author.pk), (True, 1))
+        self.assertEqual(UserProfile.objects.get(user=self.reader).following_count, 1)
+        self.assertEqual(toggles.toggle('follow', self.reader, self.author.pk), (False, 0))
+        self.assertEqual(UserProfile.objects.get(user=self.author).followers_count, 0)
+
+        # カウンタを持たない種類は件数を返さない
+        self.assertEqual(toggles.toggle('star', self.reader, self.card.pk), (True, None))
+
+    def test_toggle_many_applies_in_order(self):
+        results = toggles.toggle_many(self.reader, [
+            ('like', self.wordbook.pk), ('bookmark', self.wordbook.pk), ('like', self.wordbook.pk),
+        ])
+        self.assertEqual(results, [(True, 1), (True, 1), (False, 0)])
+        wordbook = WordBook.objects.get(pk=self.wordbook.pk)
+        self.assertEqual((wordbook.likes_count, wordbook.bookmarks_count), (0, 1))
+
+    def test_lock_errors_are_retried(self):
+        calls = []
+
+        def flaky():
+            calls.append(None)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        # テストはトランザクションの中で動くので、外側が無い場合として扱わせる
+        with mock.patch.object(toggles, 'connection', mock.Mock(in_atomic_block=False)), \
+                mock.patch.object(toggles.time, 'sleep') as sleep:
+            self.assertEqual(toggles.with_retry(flaky), 'done')
+            self.assertEqual([call.args[0] for call in sleep.call_args_list], [toggles.RETRY_DELAY, toggles.RETRY_DELAY * 2])
+            with self.assertRaises(OperationalError):
+                toggles.with_retry(mock.Mock(side_effect=OperationalError('no such table')))
+        self.assertEqual(len(calls), 3)
+
+    def test_batch_endpoint_skips_invalid_items(self):
+        self.client.force_login(self.reader)
+        response = self.client.post(reverse('toggles_batch'), {'toggles': [
+            {'kind': 'like', 'target': self.wordbook.pk},
+            {'kind': 'like', 'target': self.hidden.pk},
+            {'kind': 'follow', 'target': 'reader'},
+            {'kind': 'follow', 'target': 'toggled'},
+        ]}, content_type='application/json')
+        self.assertEqual(response.json()['results'], [
+            {'kind': 'like', 'target': self.wordbook.pk, 'active': True, 'count': 1},
+            {'kind': 'like', 'target': self.hidden.pk, 'error': 'not found'},
+            {'kind': 'follow', 'target': 'reader', 'error': '自分自身をフォローできません'},
+            {'kind': 'follow', 'target': 'toggled', 'active': True, 'count': 1},
+        ])
+        self.assertEqual(self._likes_count(), 1)
+
+        response = self.client.post(reverse('toggles_batch'), {'toggles': [{'kind': 'poke', 'target': 1}]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error']['code'], 'BadRequest')
+
+
+class CreatorProfileTests(TestCase):
+    """一覧の単語帳はアバター・背景色を JOIN 済みのプロファイルから追加クエリなしで決める"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('artist', password='pass')
+        UserProfile.objects.filter(user=cls.user).update(avatar_image='account3.png', background_color='#d8f3dc')
+        cls.plain = WordBook.objects.create(user=cls.user, title='plain')
+        cls.custom = WordBook.objects.create(
+            user=cls.user, title='custom', avatar_image='account5.png', background_color='#dbeafe',
+        )
+        cls.ai = WordBook.objects.create(user=cls.user, title='ai', is_ai_generated=True)
+
+    def test_grid_resolves_without_extra_queries(self):
+        wordbooks = list(WordBook.objects.with_creator_profile().order_by('pk'))
+        with self.assertNumQueries(0):
+            resolved = [(wordbook.get_avatar_url(), wordbook.get_background_color()) for wordbook in wordbooks]
+        self.assertEqual(resolved, [
+            (UserProfile.objects.get(user=self.user).get_avatar_url(), '#d8f3dc'),
+            ('/static/home/images/django icon/account5.png', '#dbeafe'),
+            ('/static/home/images/robot.svg', '#9e9e9e'),
+        ])
+
+
+class FollowingFeedTests(TestCase):
+    """公開時に受信箱へ配布し、フォロワーの多い作者の分は読み出し時にマージする"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.star = User.objects.create_user('star', password='pass')
+        cls.reader = User.objects.create_user('reader', password='pass')
+        cls.fan = User.objects.create_user('fan', password='pass')
+        UserFollow.objects.create(follower=cls.reader, following=cls.author)
+        UserFollow.objects.create(follower=cls.fan, following=cls.author)
+        UserFollow.objects.create(follower=cls.reader, following=cls.star)
+        UserFollow.objects.create(follower=cls.fan, following=cls.star)
+
+    def _publish(self, user, title, is_public=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            return WordBook.objects.create(user=user, title=title, is_public=is_public)
+
+    def _inbox(self, user):
+        return set(FeedEntry.objects.filter(user=user).values_list('wordbook_id', flat=True))
+
+    def _walk(self, user, page_size):
+        titles, cursor = [], None
+        while True:
+            wordbooks, cursor = feed.page(user, cursor, page_size)
+            titles += [wordbook.title for wordbook in wordbooks]
+            if cursor is None:
+                return titles
+
+    def test_public_wordbook_is_fanned_out_to_followers(self):
+        wordbook = self._publish(self.author, 'public')
+        self._publish(self.author, 'private', is_public=False)
+        self.assertEqual(self._inbox(self.reader), {wordbook.pk})
+        self.assertEqual(self._inbox(self.fan), {wordbook.pk})
+        self.assertEqual(self._inbox(self.author), set())
+
+    def test_toggling_public_publishes_and_retracts(self):
+        wordbook = self._publish(self.author, 'draft', is_public=False)
+        self.client.force_login(self.author)
+        url = reverse('wordbook_toggle_public', args=[wordbook.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertEqual(self._inbox(self.reader), {wordbook.pk})
+        published_at = WordBook.objects.get(pk=wordbook.pk).published_at
+        self.assertIsNotNone(published_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertEqual(self._inbox(self.reader), set())
+
+        # 再公開しても公開日時は最初のまま
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertEqual(FeedEntry.objects.get(user=self.reader).published_at, published_at)
+
+    def test_unfollow_removes_only_that_author(self):
+        self._publish(self.author, 'from author')
+        kept = self._publish(self.star, 'from star')
+        UserFollow.objects.get(follower=self.reader, following=self.author).delete()
+        self.assertEqual(self._inbox(self.reader), {kept.pk})
+        self.assertEqual(len(self._inbox(self.fan)), 2)
+
+    @override_settings(FEED_FANOUT_FOLLOWER_LIMIT=2)
+    def test_high_follower_author_is_merged_on_read(self):
+        UserFollow.objects.create(follower=self.author, following=self.star)
+        first = self._publish(self.author, 'a1')
+        second = self._publish(self.star, 's1')
+        self._publish(self.author, 'a2')
+        self._publish(self.star, 's2')
+        self._publish(self.star, 'hidden', is_public=False)
+        # 3人にフォローされている star の分は配布しない
+        self.assertEqual(FeedEntry.objects.filter(author=self.star).count(), 0)
+        self.assertEqual(FeedEntry.objects.filter(author=self.author).count(), 4)
+
+        stamp = timezone.now() - timedelta(hours=1)
+        WordBook.objects.filter(pk__in=[first.pk, second.pk]).update(published_at=stamp)
+        FeedEntry.objects.filter(wordbook=first).update(published_at=stamp)
+
+        expected = ['s2', 'a2', 's1', 'a1']
+        self.assertEqual(self._walk(self.reader, PAGE_SIZE), expected)
+        # 同じ公開日時をまたぐページ境界でも抜けも重複もない
+        self.assertEqual(self._walk(self.reader, 1), expected)
+        self.assertEqual(self._walk(self.reader, 3), expected)
+
+    def test_feed_view(self):
+        self._publish(self.author, 'listed')
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('following_feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'listed')
+
+
+class FollowListTests(TestCase):
+    """一覧の各行のフォロー状態は EXISTS の注釈で取り、行数に比例したクエリを出さない"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user('viewer', password='pass')
+        cls.hub = User.objects.create_user('hub', password='pass')
+        cls.others = [User.objects.create_user(f'user{i}', password='pass') for i in range(4)]
+        for user in cls.others:
+            UserFollow.objects.create(follower=cls.hub, following=user)
+            UserFollow.objects.create(follower=user, following=cls.hub)
+        for user in cls.others[:2]:
+            UserFollow.objects.create(follower=cls.viewer, following=user)
+
+    def setUp(self):
+        self.client.force_login(self.viewer)
+
+    def _states(self, url_name, key, user_field):
+        response = self.client.get(reverse(url_name, args=[self.hub.username]))
+        self.assertEqual(response.status_code, 200)
+        return {
+            getattr(relation, user_field).username: relation.viewer_follows
+            for relation in response.context[key]
+        }
+
+    def test_follow_state_per_row(self):
+        expected = {'user0': True, 'user1': True, 'user2': False, 'user3': False}
+        self.assertEqual(self._states('user_following_list', 'following_relations', 'following'), expected)
+        self.assertEqual(self._states('user_followers_list', 'follower_relations', 'follower'), expected)
+
+    def test_queries_do_not_grow_with_rows(self):
+        url = reverse('user_followers_list', args=[self.hub.username])
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(4, 10):
+            UserFollow.objects.create(follower=User.objects.create_user(f'user{i}', password='pass'), following=self.hub)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['follower_relations']), 10)
+        self.assertEqual(len(many), len(few))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pager', password='pass')
+        WordBook.objects.bulk_create([WordBook(user=cls.user, title=f'book {i}') for i in range(7)])
+        # 同じ作成日時の行がページの境目をまたぐようにする
+        stamp = timezone.now() - timedelta(hours=1)
+        WordBook.objects.filter(user=cls.user).update(created_at=stamp)
+        cls.expected = list(WordBook.objects.filter(user=cls.user).order_by('-pk').values_list('pk', flat=True))
+
+    def _walk(self, page_size):
+        seen = []
+        cursor = None
+        while True:
+            items, cursor = keyset_page(WordBook.objects.filter(user=self.user), cursor, page_size)
+            seen.append([item.pk for item in items])
+            if cursor is None:
+                return seen
+
+    def test_pages_cover_every_row_once_across_equal_timestamps(self):
+        pages = self._walk(3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        WordBook.objects.filter(pk=self.expected[-1]).delete()
+        self.assertEqual([len(page) for page in self._walk(3)], [3, 3])
+
+    def test_invalid_cursor_starts_from_the_first_page(self):
+        items, _ = keyset_page(WordBook.objects.filter(user=self.user), 'not-a-cursor', 3)
+        self.assertEqual([item.pk for item in items], self.expected[:3])
+
+    def test_fragment_response_continues_from_the_cursor(self):
+        # 既存の 7 冊より新しい PAGE_SIZE 冊で1ページ目が埋まる
+        WordBook.objects.bulk_create([WordBook(user=self.user, title=f'new {i}') for i in range(PAGE_SIZE)])
+        self.client.force_login(self.user)
+        url = reverse('mypage_wordbooks_all')
+        first = self.client.get(url, {'format': 'json'}).json()
+        second = self.client.get(url, {'format': 'json', 'cursor': first['next_cursor']}).json()
+        self.assertIsNotNone(first['next_cursor'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertNotIn('book 0', first['html'])
+        self.assertIn('book 0', second['html'])
+        self.assertNotIn('new 0', second['html'])
+
+
+class MypageSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('summary', password='pass')
+        cls.other = User.objects.create_user('neighbour', password='pass')
+        own = WordBook.objects.create(user=cls.user, title='own')
+        public = WordBook.objects.create(user=cls.other, title='public', is_public=True)
+        hidden = WordBook.objects.create(user=cls.other, title='hidden', is_public=False)
+        for wordbook in (own, public, hidden):
+            WordBookBookmark.objects.create(user=cls.user, wordbook=wordbook)
+        card = WordCard.objects.create(wordbook=public, front_text='a', back_text='あ')
+        WordCardStar.objects.create(user=cls.user, wordcard=card)
+        wordBookLike.objects.create(user=cls.other, wordbook=own)
+        UserFollow.objects.create(follower=cls.other, following=cls.user)
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            summary = views.load_mypage_summary(self.user)
+        self.assertEqual(summary.my_wordbooks_count, 1)
+        # 他人の非公開単語帳の保存は数えない
+        self.assertEqual(summary.saved_wordbooks_count, 2)
+        self.assertEqual(summary.starred_cards_count, 1)
+        self.assertEqual(summary.likes_received_count, 1)
+        self.assertEqual((summary.followers_count, summary.following_count), (1, 0))
+
+    def test_creates_a_missing_profile(self):
+        UserProfile.objects.filter(user=self.other).delete()
+        summary = views.load_mypage_summary(self.other)
+        self.assertEqual(summary.user_id, self.other.pk)
+        self.assertEqual(summary.my_wordbooks_count, 2)
+
+
+class ReviewSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('learner', password='pass')
+        other = User.objects.create_user('teacher', password='pass')
+        public = WordBook.objects.create(user=other, title='public', is_public=True)
+        cls.hidden = WordBook.objects.create(user=other, title='hidden', is_public=False)
+        cls.cards = [WordCard.objects.create(wordbook=public, front_text=f'w{i}', back_text='語') for i in range(3)]
+        cls.hidden_card = WordCard.objects.create(wordbook=cls.hidden, front_text='secret', back_text='秘密')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sm2_intervals_and_lapses(self):
+        now = timezone.now()
+        state = CardReviewState(user=self.user, card=self.cards[0])
+        intervals = [reviews.schedule(state, 5, now).interval_days for _ in range(3)]
+        # 3回目は前回の間隔に易しさ係数（満点2回で 2.5 → 2.7）を掛ける
+        self.assertEqual(intervals, [1, 6, 16.2])
+        reviews.schedule(state, reviews.QUALITY_INCORRECT, now)
+        self.assertEqual((state.repetitions, state.interval_days, state.lapses), (0, 0, 1))
+        self.assertEqual(state.due_at, now + reviews.RELEARN_DELAY)
+        self.assertGreaterEqual(state.ease_factor, reviews.MIN_EASE_FACTOR)
+
+    def test_starred_cards_are_due_in_order(self):
+        for card in reversed(self.cards):
+            WordCardStar.objects.create(user=self.user, wordcard=card)
+        WordCardStar.objects.create(user=self.user, wordcard=self.hidden_card)
+        response = self.client.get(reverse('review_due'), {'limit': 2})
+        data = response.json()
+        # 新しくスターを付けたものほど後。見られなくなった単語帳のカードは出さない
+        self.assertEqual([card['id'] for card in data['cards']], [self.cards[2].pk, self.cards[1].pk])
+        self.assertEqual(data['due_count'], 3)
+
+    def test_submit_reschedules_visible_cards_only(self):
+        WordCardStar.objects.create(user=self.user, wordcard=self.cards[0])
+        body = {'results': [
+            {'card_id': self.cards[0].pk, 'correct': True},
+            {'card_id': self.cards[1].pk, 'quality': 2},
+            {'card_id': self.hidden_card.pk, 'correct': True},
+        ]}
+        response = self.client.post(reverse('review_submit'), body, content_type='application/json')
+        # 間違えたカードは RELEARN_DELAY 後にまた出る
+        self.assertEqual(response.json(), {'applied': 2, 'due_count': 0})
+        self.assertEqual(CardReviewState.objects.get(user=self.user, card=self.cards[0]).interval_days, 1)
+        self.assertEqual(CardReviewState.objects.get(user=self.user, card=self.cards[1]).lapses, 1)
+        self.assertFalse(CardReviewState.objects.filter(card=self.hidden_card).exists())
+
+    def test_invalid_submit_is_rejected(self):
+        response = self.client.post(
+            reverse('review_submit'), {'results': [{'card_id': 1, 'quality': 9}]}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error']['code'], 'BadRequest')
+
+class CacheInvalidationTests(TestCase):
+    """キャッシュの無効化は書き込みのコミット後に行う"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', password='pass')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_home_sections_are_invalidated_after_commit(self):
+        version = fragment_cache.get_version(fragment_cache.HOME_SECTIONS)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            wordbook = WordBook.objects.create(user=self.user, title='new', is_public=True)
+            wordBookLike.objects.create(user=self.user, wordbook=wordbook)
+            self.assertEqual(fragment_cache.get_version(fragment_cache.HOME_SECTIONS), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(fragment_cache.get_version(fragment_cache.HOME_SECTIONS), version)
+
+    def test_tag_leaderboard_is_invalidated_after_commit(self):
+        tag = Tag.objects.create(name='英語', slug='english')
+        wordbook = WordBook.objects.create(user=self.user, title='new', is_public=True)
+        self.assertEqual(list(tags.get_leaderboard()), [])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            wordbook.tags.add(tag)
+            self.assertEqual(list(tags.get_leaderboard()), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(tags.get_leaderboard()), [tag])
+
+    def test_leaderboard_invalidation_reaches_other_cache_connections(self):
+        tags.get_leaderboard()
+        other = caches.create_connection('default')
+        self.assertIsNotNone(other.get(tags.LEADERBOARD_CACHE_KEY))
+        tags.invalidate_leaderboard()
+        self.assertIsNone(other.get(tags.LEADERBOARD_CACHE_KEY))
+
+    def test_version_is_shared_between_cache_connections(self):
+        # 別のワーカープロセスは自前のキャッシュ接続を作るので、それでも新しい世代が見えること
+        version = fragment_cache.invalidate(fragment_cache.HOME_SECTIONS)
+        other = caches.create_connection('default')
+        self.assertEqual(other.get(f'{fragment_cache.HOME_SECTIONS}:version'), version)
+
+
+
+
+class TagAutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tagmaker', password='pass')
+        cls.names = ['TOEIC600', 'TOEIC800', 'TOEIC900', 'toefl', '英検2級', '英検準1級']
+        cls.tags = {name: Tag.objects.create(name=name, slug=f'tag-{i}', created_by=cls.user) for i, name in enumerate(cls.names)}
+        wordbook = WordBook.objects.create(user=cls.user, title='tagged')
+        wordbook.tags.add(cls.tags['TOEIC800'])
+
+    def setUp(self):
+        cache.clear()
+        tags._index = None
+
+    def _names(self, **params):
+        return [tag['name'] for tag in self.client.get(reverse('tags_list'), params).json()['tags']]
+
+    def test_prefix_ignores_width_and_case(self):
+        self.assertEqual(self._names(prefix='ｔｏｅｉｃ'), ['TOEIC600', 'TOEIC800', 'TOEIC900'])
+        self.assertEqual(self._names(prefix='英検'), ['英検2級', '英検準1級'])
+        self.assertEqual(self._names(prefix='zzz'), [])
+
+    def test_prefix_pages_in_both_orders(self):
+        data = self.client.get(reverse('tags_list'), {'prefix': 'toe', 'limit': 2, 'offset': 2}).json()
+        # 並びは正規化した名前（'toefl' < 'toeic600'）の順
+        self.assertEqual([tag['name'] for tag in data['tags']], ['TOEIC800', 'TOEIC900'])
+        self.assertEqual(data['count'], 4)
+        self.assertIsNone(data['next'])
+        self.assertEqual(self._names(prefix='toe', limit=2, order_by='-name'), ['TOEIC900', 'TOEIC800'])
+
+    def test_usage_counts_without_per_tag_queries(self):
+        self.client.get(reverse('tags_list'), {'prefix': 't'})  # インデックスを作っておく
+        # 共有キャッシュの世代番号の確認と、使用数の集計1回だけ
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('tags_list'), {'prefix': 't', 'limit': 50}).json()
+        usage = {tag['name']: tag['usage_count'] for tag in data['tags']}
+        self.assertEqual(usage['TOEIC800'], 1)
+        self.assertEqual(usage['TOEIC600'], 0)
+
+    def test_new_tags_appear_after_invalidation(self):
+        self.assertEqual(self._names(prefix='toeic9'), ['TOEIC900'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='TOEIC990', slug='toeic-990')
+        self.assertEqual(self._names(prefix='toeic9'), ['TOEIC900', 'TOEIC990'])
+
+class TagPostingTests(TestCase):
+    """タグごとの単語帳 id 一覧（tags._postings）の更新"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tagger', password='pass')
+        cls.english = Tag.objects.create(name='英語', slug='english')
+        cls.toeic = Tag.objects.create(name='TOEIC', slug='toeic')
+
+    def setUp(self):
+        cache.clear()
+        tags._postings = None
+
+    def _wordbook(self, title, is_public=True):
+        return WordBook.objects.create(user=self.user, title=title, is_public=is_public)
+
+    def test_rebuilds_when_another_process_bumps_the_version(self):
+        wordbook = self._wordbook('a')
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk]), set())
+        # 別プロセスでの付け替え：このプロセスにはシグナルが届かず、共有キャッシュの世代番号だけが進む
+        WordBook.tags.through.objects.create(wordbook=wordbook, tag=self.english)
+        caches.create_connection('default').incr(f'{tags.POSTINGS_NAMESPACE}:version')
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk]), {wordbook.pk})
+
+    def test_and_or_matching(self):
+        both = self._wordbook('both')
+        both.tags.add(self.english, self.toeic)
+        english = self._wordbook('english')
+        english.tags.add(self.english)
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk, self.toeic.pk]), {both.pk, english.pk})
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk, self.toeic.pk], tags.MODE_AND), {both.pk})
+        self.assertEqual(tags.match_wordbook_ids([]), set())
+
+    def test_changes_are_applied_in_place_after_commit(self):
+        wordbook = self._wordbook('a')
+        other = self._wordbook('b')
+        postings = tags._get_postings()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            wordbook.tags.add(self.english, self.toeic)
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk]), {wordbook.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.english.wordbooks.add(other)
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk]), {wordbook.pk, other.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            wordbook.tags.remove(self.english)
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk]), {other.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            wordbook.tags.clear()
+        self.assertEqual(tags.match_wordbook_ids([self.toeic.pk]), set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(tags.match_wordbook_ids([self.english.pk]), set())
+        # 作り直さずに同じ一覧を更新している
+        self.assertIs(tags._get_postings(), postings)
+
+    def test_deleted_tag_is_dropped(self):
+        wordbook = self._wordbook('a')
+        wordbook.tags.add(self.english, self.toeic)
+        tags._get_postings()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.toeic.delete()
+        self.assertEqual(tags.match_wordbook_ids([self.toeic.pk]), set())
+        self.assertEqual(tags.related_tags({wordbook.pk}), [(self.english.pk, 1)])
+
+    def test_related_tags_ignore_private_wordbooks(self):
+        public = self._wordbook('public')
+        public.tags.add(self.english)
+        private = self._wordbook('private', is_public=False)
+        private.tags.add(self.english, self.toeic)
+        matched = tags.match_wordbook_ids([self.english.pk])
+        self.assertEqual(matched, {public.pk, private.pk})
+        self.assertEqual(tags.related_tags(matched, exclude=[self.english.pk]), [])
+
+    def test_related_tags_sample_the_newest_wordbooks(self):
+        old = self._wordbook('old')
+        old.tags.add(self.english, self.toeic)
+        new = self._wordbook('new')
+        new.tags.add(self.english)
+        with mock.patch.object(tags, 'RELATED_SAMPLE', 1):
+            self.assertEqual(tags.related_tags({old.pk, new.pk}), [(self.english.pk, 1)])
+
+
+class RecommendationTests(TestCase):
+    """いいね・保存のコサイン類似度で「こんな単語帳も」を事前計算する"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.fans = [User.objects.create_user(f'fan{i}', password='pass') for i in range(3)]
+        cls.base, cls.twin, cls.near, cls.once = [
+            WordBook.objects.create(user=cls.author, title=title, is_public=True)
+            for title in ('base', 'twin', 'near', 'once')
+        ]
+        cls.private = WordBook.objects.create(user=cls.author, title='private', is_public=False)
+        for fan in cls.fans:
+            wordBookLike.objects.create(user=fan, wordbook=cls.base)
+            WordBookBookmark.objects.create(user=fan, wordbook=cls.twin)
+            wordBookLike.objects.create(user=fan, wordbook=cls.private)
+        for fan in cls.fans[:2]:
+            wordBookLike.objects.create(user=fan, wordbook=cls.near)
+        wordBookLike.objects.create(user=cls.fans[0], wordbook=cls.once)
+        cls.elsewhere = WordBook.objects.create(user=cls.author, title='elsewhere', is_public=True)
+        wordBookLike.objects.create(user=User.objects.create_user('stranger', password='pass'), wordbook=cls.elsewhere)
+
+    def test_full_build_ranks_public_candidates(self):
+        self.assertEqual(recommendations.build(full=True), 6)
+        # 共通のユーザーが1人だけの once と、非公開の private は勧めない
+        self.assertEqual(recommendations.similar_wordbooks(self.base), [self.twin, self.near])
+        row = WordBookSimilarity.objects.get(wordbook=self.base, similar=self.near)
+        self.assertAlmostEqual(row.score, 2 / 6 ** 0.5)
+        self.assertEqual(row.common_users, 2)
+
+        recommendations.build(full=True, min_common=3)
+        self.assertEqual(recommendations.similar_wordbooks(self.base), [self.twin])
+
+    def test_incremental_build_recomputes_affected_wordbooks(self):
+        recommendations.build(full=True)
+        wordBookLike.objects.create(user=self.fans[2], wordbook=self.near)
+        # near と、near をいいねした人が触った単語帳だけを計算し直す（elsewhere は対象外）
+        self.assertEqual(recommendations.build(), 5)
+        row = WordBookSimilarity.objects.get(wordbook=self.base, similar=self.near)
+        self.assertAlmostEqual(row.score, 1.0)
+        self.assertEqual(recommendations.build(), 0)
+
+    def test_wordbooks_made_private_are_hidden(self):
+        recommendations.build(full=True)
+        WordBook.objects.filter(pk=self.twin.pk).update(is_public=False)
+        self.assertEqual(recommendations.similar_wordbooks(self.base), [self.near])
+
+
+class TrendingScoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('author', password='pass')
+        cls.fans = [User.objects.create_user(f'fan{i}', password='pass') for i in range(3)]
+        cls.start = timezone.now() - timedelta(days=3)
+        cls.wordbook = WordBook.objects.create(user=cls.owner, title='trending', is_public=True)
+        WordBook.objects.filter(pk=cls.wordbook.pk).update(created_at=cls.start)
+
+    def _like(self, fan, at):
+        like = wordBookLike.objects.create(user=fan, wordbook=self.wordbook)
+        wordBookLike.objects.filter(pk=like.pk).update(created_at=at)
+
+    def _score(self):
+        return WordBookTrendingScore.objects.get(wordbook=self.wordbook).score
+
+    def test_incremental_runs_match_a_full_rebuild(self):
+        self._like(self.fans[0], self.start + timedelta(days=1))
+        now = self.start + timedelta(days=2)
+        trending.update_scores(now=now)
+        # 前回の実行時にはまだコミットされていなかった（created_at は実行時刻の直前）いいね
+        self._like(self.fans[1], now - timedelta(minutes=1))
+        self._like(self.fans[2], now + timedelta(hours=1))
+        later = now + timedelta(hours=2)
+        trending.update_scores(now=later)
+        incremental = self._score()
+
+        trending.update_scores(full=True, now=later)
+        self.assertAlmostEqual(self._score(), incremental)
+        expected = trending.event_score(trending.CREATED_WEIGHT, self.start)
+        for at in (self.start + timedelta(days=1), now - timedelta(minutes=1), now + timedelta(hours=1)):
+            expected = trending.logaddexp(expected, trending.event_score(trending.LIKE_WEIGHT, at))
+        self.assertAlmostEqual(incremental, expected)
+
+    def test_checkpoint_stops_short_of_uncommitted_events(self):
+        now = self.start + timedelta(days=3)
+        trending.update_scores(full=True, now=now)
+        checkpoint = JobCheckpoint.objects.get(name=trending.CHECKPOINT_NAME)
+        self.assertEqual(checkpoint.last_run_at, now - trending.COMMIT_GRACE)
+
+class AdminDashboardTests(TestCase):
+    def _count_queries(self):
+        # /admin/ 以下は Django 管理画面の URL が先に一致するので、ビューを直接呼ぶ
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(username='admin')
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = views.admin_dashboard(request)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_trending_rows_do_not_query_per_creator(self):
+        admin = User.objects.create_user('admin', password='pass')
+        UserProfile.objects.filter(user=admin).update(is_site_admin=True)
+        for i in range(2):
+            WordBook.objects.create(user=User.objects.create_user(f'author{i}'), title=f'book{i}', is_public=True)
+        baseline = self._count_queries()
+        for i in range(2, 10):
+            WordBook.objects.create(user=User.objects.create_user(f'author{i}'), title=f'book{i}', is_public=True)
+        self.assertEqual(self._count_queries(), baseline)
+
+
+class QuizApiErrorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('player', password='pass')
+        cls.wordbook = WordBook.objects.create(user=cls.user, title='quiz', is_public=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_errors_use_the_structured_shape(self):
+        response = self.client.post(reverse('wordbook_quiz_start', args=[self.wordbook.pk]), {'mode': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': {'code': 'BadRequest', 'message': 'invalid mode'}})
+
+        response = self.client.get(reverse('wordbook_quiz_questions', args=[self.wordbook.pk]), {'quiz_id': 'missing'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['error']['code'], 'NotFound')
+
+
+class AiAccountRoleTests(TestCase):
+    def test_ai_username_is_an_ai_account_from_creation(self):
+        ai = User.objects.create_user(roles.AI_USERNAME, password='pass')
+        self.assertTrue(UserProfile.objects.get(user=ai).is_ai)
+
+        viewer = User.objects.create_user('viewer', password='pass')
+        self.client.force_login(viewer)
+        self.assertRedirects(self.client.get(reverse('user_profile', args=[ai.username])), reverse('wordbook_list'))
+        response = self.client.post(reverse('user_follow_toggle', args=[ai.username]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserFollow.objects.filter(follower=viewer, following=ai).exists())
+
+    def test_renaming_to_the_ai_username_marks_the_account(self):
+        user = User.objects.create_user('assistant', password='pass')
+        self.assertFalse(UserProfile.objects.get(user=user).is_ai)
+        user.username = roles.AI_USERNAME
+        user.save()
+        self.assertTrue(UserProfile.objects.get(user=user).is_ai)
+
+
+class SyntheticDataTests(TestCase):
+    SIZES = {'users': 20, 'wordbooks': 30, 'cards': 120, 'likes': 60, 'bookmarks': 40, 'stars': 50, 'follows': 80}
+
+    @staticmethod
+    def _snapshot():
+        """pk に依らない生成内容"""
+        return (
+            list(User.objects.order_by('username').values_list('username', 'password', 'date_joined')),
+            list(WordBook.objects.order_by('title').values_list('user__username', 'title', 'is_public', 'created_at')),
+            sorted(wordBookLike.objects.values_list('user__username', 'wordbook__title', 'created_at')),
+            sorted(UserFollow.objects.values_list('follower__username', 'following__username', 'created_at')),
+        )
+
+    def test_generate_small_scale(self):
+        synthetic.generate(seed=1, **self.SIZES)
+        self.assertEqual(User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX).count(), 20)
+        self.assertEqual(WordCard.objects.count(), 120)
+        self.assertEqual(WordCard.objects.filter(image_renditions={}).count(), 120)
+        self.assertEqual(wordBookLike.objects.count(), 60)
+
+    def test_derived_tables_match_the_signals(self):
+        synthetic.generate(seed=1, **self.SIZES)
+        self.assertEqual(
+            set(CardReviewState.objects.values_list('user_id', 'card_id', 'due_at')),
+            set(WordCardStar.objects.values_list('user_id', 'wordcard_id', 'created_at')),
+        )
+        expected = {
+            (follow.follower_id, wordbook.pk)
+            for follow in UserFollow.objects.all()
+            for wordbook in WordBook.objects.filter(user_id=follow.following_id, is_public=True)
+            if wordbook.published_at >= follow.created_at
+        }
+        self.assertTrue(expected)
+        self.assertEqual(set(FeedEntry.objects.values_list('user_id', 'wordbook_id')), expected)
+        self.assertEqual(
+            WordBookTrendingScore.objects.count(),
+            WordBook.objects.filter(user__username__startswith=synthetic.USERNAME_PREFIX).count(),
+        )
+
+    def test_same_seed_gives_the_same_data(self):
+        synthetic.generate(seed=1, **self.SIZES)
+        first = self._snapshot()
+        User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX).delete()
+        synthetic.generate(seed=1, **self.SIZES)
+        self.assertEqual(self._snapshot(), first)
+
+
+
+class BenchmarkTests(TestCase):
+    def test_compare_reports_regressions(self):
+        baseline = {'mypage': {'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'peak_kb': 100.0, 'max_queries': 6, 'errors': 0}}
+        results = {
+            'mypage': {'p50_ms': 11.9, 'p95_ms': 24.1, 'p99_ms': 30.0, 'peak_kb': 90.0, 'max_queries': 7, 'errors': 0},
+            'new_view': {'p50_ms': 500.0, 'p95_ms': 500.0, 'p99_ms': 500.0, 'peak_kb': 1.0, 'max_queries': 99, 'errors': 0},
+        }
+        self.assertEqual(benchmark.compare(results, baseline, tolerance=0.2), [
+            ('mypage', 'p95_ms', 20.0, 24.1),
+            ('mypage', 'max_queries', 6, 7),
+        ])
+
+    # コマンドは DEBUG で動かす前提なので、テスト（DEBUG=False）では benchmark.SERVER_NAME を許可する
+    @override_settings(ALLOWED_HOSTS=[benchmark.SERVER_NAME])
+    def test_default_scenarios_run_against_synthetic_data(self):
+        Tag.objects.create(name='英検2級', slug='eiken-2kyu')
+        synthetic.generate(users=10, wordbooks=20, cards=60, likes=30, bookmarks=20, stars=20, follows=20)
+        viewer, scenarios = benchmark.default_scenarios()
+        worker = benchmark._Worker(viewer)
+        for scenario in scenarios:
+            with self.subTest(scenario=scenario.name):
+                _, queries, failed = worker.request(scenario)
+                self.assertFalse(failed)
+                self.assertGreater(queries, 0)
+
+# 予算はページを作るためのクエリ数なので、DatabaseCache への読み書きは数えない
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """settings.QUERY_BUDGETS のビューを、キャッシュが空の状態で各ユーザー種別から開く"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='pass')
+        cls.bob = User.objects.create_user('bob', password='pass')
+        cls.admin = User.objects.create_user('admin', password='pass')
+        UserProfile.objects.filter(user=cls.admin).update(is_site_admin=True)
+        english = Tag.objects.create(name='英語', slug='english')
+        toeic = Tag.objects.create(name='TOEIC', slug='toeic')
+        cls.tag = english
+        for owner, reader in ((cls.alice, cls.bob), (cls.bob, cls.alice)):
+            for i in range(8):
+                wordbook = WordBook.objects.create(
+                    user=owner, title=f'{owner.username} {i}', is_public=i % 3 != 0, is_pinned=i == 1,
+                )
+                wordbook.tags.add(english if i % 2 else toeic)
+                WordCard.objects.bulk_create([
+                    WordCard(wordbook=wordbook, front_text=f'word{j}', back_text='意味') for j in range(3)
+                ])
+                wordBookLike.objects.create(user=reader, wordbook=wordbook)
+                if i % 2:
+                    WordBookBookmark.objects.create(user=reader, wordbook=wordbook)
+        ai = User.objects.create_user('AI', password='pass')
+        WordBook.objects.create(user=ai, title='AI wordbook', is_ai_generated=True)
+        UserFollow.objects.create(follower=cls.alice, following=cls.bob)
+        UserFollow.objects.create(follower=cls.bob, following=cls.alice)
+        UserFollow.objects.create(follower=cls.admin, following=cls.bob)
+
+    def _cold_get(self, user, url):
+        """キャッシュ（共有キャッシュとプロセス内のタグ索引）を空にしてから開く"""
+        self.client.logout()
+        if user is not None:
+            self.client.force_login(user)
+        cache.clear()
+        tags._index = None
+        tags._postings = None
+        with self.assertQueryBudget(self.url_name):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def _check(self, url_name, urls, users):
+        self.url_name = url_name
+        for user in users:
+            for url in urls:
+                with self.subTest(user=user and user.username, url=url):
+                    self._cold_get(user, url)
+
+    def test_wordbook_list(self):
+        url = reverse('wordbook_list')
+        self._check('wordbook_list', [
+            url, f'{url}?tags={self.tag.pk}', f'{url}?tag={self.tag.name}', f'{url}?q=bob',
+        ], [None, self.alice, self.admin])
+
+    def test_user_profile(self):
+        self._check('user_profile', [reverse('user_profile', args=['bob'])], [None, self.alice, self.admin])
+
+    def test_mypage(self):
+        self._check('mypage', [reverse('mypage')], [self.alice, self.admin])
+
+    def test_mypage_wordbooks_all(self):
+        self._check('mypage_wordbooks_all', [reverse('mypage_wordbooks_all')], [self.alice, self.admin])
+
+    def test_mypage_bookmarks_all(self):
+        self._check('mypage_bookmarks_all', [reverse('mypage_bookmarks_all')], [self.alice, self.admin])
+
+    def test_user_following_list(self):
+        self._check('user_following_list', [reverse('user_following_list', args=['bob'])], [self.alice, self.admin])
+
+    def test_user_followers_list(self):
+        self._check('user_followers_list', [reverse('user_followers_list', args=['bob'])], [self.alice, self.admin])
+
+
+class StaticVersionDebugTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'app.css')
+        with open(self.path, 'w') as file:
+            file.write('body { color: red; }')
+        static_manifest._debug_hashes.clear()
+
+    def test_hash_is_reused_until_the_file_changes(self):
+        with override_settings(DEBUG=True, STATICFILES_DIRS=[self.directory.name]), \
+                mock.patch.object(static_manifest, 'file_hash', wraps=static_manifest.file_hash) as file_hash:
+            first = static_manifest.version('app.css')
+            self.assertEqual(static_manifest.version('app.css'), first)
+            self.assertEqual(file_hash.call_count, 1)
+
+            with open(self.path, 'w') as file:
+                file.write('body { color: blue; margin: 0; }')
+            self.assertNotEqual(static_manifest.version('app.css'), first)
+            self.assertEqual(file_hash.call_count, 2)
+
+
+class PrecompressedStaticTests(SimpleTestCase):
+    """collectstatic の圧縮版をミドルウェアが選んで返す"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(DEBUG=False, STATIC_ROOT=self.directory.name, STATIC_URL='/static/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(static_manifest.reset)
+
+        self.content = b'body { color: red; }\n' * 50
+        storage = VersionedStaticFilesStorage(location=self.directory.name, base_url='/static/')
+        storage.save('app.css', ContentFile(self.content))
+        # brotli の無い環境での警告は出さない
+        with mock.patch('home.storage.logger'):
+            list(storage.post_process({'app.css': (storage, 'app.css')}))
+        self.entry = static_manifest.load()['app.css']
+        self.middleware = PrecompressedStaticMiddleware(lambda request: None)
+
+    def _get(self, url, **headers):
+        response = self.middleware(RequestFactory().get(url, headers=headers))
+        self.addCleanup(response.close)
+        return response
+
+    def test_serves_the_gzip_version_with_cache_headers(self):
+        self.assertIn('gzip', self.entry['encodings'])
+        response = self._get(f'/static/app.css?v={self.entry["hash"]}', accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertNotIn('Content-Disposition', response)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.content)
+
+    def test_uncompressed_without_accept_encoding(self):
+        response = self._get('/static/app.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_matching_etag_is_not_modified(self):
+        first = self._get('/static/app.css', accept_encoding='gzip')
+        response = self._get('/static/app.css', accept_encoding='gzip', if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,81 @@
+"""いいね・ブックマーク・スター・フォローのトグル
+
+「あれば削除、無ければ作成」を1トランザクションで行う。SQLite は settings の
+transaction_mode=IMMEDIATE でトランザクション開始時に書き込みロックを取るので、
+ダブルクリックが同時に届いても読んでから書くまでの間に割り込まれない。
+ロック待ちがタイムアウトした（database is locked）ときは間を空けて最初からやり直す。
+カウンタ列は signals が同じトランザクション内で F 式で更新するので、
+結果の件数はその列を読むだけで COUNT はしない。
+"""
+import time
+
+from django.db import OperationalError, connection, transaction
+
+from .models import UserFollow, UserProfile, WordBook, WordBookBookmark, WordCardStar, wordBookLike
+
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+MAX_BATCH_TOGGLES = 50
+
+LOCK_ERRORS = ('database is locked', 'database table is locked')
+
+
+class Kind:
+    """トグルの種類。counter は (カウンタを持つモデル, 対象 id の列, カウンタ列)"""
+
+    def __init__(self, model, owner_field, target_field, counter=None):
+        self.model = model
+        self.owner_field = owner_field
+        self.target_field = target_field
+        self.counter = counter
+
+
+KINDS = {
+    'like': Kind(wordBookLike, 'user', 'wordbook', (WordBook, 'pk', 'likes_count')),
+    'bookmark': Kind(WordBookBookmark, 'user', 'wordbook', (WordBook, 'pk', 'bookmarks_count')),
+    'star': Kind(WordCardStar, 'user', 'wordcard'),
+    'follow': Kind(UserFollow, 'follower', 'following', (UserProfile, 'user_id', 'followers_count')),
+}
+
+
+def is_lock_error(error):
+    return any(message in str(error) for message in LOCK_ERRORS)
+
+
+def with_retry(func):
+    """func をトランザクション内で実行し、ロック競合で失敗したら指数的に間を空けてやり直す"""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return func()
+        except OperationalError as error:
+            # 外側のトランザクションの中ではやり直せない
+            if not is_lock_error(error) or attempt == RETRY_ATTEMPTS - 1 or connection.in_atomic_block:
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+def _apply(kind, user, target_id):
+    spec = KINDS[kind]
+    lookup = {spec.owner_field: user, f'{spec.target_field}_id': target_id}
+    deleted, _ = spec.model.objects.filter(**lookup).delete()
+    active = not deleted
+    if active:
+        spec.model.objects.create(**lookup)
+
+    count = None
+    if spec.counter is not None:
+        model, field, column = spec.counter
+        count = model.objects.filter(**{field: target_id}).values_list(column, flat=True).first() or 0
+    return active, count
+
+
+def toggle(kind, user, target_id):
+    """トグルして (切り替え後に有効か, カウンタの値) を返す。カウンタの無い種類は None"""
+    return with_retry(lambda: _apply(kind, user, target_id))
+
+
+def toggle_many(user, items):
+    """[(種類, 対象 id), ...] を1トランザクションでまとめてトグルし、それぞれの結果をリストで返す"""
+    return with_retry(lambda: [_apply(kind, user, target_id) for kind, target_id in items])
@@ -0,0 +1,148 @@
+"""時間減衰付きのトレンドスコア
+
+スコアは各イベント（いいね・ブックマーク・スター・新規作成）の重みを
+半減期 HALF_LIFE_HOURS で指数減衰させた合計。
+全単語帳に同じ減衰がかかるので、固定の基準時刻 EPOCH に対して
+log(Σ weight * exp(λ * (t - EPOCH))) を保存すれば、時間が経っても
+保存済みの値を減衰し直すことなく大小比較だけで順位が決まる。
+新しいイベントは logaddexp で足し込むだけなので差分更新できる。
+
+差分更新は created_at の区間で行うが、created_at はコミットより前に決まるので、
+実行時にまだコミットされていない行を取りこぼさないよう直近 COMMIT_GRACE 分は次回に回す。
+区間は SLICE ごとに区切り、スコアとチェックポイントを1区間ずつコミットする
+（書き込みロックを長く持たず、途中で止まっても続きから再開できる）。
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import JobCheckpoint, WordBook, WordBookBookmark, WordBookTrendingScore, WordCardStar, wordBookLike
+
+CHECKPOINT_NAME = 'trending'
+
+HALF_LIFE_HOURS = 48
+DECAY_RATE = math.log(2) / (HALF_LIFE_HOURS * 3600)
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+# イベントの種類ごとの重み
+LIKE_WEIGHT = 3.0
+BOOKMARK_WEIGHT = 4.0
+STAR_WEIGHT = 1.0
+CREATED_WEIGHT = 5.0
+
+BATCH_SIZE = 500
+
+# これより新しいイベントは書き込み中のトランザクションがありうるので次回の実行で拾う
+COMMIT_GRACE = timedelta(minutes=5)
+# 1トランザクションで処理する created_at の幅
+SLICE = timedelta(days=1)
+
+
+def event_score(weight, at):
+    """1イベント分の対数スコア"""
+    return math.log(weight) + DECAY_RATE * (at - EPOCH).total_seconds()
+
+
+def logaddexp(a, b):
+    if a is None:
+        return b
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _sources():
+    return [
+        (wordBookLike.objects.all(), 'wordbook_id', LIKE_WEIGHT),
+        (WordBookBookmark.objects.all(), 'wordbook_id', BOOKMARK_WEIGHT),
+        (WordCardStar.objects.all(), 'wordcard__wordbook_id', STAR_WEIGHT),
+        (WordBook.objects.all(), 'id', CREATED_WEIGHT),
+    ]
+
+
+def _events(since, until):
+    """(wordbook_id, 重み, 発生日時) を since より後 until 以前の範囲で列挙する"""
+    for queryset, wordbook_field, weight in _sources():
+        queryset = queryset.filter(created_at__gt=since, created_at__lte=until)
+        for wordbook_id, created_at in queryset.values_list(wordbook_field, 'created_at').iterator():
+            yield wordbook_id, weight, created_at
+
+
+def _first_event_at():
+    firsts = [queryset.aggregate(first=Min('created_at'))['first'] for queryset, _, _ in _sources()]
+    firsts = [first for first in firsts if first is not None]
+    return min(firsts) if firsts else None
+
+
+def _apply(deltas, now):
+    ids = list(deltas)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        existing = WordBookTrendingScore.objects.in_bulk(batch, field_name='wordbook_id')
+        to_update = []
+        to_create = []
+        for wordbook_id in batch:
+            row = existing.get(wordbook_id)
+            if row is None:
+                to_create.append(WordBookTrendingScore(wordbook_id=wordbook_id, score=deltas[wordbook_id]))
+            else:
+                row.score = logaddexp(row.score, deltas[wordbook_id])
+                row.updated_at = now
+                to_update.append(row)
+        WordBookTrendingScore.objects.bulk_update(to_update, ['score', 'updated_at'])
+        WordBookTrendingScore.objects.bulk_create(to_create)
+
+
+def update_scores(full=False, now=None):
+    """前回実行以降のイベントをスコアに足し込む。full=True なら全履歴から作り直す
+
+    取り消されたいいね等は差し引かないので、定期的に full で作り直すこと。
+    更新した単語帳の数を返す。
+    """
+    now = now or timezone.now()
+    until = now - COMMIT_GRACE
+    if full:
+        with transaction.atomic():
+            WordBookTrendingScore.objects.all().delete()
+            JobCheckpoint.objects.update_or_create(name=CHECKPOINT_NAME, defaults={'last_run_at': None})
+
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    since = checkpoint.last_run_at
+    if since is None:
+        first = _first_event_at()
+        since = first - timedelta(microseconds=1) if first is not None else until
+        with transaction.atomic():
+            # 同時に別の実行が始めていたらそちらに任せる
+            if not JobCheckpoint.objects.filter(pk=checkpoint.pk, last_run_at__isnull=True).update(last_run_at=since, updated_at=now):
+                return 0
+
+    updated = set()
+    while since < until:
+        slice_end = min(since + SLICE, until)
+        with transaction.atomic():
+            # 別の実行が先に進めていたら（同じ区間を二重に足さないよう）ここでやめる
+            if not JobCheckpoint.objects.filter(pk=checkpoint.pk, last_run_at=since).update(last_run_at=slice_end, updated_at=now):
+                break
+            deltas = {}
+            for wordbook_id, weight, created_at in _events(since, slice_end):
+                deltas[wordbook_id] = logaddexp(deltas.get(wordbook_id), event_score(weight, created_at))
+            _apply(deltas, now)
+        updated.update(deltas)
+        since = slice_end
+    return len(updated)
+
+
+def top_wordbooks(queryset, limit):
+    """queryset の単語帳からトレンド上位 limit 件を返す
+
+    スコア未計算の単語帳しか無い場合（初回実行前など）は、いいね数順で埋める。
+    """
+    ranked = list(queryset.filter(trending__isnull=False).order_by('-trending__score')[:limit])
+    if len(ranked) < limit:
+        ranked += list(
+            queryset.filter(trending__isnull=True)
+            .order_by('-likes_count', '-created_at')[:limit - len(ranked)]
+        )
+    return ranked
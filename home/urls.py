@@ -6,12 +6,17 @@ urlpatterns = [
     path('mypage/', views.mypage, name='mypage'),
     path('mypage/wordbooks/', views.my_wordbooks_all, name='mypage_wordbooks_all'),
     path('mypage/bookmarks/', views.bookmarked_wordbooks_all, name='mypage_bookmarks_all'),
+    path('mypage/feed/', views.following_feed, name='following_feed'),
     # Avatar APIs
     path('api/avatars/', views.get_available_avatars, name='get_avatars'),
     path('api/avatar/update/', views.update_avatar, name='update_avatar'),
     path('api/avatar/upload/', views.upload_custom_avatar, name='upload_custom_avatar'),
     path('api/backgrounds/', views.get_available_backgrounds, name='get_backgrounds'),
     path('api/background/update/', views.update_background, name='update_background'),
+    path('api/reviews/due/', views.review_due, name='review_due'),
+    path('api/reviews/submit/', views.review_submit, name='review_submit'),
+    path('api/quiz/answers/', views.quiz_answers_submit, name='quiz_answers_submit'),
+    path('api/toggles/', views.toggles_batch, name='toggles_batch'),
     # Tag APIs
     path('tags/', views.tags_list, name='tags_list'),
     path('tags/create/', views.tag_create, name='tag_create'),
@@ -20,6 +25,7 @@ urlpatterns = [
     path('admin/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin/wordbooks/<int:pk>/delete/', views.admin_delete_wordbook, name='admin_delete_wordbook'),
     path('admin/wordbooks/<int:pk>/toggle-pin/', views.admin_toggle_pin, name='admin_toggle_pin'),
+    path('api/admin/query-stats/', views.admin_query_stats, name='admin_query_stats'),
     # User registration & authentication
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
@@ -28,6 +34,8 @@ urlpatterns = [
     path('wordbooks/create/', views.wordbook_create, name='wordbook_create'),
     path('wordbooks/<int:pk>/', views.wordbook_detail, name='wordbook_detail'),
     path('wordbooks/<int:pk>/play/', views.wordbook_play, name='wordbook_play'),
+    path('wordbooks/<int:pk>/quiz/start/', views.wordbook_quiz_start, name='wordbook_quiz_start'),
+    path('wordbooks/<int:pk>/quiz/questions/', views.wordbook_quiz_questions, name='wordbook_quiz_questions'),
     path('wordbooks/<int:pk>/tags/', views.wordbook_update_tags, name='wordbook_update_tags'),
     path('wordbooks/<int:pk>/bookmark/', views.wordbook_bookmark_toggle, name='wordbook_bookmark'),
     path('wordbooks/<int:pk>/publish/', views.wordbook_toggle_public, name='wordbook_toggle_public'),
@@ -4,14 +4,21 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Count, Exists, OuterRef, Q
 from django.urls import reverse
 from django.http import JsonResponse, HttpResponseForbidden, Http404
+from django.utils import timezone
 from django.utils.text import slugify
 from .models import WordBook, WordCard, Tag, wordBookLike, WordBookBookmark, UserProfile, WordCardStar, UserFollow
+from . import answers, feed, fragment_cache, images, query_stats, quiz, recommendations, reviews, search, tags, toggles, trending
+from .counters import subquery_count
+from .pagination import fragment_response, keyset_page, wants_fragment
+from .roles import user_roles
+from .tags import get_leaderboard
 import re
 import random
 import json
+from urllib.parse import quote
 
 AVATAR_IMAGES = [
     'account.png',
@@ -34,6 +41,9 @@ BACKGROUND_COLORS = [
     '#e0f2fe',
 ]
 
+# API で返すアバター URL の表示サイズ（px）。プロフィール画面の大きいアバターに合わせる
+AVATAR_DISPLAY_SIZE = 192
+
 
 def user_can_view_wordbook(wordbook, user):
     """公開済み、AI生成、作成者、または管理者のみ閲覧可"""
@@ -54,47 +64,65 @@ def get_wordbook_for_view(pk, user):
         qs = WordBook.objects.filter(Q(is_public=True) | Q(is_ai_generated=True) | Q(user=user))
     else:
         qs = WordBook.objects.filter(Q(is_public=True) | Q(is_ai_generated=True))
-    return get_object_or_404(qs, pk=pk)
+    return get_object_or_404(qs.with_creator_profile(), pk=pk)
+
+
+def load_mypage_summary(user):
+    """マイページの統計をプロファイル1行の取得でまとめて読み込む
+
+    いいね合計・フォロー数はカウンタ列、単語帳数・保存数・スター数は
+    相関サブクエリで同じ SELECT 内で数える。
+    """
+    visible_bookmarks = WordBookBookmark.objects.filter(user=OuterRef('user_id')).filter(
+        Q(wordbook__is_public=True) | Q(wordbook__is_ai_generated=True) | Q(wordbook__user=OuterRef('user_id'))
+    )
+    summary_qs = UserProfile.objects.filter(user=user).annotate(
+        my_wordbooks_count=subquery_count(WordBook.objects.filter(user=OuterRef('user_id'))),
+        saved_wordbooks_count=subquery_count(visible_bookmarks),
+        starred_cards_count=subquery_count(WordCardStar.objects.filter(user=OuterRef('user_id'))),
+    )
+    summary = summary_qs.first()
+    if summary is None:
+        # プロファイル未作成のユーザー
+        UserProfile.objects.get_or_create(user=user)
+        summary = summary_qs.first()
+    return summary
+
+
 # マイページ
 @login_required
 def mypage(request):
-    # 自分の単語帳
-    my_wordbooks_qs = WordBook.objects.filter(user=request.user).annotate(like_count=Count('likes')).order_by('-created_at')
-    my_wordbooks_count = my_wordbooks_qs.count()
-    my_wordbooks_preview = list(my_wordbooks_qs[:3])  # PC用は3件
-    my_wordbooks_all = list(my_wordbooks_qs)  # モバイル用は全件
-
-    # 保存した単語帳（ブックマーク）
-    bookmarked_qs = WordBook.objects.filter(bookmarks__user=request.user).filter(Q(is_public=True) | Q(is_ai_generated=True) | Q(user=request.user)).annotate(like_count=Count('likes')).order_by('-bookmarks__created_at')
-    saved_wordbooks_count = bookmarked_qs.count()
-    saved_wordbooks_preview = list(bookmarked_qs[:3])  # PC用は3件
-    saved_wordbooks_all = list(bookmarked_qs)  # モバイル用は全件
+    # 統計（単語帳数・保存数・スター数・いいね合計・フォロー数）を1クエリで取得
+    summary = load_mypage_summary(request.user)
+    
+    # 自分の単語帳（PC用は3件。全件は一覧ページで遅延読み込み）
+    my_wordbooks_preview = list(
+        WordBook.objects.filter(user=request.user).with_creator_profile().order_by('-created_at')[:3]
+    )
+
+    # 保存した単語帳（ブックマーク、PC用は3件。全件は一覧ページで遅延読み込み）
+    saved_wordbooks_preview = list(
+        WordBook.objects.filter(bookmarks__user=request.user)
+        .filter(Q(is_public=True) | Q(is_ai_generated=True) | Q(user=request.user))
+        .with_creator_profile()
+        .order_by('-bookmarks__created_at')[:3]
+    )
 
     nickname = request.user.first_name or request.user.username
-    likes_total = wordBookLike.objects.filter(wordbook__user=request.user).count()
-    starred_cards_count = WordCardStar.objects.filter(user=request.user).count()
-    
-    # ユーザープロファイルを取得または作成
-    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-    
-    # フォロワー数とフォロー中の数を取得
-    followers_count = UserFollow.objects.filter(following=request.user).count()
-    following_count = UserFollow.objects.filter(follower=request.user).count()
     
     context = {
         'my_wordbooks': my_wordbooks_preview,
-        'my_wordbooks_all': my_wordbooks_all,
-        'my_wordbooks_count': my_wordbooks_count,
+        'my_wordbooks_count': summary.my_wordbooks_count,
         'saved_wordbooks': saved_wordbooks_preview,
-        'saved_wordbooks_all': saved_wordbooks_all,
-        'saved_wordbooks_count': saved_wordbooks_count,
+        'saved_wordbooks_count': summary.saved_wordbooks_count,
         'nickname': nickname,
-        'likes_total': likes_total,
-        'starred_cards_count': starred_cards_count,
-        'avatar_image': user_profile.avatar_image,
-        'background_color': user_profile.background_color,
-        'followers_count': followers_count,
-        'following_count': following_count,
+        'likes_total': summary.likes_received_count,
+        'starred_cards_count': summary.starred_cards_count,
+        'avatar_image': summary.avatar_image,
+        'avatar_url': summary.get_avatar_url(AVATAR_DISPLAY_SIZE),
+        'background_color': summary.background_color,
+        'followers_count': summary.followers_count,
+        'following_count': summary.following_count,
     }
     return render(request, 'home/mypage.html', context)
 
@@ -139,78 +167,148 @@ def logout_view(request):
     messages.success(request, 'ログアウトしました')
     return redirect('home')
 
-# ホームページ（単語帳一覧）
-def wordbook_list(request):
-    # 検索パラメータを取得
-    search_query = request.GET.get('q', '').strip()  # キーワード検索
-    tag_name = request.GET.get('tag')  # タグ名での検索
-    tag_ids = request.GET.get('tags')  # タグIDでの検索（複数対応）
-    
+# ホームページのセクション（ピン留め・人気・AI）のキャッシュ期間（秒）
+HOME_SECTIONS_TIMEOUT = 60 * 2
+
+# 詳細ページに出す「いいねした人はこんな単語帳も」の件数
+SIMILAR_WORDBOOKS_LIMIT = 6
+
+
+def build_home_sections(is_admin, search_query, tag_name, tag_id_list, tag_mode=tags.MODE_OR):
+    """ホームページの単語帳セクションを組み立てる（表示権限とフィルター条件だけで決まる）"""
     # 基本のクエリセット（index では非公開は出さない。AIは常に表示）
-    if request.user.is_authenticated and is_admin_user(request.user):
-        wordbooks_base = WordBook.objects.all()
+    if is_admin:
+        wordbooks_base = WordBook.objects.with_creator_profile()
     else:
-        wordbooks_base = WordBook.objects.filter(Q(is_public=True) | Q(is_ai_generated=True))
+        wordbooks_base = WordBook.objects.with_creator_profile().filter(Q(is_public=True) | Q(is_ai_generated=True))
     
-    # キーワード検索
+    # キーワード検索（全文検索インデックスで関連度順に。使えない場合は部分一致）
+    search_rank = None
     if search_query:
-        wordbooks_base = wordbooks_base.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(cards__front_text__icontains=search_query) |
-            Q(cards__back_text__icontains=search_query)
-        ).distinct()
+        matched = search.search_filter(search_query)
+        if matched is not None:
+            condition, search_rank = matched
+            wordbooks_base = wordbooks_base.filter(**condition)
+        else:
+            wordbooks_base = wordbooks_base.filter(
+                Q(title__icontains=search_query) | 
+                Q(description__icontains=search_query) |
+                Q(cards__front_text__icontains=search_query) |
+                Q(cards__back_text__icontains=search_query)
+            ).distinct()
     
     # タグでフィルタリング
-    selected_tags = []
     if tag_name:
         # タグ名で検索（単一）
         wordbooks_base = wordbooks_base.filter(tags__name=tag_name).distinct()
-        selected_tags = Tag.objects.filter(name=tag_name)
-    elif tag_ids:
-        # タグIDで検索（複数可能）
-        tag_id_list = [int(x) for x in tag_ids.split(',') if x.strip().isdigit()]
-        wordbooks_base = wordbooks_base.filter(tags__id__in=tag_id_list).distinct()
-        selected_tags = Tag.objects.filter(id__in=tag_id_list)
+    elif tag_id_list is not None:
+        # タグIDで検索（複数可能）。AND/OR はポスティングリストの集合演算で先に済ませる
+        matched_ids = tags.match_wordbook_ids(tag_id_list, tag_mode)
+        if len(matched_ids) <= tags.MAX_FILTER_IDS:
+            wordbooks_base = wordbooks_base.filter(pk__in=matched_ids)
+        elif tag_mode == tags.MODE_AND:
+            for tag_id in tag_id_list:
+                wordbooks_base = wordbooks_base.filter(tags__id=tag_id)
+        else:
+            wordbooks_base = wordbooks_base.filter(tags__id__in=tag_id_list).distinct()
     
     # ピン留めされた単語帳（管理者のおすすめ）
-    pinned_wordbooks = wordbooks_base.filter(is_pinned=True, is_public=True).annotate(like_count=Count('likes')).order_by('-created_at')[:6]
+    pinned_wordbooks = wordbooks_base.filter(is_pinned=True, is_public=True).order_by('-created_at')[:6]
     
-    # 人気の単語帳（いいね数順）: フィルター中は絞り込み結果のみ、未フィルター時も公開/AIのみ
-    public_ai = WordBook.objects.filter(Q(is_public=True) | Q(is_ai_generated=True))
-    popular_source = wordbooks_base if (tag_name or tag_ids or search_query) else public_ai
-    popular_wordbooks = popular_source.annotate(like_count=Count('likes')).order_by('-like_count', '-created_at')[:6]
+    # 人気の単語帳: フィルター中は絞り込み結果をいいね数順、未フィルター時は公開/AIをトレンド順
+    is_filtered = bool(tag_name or tag_id_list is not None or search_query)
+    public_ai = WordBook.objects.with_creator_profile().filter(Q(is_public=True) | Q(is_ai_generated=True))
+    popular_source = wordbooks_base if is_filtered else public_ai
+    popular_order = ['-likes_count', '-created_at']
     
     # AIの単語帳: フィルター中は絞り込み結果のみ、未フィルター時も公開/AIのみ
-    ai_source = wordbooks_base if (tag_name or tag_ids or search_query) else public_ai
-    ai_wordbooks = ai_source.filter(is_ai_generated=True).annotate(like_count=Count('likes')).order_by('-created_at')[:12]
+    ai_source = wordbooks_base if is_filtered else public_ai
+    ai_order = ['-created_at']
+    
+    # キーワード検索中は関連度の高い順に並べる
+    if search_rank is not None:
+        popular_order = [search_rank] + popular_order
+        ai_order = [search_rank] + ai_order
+    if is_filtered:
+        popular_wordbooks = popular_source.order_by(*popular_order)[:6]
+    else:
+        # 未フィルター時は時間減衰付きのトレンド順（update_trending で集計済み）
+        popular_wordbooks = trending.top_wordbooks(public_ai, 6)
+    ai_wordbooks = ai_source.filter(is_ai_generated=True).order_by(*ai_order)[:12]
+    
+    return {
+        'pinned_wordbooks': list(pinned_wordbooks),
+        'popular_wordbooks': list(popular_wordbooks),
+        'ai_wordbooks': list(ai_wordbooks),
+    }
+
+
+def build_related_tags(tag_id_list, tag_mode):
+    """選択中のタグと一緒に付いていることが多いタグ（追加したときの絞り込み URL 付き）"""
+    matched_ids = tags.match_wordbook_ids(tag_id_list, tag_mode)
+    counts = tags.related_tags(matched_ids, exclude=tag_id_list)
+    tag_objects = Tag.objects.in_bulk([tag_id for tag_id, _ in counts])
+    related = []
+    for tag_id, count in counts:
+        tag = tag_objects.get(tag_id)
+        if tag is None:
+            continue
+        ids = ','.join(str(pk) for pk in (*tag_id_list, tag_id))
+        related.append({'tag': tag, 'count': count, 'query': f'?tags={ids}&tag_mode={tags.MODE_AND}'})
+    return related
+
+
+# ホームページ（単語帳一覧）
+def wordbook_list(request):
+    # 検索パラメータを取得
+    search_query = request.GET.get('q', '').strip()  # キーワード検索
+    tag_name = request.GET.get('tag')  # タグ名での検索
+    tag_ids = request.GET.get('tags')  # タグIDでの検索（複数対応）
+    # 複数タグの組み合わせ方（or: どれか / and: すべて）
+    tag_mode = tags.MODE_AND if request.GET.get('tag_mode') == tags.MODE_AND else tags.MODE_OR
     
-    # 人気タグTOP10を取得（使用数順）
-    popular_tags = Tag.objects.annotate(
-        usage_count=Count('wordbooks')
-    ).filter(usage_count__gt=0).order_by('-usage_count', 'name')[:10]
+    # 選択中のタグ
+    selected_tags = []
+    tag_id_list = None
+    related_tags = []
+    if tag_name:
+        selected_tags = Tag.objects.filter(name=tag_name)
+    elif tag_ids:
+        tag_id_list = tuple(sorted({int(x) for x in tag_ids.split(',') if x.strip().isdigit()}))
+        selected_tags = Tag.objects.filter(id__in=tag_id_list)
+        related_tags = build_related_tags(tag_id_list, tag_mode)
+    
+    # 管理者かどうかをチェック
+    is_admin = is_admin_user(request.user) if request.user.is_authenticated else False
+    
+    # 単語帳セクションは表示区分（管理者/それ以外）とフィルター条件ごとにキャッシュ
+    sections = fragment_cache.get_or_compute(
+        fragment_cache.HOME_SECTIONS,
+        ('admin' if is_admin else 'member', search_query, tag_name, tag_id_list, tag_mode),
+        lambda: build_home_sections(is_admin, search_query, tag_name, tag_id_list, tag_mode),
+        HOME_SECTIONS_TIMEOUT,
+    )
+    
+    # 人気タグTOP10を取得（使用数順、キャッシュ済みランキングから）
+    popular_tags = get_leaderboard(10)
     
     # 全タグをカテゴリ別に分類（サイドバー用）
-    all_tags = Tag.objects.annotate(
-        usage_count=Count('wordbooks')
-    ).filter(usage_count__gt=0).order_by('-usage_count', 'name')[:50]  # 上位50タグ
+    all_tags = get_leaderboard(50)  # 上位50タグ
     
     # 選択中のタグ名のリストを作成
     selected_tag_names = [tag.name for tag in selected_tags]
     
-    # 管理者かどうかをチェック
-    is_admin = is_admin_user(request.user) if request.user.is_authenticated else False
-    
     context = {
-        'pinned_wordbooks': pinned_wordbooks,  # ピン留め単語帳を追加
-        'popular_wordbooks': popular_wordbooks,
-        'ai_wordbooks': ai_wordbooks,
+        **sections,  # ピン留め・人気・AIの単語帳
         'popular_tags': popular_tags,  # 人気タグを追加
         'all_tags': all_tags,  # サイドバー用全タグ
         'search_query': search_query,  # 検索クエリを追加
         'selected_tags': selected_tags,  # 選択中のタグ
         'selected_tag_names': selected_tag_names,  # 選択中のタグ名リスト
+        'tag_mode': tag_mode,  # 複数タグの組み合わせ方
+        'related_tags': related_tags,  # 一緒に付いていることが多いタグ
         'is_filtered': bool(tag_name or tag_ids or search_query),  # フィルター中かどうか
+        'result_count': len(sections['popular_wordbooks']) + len(sections['ai_wordbooks']),  # 検索結果の件数
         'is_admin': is_admin,  # 管理者権限
     }
     return render(request, 'home/wordbook_list.html', context)
@@ -238,7 +336,7 @@ def wordbook_detail(request, pk):
     wordbook = get_wordbook_for_view(pk, request.user)
     cards = wordbook.cards.all()
     
-    likes_count = wordbook.likes.count()
+    likes_count = wordbook.likes_count
     user_has_liked = False
     user_has_bookmarked = False
     starred_card_ids = []
@@ -259,6 +357,8 @@ def wordbook_detail(request, pk):
         'can_edit': can_edit,
         'wordbook': wordbook,
         'cards': cards,
+        # 「いいねした人はこんな単語帳も」（build_recommendations で計算済みのものを読むだけ）
+        'similar_wordbooks': recommendations.similar_wordbooks(wordbook, SIMILAR_WORDBOOKS_LIMIT),
     }
     return render(request, 'home/wordbook_detail.html', context)
 
@@ -266,28 +366,135 @@ def wordbook_detail(request, pk):
 @login_required
 def wordbook_play(request, pk):
     wordbook = get_wordbook_for_view(pk, request.user)
-    cards = list(wordbook.cards.all())
 
-    if len(cards) < 4:
+    # カードは quiz API からバッチで取得するので、ここでは枚数だけ確認する
+    if wordbook.cards_count < quiz.MIN_CARDS:
         messages.error(request, 'プレイするにはカードが4枚以上必要です')
         return redirect('wordbook_detail', pk=pk)
 
-    cards_data = [
-        {
-            'id': c.id,
-            'front': c.front_text,
-            'back': c.back_text,
-        }
-        for c in cards
-    ]
-
     context = {
         'wordbook': wordbook,
-        'cards_json': json.dumps(cards_data, ensure_ascii=False),
-        'card_count': len(cards),
+        'card_count': wordbook.cards_count,
+        'quiz_batch_size': quiz.BATCH_SIZE,
     }
     return render(request, 'home/wordbook_play.html', context)
 
+
+@login_required
+def wordbook_quiz_start(request, pk):
+    """クイズを開始（resume=1 なら同じモードの進行中クイズを再開）"""
+    if request.method != 'POST':
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'POST required'}}, status=400)
+    wordbook = get_wordbook_for_view(pk, request.user)
+
+    mode = request.POST.get('mode', 'all')
+    if mode not in ('all', 'review'):
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid mode'}}, status=400)
+    if mode == 'all' and wordbook.cards_count < quiz.MIN_CARDS:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'プレイするにはカードが4枚以上必要です'}}, status=400)
+
+    review_ids = []
+    if mode == 'review':
+        try:
+            review_ids = [int(x) for x in request.POST.get('card_ids', '').split(',') if x.strip()]
+        except ValueError:
+            return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid card_ids'}}, status=400)
+
+    state = quiz.start(request.session, wordbook, mode, review_ids, resume=request.POST.get('resume') == '1')
+    if state is None:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': '間違えた問題がありません'}}, status=400)
+    total = len(state['card_ids']) if mode == 'review' else wordbook.cards_count
+    return JsonResponse({'quiz_id': state['quiz_id'], 'mode': state['mode'], 'total': total})
+
+
+@login_required
+def wordbook_quiz_questions(request, pk):
+    """進行中クイズの問題を offset から limit 問分返す"""
+    wordbook = get_wordbook_for_view(pk, request.user)
+    state = quiz.get_state(request.session, wordbook, request.GET.get('quiz', ''))
+    if state is None:
+        return JsonResponse({'error': {'code': 'NotFound', 'message': 'quiz not found'}}, status=404)
+    try:
+        offset = int(request.GET.get('offset') or 0)
+        limit = int(request.GET.get('limit') or quiz.BATCH_SIZE)
+    except ValueError:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'offset/limit must be integers'}}, status=400)
+    if offset < 0 or not 1 <= limit <= quiz.MAX_BATCH_SIZE:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid offset/limit'}}, status=400)
+
+    questions, total = quiz.question_batch(state, wordbook, offset, limit)
+    next_offset = offset + limit if offset + limit < total else None
+    return JsonResponse({'questions': questions, 'total': total, 'next_offset': next_offset})
+
+
+@login_required
+def review_due(request):
+    """期限の来た復習カードを単語帳・スターをまたいで返す"""
+    try:
+        limit = int(request.GET.get('limit') or reviews.DUE_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'limit must be an integer'}}, status=400)
+    if not 1 <= limit <= reviews.MAX_DUE_LIMIT:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid limit'}}, status=400)
+
+    states = reviews.due_states(request.user, limit)
+    cards = [
+        {
+            'id': state.card_id,
+            'front': state.card.front_text,
+            'back': state.card.back_text,
+            'wordbook_id': state.card.wordbook_id,
+            'wordbook_title': state.card.wordbook.title,
+            'due_at': state.due_at.isoformat(),
+            'repetitions': state.repetitions,
+        }
+        for state in states
+    ]
+    return JsonResponse({'cards': cards, 'due_count': reviews.due_count(request.user)})
+
+
+@login_required
+def review_submit(request):
+    """復習結果をまとめて反映する
+
+    本文は JSON: {"results": [{"card_id": 1, "correct": true}, {"card_id": 2, "quality": 3}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'POST required'}}, status=400)
+    try:
+        payload = json.loads(request.body)
+        results = [(int(r['card_id']), reviews.quality_from_result(r)) for r in payload['results']]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid results'}}, status=400)
+    if len(results) > reviews.MAX_BATCH_RESULTS:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'too many results'}}, status=400)
+
+    applied = reviews.record_results(request.user, results)
+    return JsonResponse({'applied': applied, 'due_count': reviews.due_count(request.user)})
+
+
+@login_required
+def quiz_answers_submit(request):
+    """クイズの回答をまとめて記録する（同じ key の再送は無視）
+
+    本文は JSON: {"answers": [{"key": "...", "card_id": 1, "correct": true,
+    "timed_out": false, "response_ms": 1200, "answered_at": "2025-01-01T00:00:00Z"}, ...]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'POST required'}}, status=400)
+    now = timezone.now()
+    try:
+        payload = json.loads(request.body)
+        parsed = [answers.parse_answer(raw, now) for raw in payload['answers']]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid answers'}}, status=400)
+    if len(parsed) > answers.MAX_BATCH_ANSWERS:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'too many answers'}}, status=400)
+
+    created, duplicates = answers.ingest(request.user, parsed, now)
+    return JsonResponse({'created': created, 'duplicates': duplicates})
+
+
 # 単語カード作成
 @login_required
 def wordcard_create(request, wordbook_pk):
@@ -330,7 +537,9 @@ def import_starred_card(request, wordbook_pk, card_id):
         wordbook=wordbook,
         front_text=original_card.front_text,
         back_text=original_card.back_text,
-        image=original_card.image
+        image=original_card.image,
+        # 同じファイルを指すので縮小版もそのまま使い回す
+        image_renditions=original_card.image_renditions,
     )
     
     messages.success(request, f'「{original_card.front_text}」をインポートしました。')
@@ -353,10 +562,8 @@ def wordcard_delete(request, pk):
 def wordbook_like_toggle(request, pk):
     wordbook = get_wordbook_for_view(pk, request.user)
     if request.method == 'POST':
-        like, created = wordBookLike.objects.get_or_create(user=request.user, wordbook=wordbook)
-        if not created:
-            like.delete()
-        return JsonResponse({'liked': created, 'likes_count': wordbook.likes.count()})
+        liked, likes_count = toggles.toggle('like', request.user, wordbook.pk)
+        return JsonResponse({'liked': liked, 'likes_count': likes_count})
     return JsonResponse({'error': 'POST required'}, status=400)   
 
 
@@ -365,10 +572,8 @@ def wordbook_like_toggle(request, pk):
 def wordbook_bookmark_toggle(request, pk):
     wordbook = get_wordbook_for_view(pk, request.user)
     if request.method == 'POST':
-        bookmark, created = WordBookBookmark.objects.get_or_create(user=request.user, wordbook=wordbook)
-        if not created:
-            bookmark.delete()
-        return JsonResponse({'bookmarked': created})
+        bookmarked, bookmarks_count = toggles.toggle('bookmark', request.user, wordbook.pk)
+        return JsonResponse({'bookmarked': bookmarked, 'bookmarks_count': bookmarks_count})
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
 
@@ -378,6 +583,10 @@ def wordbook_toggle_public(request, pk):
     if request.method == 'POST':
         wordbook.is_public = not wordbook.is_public
         wordbook.save(update_fields=['is_public'])
+        if wordbook.is_public:
+            feed.publish(wordbook)
+        else:
+            feed.unpublish(wordbook)
         return JsonResponse({'is_public': wordbook.is_public})
     return JsonResponse({'error': 'POST required'}, status=400)
 
@@ -395,7 +604,9 @@ def _normalize_tag_name(name: str) -> str:
 
 
 def tags_list(request):
+    """タグ一覧。q は部分一致、prefix はメモリ上のインデックスでの前方一致（入力補完用）"""
     q = (request.GET.get('q') or '').strip()
+    prefix = (request.GET.get('prefix') or '').strip()
     try:
         limit = int(request.GET.get('limit') or 20)
         offset = int(request.GET.get('offset') or 0)
@@ -405,29 +616,41 @@ def tags_list(request):
     if limit < 1 or limit > 50 or offset < 0 or order_by not in ('name', '-name'):
         return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid limit/offset/order_by'}}, status=400)
 
-    qs = Tag.objects.all()
-    if q:
-        qs = qs.filter(name__icontains=q)
-    total = qs.count()
-    items = qs.order_by(order_by)[offset:offset+limit]
-    # usage_countは必要に応じて別クエリで集計可能。ここでは省略/0固定にせず関連数を取得
+    if prefix:
+        index = tags.get_prefix_index()
+        lo, hi = index.search(prefix)
+        total = hi - lo
+        if order_by == 'name':
+            entries = index.entries[lo + offset:min(hi, lo + offset + limit)]
+        else:
+            entries = index.entries[max(lo, hi - offset - limit):max(lo, hi - offset)][::-1]
+        items = [(pk, name, slug, created_by_id) for _, pk, name, slug, created_by_id in entries]
+    else:
+        qs = Tag.objects.all()
+        if q:
+            qs = qs.filter(name__icontains=q)
+        total = qs.count()
+        items = list(qs.order_by(order_by).values_list('pk', 'name', 'slug', 'created_by_id')[offset:offset+limit])
+
+    usage = tags.usage_counts([pk for pk, _, _, _ in items])
     user_id = request.user.id if request.user.is_authenticated else None
     payload = [
         {
-            'id': t.id,
-            'name': t.name,
-            'slug': t.slug,
-            'usage_count': t.wordbooks.count(),
-            'created_by_me': t.created_by_id == user_id if user_id else False,
-        } for t in items
+            'id': pk,
+            'name': name,
+            'slug': slug,
+            'usage_count': usage.get(pk, 0),
+            'created_by_me': created_by_id == user_id if user_id else False,
+        } for pk, name, slug, created_by_id in items
     ]
+    search_param = f"prefix={quote(prefix)}" if prefix else f"q={q}"
     next_url = None
     prev_url = None
     if offset + limit < total:
-        next_url = f"?q={q}&limit={limit}&offset={offset+limit}&order_by={order_by}"
+        next_url = f"?{search_param}&limit={limit}&offset={offset+limit}&order_by={order_by}"
     if offset > 0:
         prev_off = max(0, offset - limit)
-        prev_url = f"?q={q}&limit={limit}&offset={prev_off}&order_by={order_by}"
+        prev_url = f"?{search_param}&limit={limit}&offset={prev_off}&order_by={order_by}"
     return JsonResponse({'tags': payload, 'count': total, 'next': next_url, 'prev': prev_url})
 
 
@@ -500,30 +723,105 @@ def wordbook_update_tags(request, pk):
     return JsonResponse({'ok': True, 'tag_ids': [t.id for t in tags]})
 
 
-# 自分の単語帳全件
+# 自分の単語帳全件（キーセットページネーション）
 @login_required
 def my_wordbooks_all(request):
-    my_wordbooks_qs = WordBook.objects.filter(user=request.user).annotate(like_count=Count('likes')).order_by('-created_at')
+    my_wordbooks_qs = WordBook.objects.filter(user=request.user).with_creator_profile()
+    wordbooks, next_cursor = keyset_page(my_wordbooks_qs, request.GET.get('cursor'))
     context = {
         'title': '自分の単語帳',
-        'wordbooks': my_wordbooks_qs,
+        'wordbooks': wordbooks,
+        'next_cursor': next_cursor,
         'from_source': 'mypage',
     }
+    if wants_fragment(request):
+        return fragment_response(request, 'home/partials/wordbook_collection_items.html', context, next_cursor)
     return render(request, 'home/wordbook_collection_full.html', context)
 
 
-# ブックマーク全件
+# ブックマーク全件（保存日時でキーセットページネーション）
 @login_required
 def bookmarked_wordbooks_all(request):
-    bookmarked_qs = WordBook.objects.filter(bookmarks__user=request.user).filter(Q(is_public=True) | Q(is_ai_generated=True) | Q(user=request.user)).annotate(like_count=Count('likes')).order_by('-bookmarks__created_at')
+    bookmarks_qs = WordBookBookmark.objects.filter(user=request.user).filter(
+        Q(wordbook__is_public=True) | Q(wordbook__is_ai_generated=True) | Q(wordbook__user=request.user)
+    ).select_related('wordbook__user__profile')
+    bookmarks, next_cursor = keyset_page(bookmarks_qs, request.GET.get('cursor'))
     context = {
         'title': '保存した単語帳',
-        'wordbooks': bookmarked_qs,
+        'wordbooks': [bookmark.wordbook for bookmark in bookmarks],
+        'next_cursor': next_cursor,
         'from_source': 'bookmarks',
     }
+    if wants_fragment(request):
+        return fragment_response(request, 'home/partials/wordbook_collection_items.html', context, next_cursor)
+    return render(request, 'home/wordbook_collection_full.html', context)
+
+
+# フォロー中のユーザーが公開した単語帳（公開日時でキーセットページネーション）
+@login_required
+def following_feed(request):
+    wordbooks, next_cursor = feed.page(request.user, request.GET.get('cursor'))
+    context = {
+        'title': 'フォロー中の新着',
+        'wordbooks': wordbooks,
+        'next_cursor': next_cursor,
+        'from_source': 'feed',
+    }
+    if wants_fragment(request):
+        return fragment_response(request, 'home/partials/wordbook_collection_items.html', context, next_cursor)
     return render(request, 'home/wordbook_collection_full.html', context)
 
 
+# 複数のトグルをまとめて反映（オフライン中にたまった操作の送信など）
+@login_required
+def toggles_batch(request):
+    """本文は JSON: {"toggles": [{"kind": "like", "target": 1}, {"kind": "follow", "target": "username"}, ...]}
+
+    kind は like / bookmark / star / follow。target は単語帳 id・カード id・ユーザー名。
+    対象が見つからない・トグルできない項目は error を返してほかの項目だけ反映する。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'POST required'}}, status=400)
+    try:
+        items = json.loads(request.body)['toggles']
+        if not isinstance(items, list) or any(item.get('kind') not in toggles.KINDS for item in items):
+            raise ValueError
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'invalid toggles'}}, status=400)
+    if len(items) > toggles.MAX_BATCH_TOGGLES:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'too many toggles'}}, status=400)
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, item['kind'], _toggle_target_id(request.user, item['kind'], item.get('target'))))
+        except Http404:
+            results[index] = {'kind': item['kind'], 'target': item.get('target'), 'error': 'not found'}
+        except ValueError as e:
+            results[index] = {'kind': item['kind'], 'target': item.get('target'), 'error': str(e)}
+
+    applied = toggles.toggle_many(request.user, [(kind, target_id) for _, kind, target_id in valid])
+    for (index, kind, _), (active, count) in zip(valid, applied):
+        results[index] = {'kind': kind, 'target': items[index].get('target'), 'active': active, 'count': count}
+    return JsonResponse({'results': results})
+
+
+def _toggle_target_id(user, kind, target):
+    """トグル対象の id。見られない対象は Http404、トグルできない対象は ValueError"""
+    if kind in ('like', 'bookmark', 'star'):
+        try:
+            pk = int(target)
+        except (TypeError, ValueError):
+            raise ValueError('invalid target')
+        if kind == 'star':
+            return get_card_for_view(pk, user).pk
+        return get_wordbook_for_view(pk, user).pk
+    target_user = get_object_or_404(User.objects.select_related('profile'), username=str(target))
+    check_followable(user, target_user)
+    return target_user.pk
+
+
 # ---- Avatar APIs ----
 @login_required
 def get_available_avatars(request):
@@ -552,7 +850,8 @@ def update_avatar(request):
     
     # プリセット画像が選択された場合、カスタムアバターをクリアする
     if user_profile.custom_avatar:
-        user_profile.custom_avatar.delete()
+        # 縮小版はほかのユーザーと共有していなければシグナルがコミット後に消す
+        user_profile.custom_avatar.delete(save=False)
         user_profile.custom_avatar = None
         
     user_profile.save()
@@ -595,40 +894,46 @@ def upload_custom_avatar(request):
     if file.size > 5 * 1024 * 1024:
         return JsonResponse({'error': {'code': 'BadRequest', 'message': 'File too large. Max 5MB'}}, status=400)
     
+    # 画像として読めるかだけ確かめる。表示サイズごとの縮小版はコミット後に作る（home.avatar_images）
+    try:
+        images.open_image(file, max(images.AVATAR_SIZES))
+    except ValueError:
+        return JsonResponse({'error': {'code': 'BadRequest', 'message': 'Invalid image file'}}, status=400)
+    file.seek(0)
+    
     user_profile, created = UserProfile.objects.get_or_create(user=request.user)
     
-    # 既存のカスタムアバターがある場合は削除
+    # 既存のカスタムアバターがある場合は削除（古い縮小版はシグナルで片付ける）
     if user_profile.custom_avatar:
-        user_profile.custom_avatar.delete()
+        user_profile.custom_avatar.delete(save=False)
     
-    # 新しいアバターを保存
+    # 新しいアバターを保存（元画像は縮小版を作り直すときのために残す）
     user_profile.custom_avatar = file
     user_profile.save()
     
     return JsonResponse({
         'ok': True,
-        'avatar_url': user_profile.get_avatar_url()
+        'avatar_url': user_profile.get_avatar_url(AVATAR_DISPLAY_SIZE)
     })
 @login_required
 def toggle_star(request, card_id):
-    card = get_object_or_404(WordCard, id=card_id)
-    if not user_can_view_wordbook(card.wordbook, request.user):
-        raise Http404()
-    star, created = WordCardStar.objects.get_or_create(user=request.user, wordcard=card)
-    
-    if not created:
-        star.delete()
-        is_starred = False
-    else:
-        is_starred = True
-        
+    card = get_card_for_view(card_id, request.user)
+    is_starred, _ = toggles.toggle('star', request.user, card.pk)
     return JsonResponse({'is_starred': is_starred})
 
 
+def get_card_for_view(card_id, user):
+    """閲覧できる単語帳のカードのみ取得し、それ以外は存在しない扱いにする"""
+    card = get_object_or_404(WordCard.objects.select_related('wordbook'), id=card_id)
+    if not user_can_view_wordbook(card.wordbook, user):
+        raise Http404()
+    return card
+
+
 # ==================== 管理者専用機能 ====================
 def is_admin_user(user):
-    """sakana kousei1207かどうかをチェック"""
-    return user.username == 'sakana' and user.first_name == 'kousei1207'
+    """サイト管理者かどうか（UserProfile.is_site_admin、リクエスト内ではキャッシュ）"""
+    return user_roles(user).is_site_admin
 
 @login_required
 def admin_dashboard(request):
@@ -643,13 +948,11 @@ def admin_dashboard(request):
     total_likes = wordBookLike.objects.count()
     total_bookmarks = WordBookBookmark.objects.count()
     
-    # 人気の単語帳TOP10
-    popular_wordbooks = WordBook.objects.annotate(
-        like_count=Count('likes')
-    ).order_by('-like_count')[:10]
+    # 人気の単語帳TOP10（トレンド順）
+    popular_wordbooks = trending.top_wordbooks(WordBook.objects.with_creator_profile(), 10)
     
     # 最近作成された単語帳
-    recent_wordbooks = WordBook.objects.select_related('user').order_by('-created_at')[:10]
+    recent_wordbooks = WordBook.objects.with_creator_profile().order_by('-created_at')[:10]
     
     # アクティブユーザーTOP10（単語帳作成数）
     active_users = User.objects.annotate(
@@ -657,14 +960,10 @@ def admin_dashboard(request):
     ).filter(wordbook_count__gt=0).order_by('-wordbook_count')[:10]
     
     # タグ使用統計
-    tag_stats = Tag.objects.annotate(
-        usage_count=Count('wordbooks')
-    ).filter(usage_count__gt=0).order_by('-usage_count')[:10]
+    tag_stats = get_leaderboard(10)
     
     # ピン留めされた単語帳
-    pinned_wordbooks = WordBook.objects.filter(is_pinned=True).annotate(
-        like_count=Count('likes')
-    ).order_by('-created_at')
+    pinned_wordbooks = WordBook.objects.with_creator_profile().filter(is_pinned=True).order_by('-created_at')
     
     context = {
         'total_users': total_users,
@@ -715,52 +1014,48 @@ def admin_toggle_pin(request, pk):
     })
 
 
+@login_required
+def admin_query_stats(request):
+    """管理者専用：URL名ごとのクエリ数・DB時間の集計を JSON で返す（POST でリセット）"""
+    if not is_admin_user(request.user):
+        return JsonResponse({'error': '権限がありません'}, status=403)
+
+    if request.method == 'POST':
+        query_stats.reset()
+        return JsonResponse({'success': True})
+
+    return JsonResponse({'views': query_stats.snapshot()})
+
+
 # ========== ユーザープロフィール関連 ==========
 
 def user_profile(request, username):
     """ユーザープロフィールページ"""
-    profile_user = get_object_or_404(User, username=username)
+    profile_user = get_object_or_404(User.objects.select_related('profile'), username=username)
     
     # AI専用ユーザーの場合はプロフィールを表示しない
-    if profile_user.username == 'AI' or WordBook.objects.filter(user=profile_user, is_ai_generated=True).exists():
+    if user_roles(profile_user).is_ai:
         messages.error(request, 'AIが作成した単語帳にはプロフィールページがありません。')
         return redirect('wordbook_list')
     
-    user_profile, created = UserProfile.objects.get_or_create(user=profile_user)
+    try:
+        user_profile = profile_user.profile
+    except UserProfile.DoesNotExist:
+        user_profile, created = UserProfile.objects.get_or_create(user=profile_user)
     
     # そのユーザーの公開単語帳を取得
     if request.user.is_authenticated and (request.user == profile_user or is_admin_user(request.user)):
         # 本人または管理者の場合は非公開も表示
-        wordbooks = WordBook.objects.filter(user=profile_user).annotate(
-            like_count=Count('likes'),
-            bookmark_count=Count('bookmarks')
-        ).order_by('-created_at')
+        wordbooks_qs = WordBook.objects.filter(user=profile_user).with_creator_profile()
     else:
         # 他のユーザーの場合は公開のみ
-        wordbooks = WordBook.objects.filter(
+        wordbooks_qs = WordBook.objects.filter(
             user=profile_user,
             is_public=True
-        ).annotate(
-            like_count=Count('likes'),
-            bookmark_count=Count('bookmarks')
-        ).order_by('-created_at')
-    
-    # フォロー状態を確認
-    is_following = False
-    if request.user.is_authenticated and request.user != profile_user:
-        is_following = UserFollow.objects.filter(
-            follower=request.user,
-            following=profile_user
-        ).exists()
-    
-    # フォロー数とフォロワー数
-    following_count = UserFollow.objects.filter(follower=profile_user).count()
-    followers_count = UserFollow.objects.filter(following=profile_user).count()
+        ).with_creator_profile()
+    wordbooks, next_cursor = keyset_page(wordbooks_qs, request.GET.get('cursor'))
     
-    # いいね総数
-    total_likes = wordBookLike.objects.filter(wordbook__user=profile_user).count()
-    
-    # 単語帳に対するいいねとブックマークの状態を取得
+    # 表示中のページの単語帳に対するいいねとブックマークの状態を取得
     liked_wordbook_ids = []
     bookmarked_wordbook_ids = []
     if request.user.is_authenticated:
@@ -774,10 +1069,33 @@ def user_profile(request, username):
             wordbook__in=wordbooks
         ).values_list('wordbook_id', flat=True))
     
+    if wants_fragment(request):
+        context = {
+            'wordbooks': wordbooks,
+            'liked_wordbook_ids': liked_wordbook_ids,
+            'bookmarked_wordbook_ids': bookmarked_wordbook_ids,
+        }
+        return fragment_response(request, 'home/partials/profile_wordbook_items.html', context, next_cursor)
+    
+    # フォロー状態を確認
+    is_following = False
+    if request.user.is_authenticated and request.user != profile_user:
+        is_following = UserFollow.objects.filter(
+            follower=request.user,
+            following=profile_user
+        ).exists()
+    
+    # フォロー数・フォロワー数・いいね総数（カウンタ列から）
+    following_count = user_profile.following_count
+    followers_count = user_profile.followers_count
+    total_likes = user_profile.likes_received_count
+    
     context = {
         'profile_user': profile_user,
         'user_profile': user_profile,
         'wordbooks': wordbooks,
+        'wordbooks_count': wordbooks_qs.count(),
+        'next_cursor': next_cursor,
         'is_following': is_following,
         'following_count': following_count,
         'followers_count': followers_count,
@@ -789,43 +1107,31 @@ def user_profile(request, username):
     return render(request, 'home/user_profile.html', context)
 
 
+def check_followable(user, target_user):
+    """フォローできない相手なら ValueError（メッセージはそのまま画面に出す）"""
+    # AI専用ユーザーはフォローできない
+    if user_roles(target_user).is_ai:
+        raise ValueError('AIユーザーはフォローできません')
+    # 自分自身はフォローできない
+    if user == target_user:
+        raise ValueError('自分自身をフォローできません')
+
+
 @login_required
 def user_follow_toggle(request, username):
     """ユーザーのフォロー/アンフォローをトグル"""
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid method'}, status=405)
     
-    target_user = get_object_or_404(User, username=username)
-    
-    # AI専用ユーザーはフォローできない
-    if target_user.username == 'AI' or WordBook.objects.filter(user=target_user, is_ai_generated=True).exists():
-        return JsonResponse({'error': 'AIユーザーはフォローできません'}, status=400)
-    
-    # 自分自身はフォローできない
-    if request.user == target_user:
-        return JsonResponse({'error': '自分自身をフォローできません'}, status=400)
-    
-    follow_obj = UserFollow.objects.filter(
-        follower=request.user,
-        following=target_user
-    ).first()
-    
-    if follow_obj:
-        # アンフォロー
-        follow_obj.delete()
-        is_following = False
-        action = 'unfollowed'
-    else:
-        # フォロー
-        UserFollow.objects.create(
-            follower=request.user,
-            following=target_user
-        )
-        is_following = True
-        action = 'followed'
+    target_user = get_object_or_404(User.objects.select_related('profile'), username=username)
+    try:
+        check_followable(request.user, target_user)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    # 最新のフォロワー数を取得
-    followers_count = UserFollow.objects.filter(following=target_user).count()
+    # フォロー/アンフォローと最新のフォロワー数（カウンタ列）
+    is_following, followers_count = toggles.toggle('follow', request.user, target_user.pk)
+    action = 'followed' if is_following else 'unfollowed'
     
     return JsonResponse({
         'success': True,
@@ -835,22 +1141,24 @@ def user_follow_toggle(request, username):
     })
 
 
+def viewer_follows(viewer, user_field):
+    """行の user_field のユーザーを viewer がフォローしているかを表す EXISTS 式"""
+    return Exists(UserFollow.objects.filter(follower=viewer, following_id=OuterRef(user_field)))
+
+
 @login_required
 def user_following_list(request, username):
     """フォロー中のユーザー一覧"""
     profile_user = get_object_or_404(User, username=username)
     
-    # フォロー中のユーザーを取得
-    following_relations = UserFollow.objects.filter(
-        follower=profile_user
-    ).select_related('following', 'following__profile').order_by('-created_at')
-    
-    # 現在のユーザーがフォローしているユーザーのIDリスト
-    current_user_following_ids = []
-    if request.user.is_authenticated:
-        current_user_following_ids = list(UserFollow.objects.filter(
-            follower=request.user
-        ).values_list('following_id', flat=True))
+    # フォロー中のユーザーを取得（キーセットページネーション）
+    # 表示中のユーザーを自分がフォローしているかは、このページの行だけ EXISTS で調べる
+    following_relations, next_cursor = keyset_page(
+        UserFollow.objects.filter(follower=profile_user)
+        .select_related('following', 'following__profile')
+        .annotate(viewer_follows=viewer_follows(request.user, 'following_id')),
+        request.GET.get('cursor'),
+    )
     
     # マイページから来たかどうかを判定
     from_mypage = request.GET.get('from') == 'mypage'
@@ -858,10 +1166,12 @@ def user_following_list(request, username):
     context = {
         'profile_user': profile_user,
         'following_relations': following_relations,
-        'current_user_following_ids': current_user_following_ids,
+        'next_cursor': next_cursor,
         'is_own_profile': request.user == profile_user,
         'from_mypage': from_mypage,
     }
+    if wants_fragment(request):
+        return fragment_response(request, 'home/partials/following_items.html', context, next_cursor)
     
     return render(request, 'home/user_following_list.html', context)
 
@@ -871,17 +1181,13 @@ def user_followers_list(request, username):
     """フォロワー一覧"""
     profile_user = get_object_or_404(User, username=username)
     
-    # フォロワーを取得
-    follower_relations = UserFollow.objects.filter(
-        following=profile_user
-    ).select_related('follower', 'follower__profile').order_by('-created_at')
-    
-    # 現在のユーザーがフォローしているユーザーのIDリスト
-    current_user_following_ids = []
-    if request.user.is_authenticated:
-        current_user_following_ids = list(UserFollow.objects.filter(
-            follower=request.user
-        ).values_list('following_id', flat=True))
+    # フォロワーを取得（キーセットページネーション）
+    follower_relations, next_cursor = keyset_page(
+        UserFollow.objects.filter(following=profile_user)
+        .select_related('follower', 'follower__profile')
+        .annotate(viewer_follows=viewer_follows(request.user, 'follower_id')),
+        request.GET.get('cursor'),
+    )
     
     # マイページから来たかどうかを判定
     from_mypage = request.GET.get('from') == 'mypage'
@@ -889,10 +1195,12 @@ def user_followers_list(request, username):
     context = {
         'profile_user': profile_user,
         'follower_relations': follower_relations,
-        'current_user_following_ids': current_user_following_ids,
+        'next_cursor': next_cursor,
         'is_own_profile': request.user == profile_user,
         'from_mypage': from_mypage,
     }
+    if wants_fragment(request):
+        return fragment_response(request, 'home/partials/follower_items.html', context, next_cursor)
     
     return render(request, 'home/user_followers_list.html', context)
 
@@ -41,7 +41,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # セッション・認証のクエリも含めて計測するため先頭に置く
+    'home.middleware.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # collectstatic 済みの静的ファイルを圧縮版・キャッシュヘッダー付きで返す（DEBUG 中は無効）
+    'home.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,6 +67,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'home.context_processors.tags_processor',  # タグ情報を全ページで利用可能に
+                'home.context_processors.roles_processor',  # ログイン中ユーザーの役割（管理者メニューの表示など）
             ],
         },
     },
@@ -78,6 +83,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # トランザクション開始時に書き込みロックを取り、読んでから書くまでの間の競合でのデッドロックを防ぐ
+            'transaction_mode': 'IMMEDIATE',
+            # ロック待ちの上限（秒）。超えたら home.toggles などがやり直す
+            'timeout': 5,
+            # WAL にして書き込み中も読み出しを止めない
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+        'TEST': {
+            # 0011 は列を追加しないまま UPDATE するので空の DB には適用できない。テスト DB はモデルから作る
+            'MIGRATE': False,
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 世代番号（home.fragment_cache）・再計算ロック・タグのランキングは全プロセスで共有しないと
+# 他のワーカーが古いまま残るので、プロセスごとの LocMemCache ではなく DB に置く。
+# 初回は python manage.py createcachetable でテーブルを作る（テスト DB では自動で作られる）
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {
+            # 既定の 300 件だと世代番号ごとのエントリですぐ間引かれる
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -120,6 +155,12 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'home' / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # collectstatic 時に内容ハッシュの manifest を書き出す（home.static_manifest）
+    'staticfiles': {'BACKEND': 'home.storage.VersionedStaticFilesStorage'},
+}
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -133,3 +174,36 @@ LOGOUT_REDIRECT_URL = 'home'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# クエリ計測（home.middleware.QueryStatsMiddleware）
+# True にするとレスポンスに Server-Timing ヘッダーを付ける
+QUERY_STATS_SERVER_TIMING = DEBUG
+
+# テスト中はバックグラウンドスレッドを使わない（home.testing.SynchronousTestRunner）
+TEST_RUNNER = 'home.testing.SynchronousTestRunner'
+
+# home.testing.query_budget で使うビューごとのクエリ数の上限（セッション・認証の分を含む）
+# 値はキャッシュが空の状態で、未ログイン・ログイン・管理者のうち最も多い場合を home/tests.py で測ったもの
+QUERY_BUDGETS = {
+    'wordbook_list': 10,  # ?tags= は関連タグ用に公開の単語帳を絞る1回を含む
+    'mypage': 6,
+    'mypage_wordbooks_all': 4,
+    'mypage_bookmarks_all': 4,
+    'user_profile': 9,
+    'user_following_list': 5,
+    'user_followers_list': 5,
+}
+
+# 単語カード画像の縮小版（home.card_images）
+# False にするとバックグラウンドではなくコミット直後に同期で作る（テスト用）
+CARD_RENDITIONS_ASYNC = True
+
+# アバター画像の縮小版（home.avatar_images）
+# False にするとバックグラウンドではなくコミット直後に同期で作る（テスト用）
+AVATAR_RENDITIONS_ASYNC = True
+
+# フォロー中の新着（home.feed）
+# False にすると受信箱への配布をバックグラウンドではなくコミット直後に同期で行う（テスト用）
+FEED_FANOUT_ASYNC = True
+# フォロワーがこれより多い作者は受信箱に配布せず、読み出し時に集める
+FEED_FANOUT_FOLLOWER_LIMIT = 1000